@@ -0,0 +1,198 @@
+"""
+Benchmark de throughput dos perfis de crawl contra um servidor HTTP local.
+
+O servidor simula um registo com latência fixa e um limite de pedidos por segundo: acima do limite responde
+429 com Retry-After. Para cada perfil (os custom_settings dos spiders e alguns perfis de referência) é feito um
+crawl de N páginas e reportados o throughput, os 429 recebidos e as retentativas.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/crawl_throughput.py --pages 300 --latency 0.05 --rate 40
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import scrapy
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from scrapy.utils.reactor import install_reactor
+from twisted.internet import defer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scrapers", "eu_ctr")))
+
+from eu_ctr import settings as project_settings  # noqa: E402
+
+# Chaves dos custom_settings que não dizem respeito ao ritmo do crawl
+IGNORED_KEYS = {'JOBDIR'}
+
+
+class MockRegistry(BaseHTTPRequestHandler):
+    latency = 0.05
+    rate = 40
+    lock = threading.Lock()
+    window = [0, 0]  # [segundo atual, pedidos nesse segundo]
+    throttled = 0
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        now = int(time.time())
+        with self.lock:
+            MockRegistry.in_flight += 1
+            MockRegistry.max_in_flight = max(MockRegistry.max_in_flight, MockRegistry.in_flight)
+            if self.window[0] != now:
+                self.window[:] = [now, 0]
+            self.window[1] += 1
+            over_limit = self.window[1] > self.rate
+            if over_limit:
+                MockRegistry.throttled += 1
+
+        time.sleep(self.latency)
+        with self.lock:
+            MockRegistry.in_flight -= 1
+        if over_limit:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+
+        body = f"<html><body><table><tr><td>{self.path}</td></tr></table></body></html>".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchSpider(scrapy.Spider):
+    name = "bench"
+
+    def __init__(self, base_url=None, pages=100, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.pages = int(pages)
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        # Mantido para versões do Scrapy anteriores à 2.13
+        for i in range(self.pages):
+            yield scrapy.Request(f"{self.base_url}/trial/{i}", callback=self.parse, dont_filter=True)
+
+    def parse(self, response, **kwargs):
+        yield {'url': response.url}
+
+
+def spider_profiles():
+    """Perfis a comparar: referências fixas e os custom_settings de cada spider do projeto."""
+    profiles = {
+        'scrapy_defaults': {},
+        'serial': {'CONCURRENT_REQUESTS_PER_DOMAIN': 1},
+        'aggressive': {'CONCURRENT_REQUESTS_PER_DOMAIN': 32, 'CONCURRENT_REQUESTS': 32},
+    }
+    spiders = {
+        'ctis_eu': ('eu_ctr.spiders.ctis_eu_spider', 'CtisEuSpider'),
+        'trials': ('eu_ctr.spiders.old_eu_trials_spider', 'TrialsSpider'),
+        'pap_infarmed': ('eu_ctr.spiders.pap_infarmed_spider', 'PapInfarmedSpider'),
+    }
+    for name, (module_name, class_name) in spiders.items():
+        try:
+            module = __import__(module_name, fromlist=[class_name])
+        except ImportError as e:
+            print(f"Perfil {name} ignorado: {e}")
+            continue
+        custom = getattr(module, class_name).custom_settings or {}
+        profiles[name] = {k: v for k, v in custom.items() if k not in IGNORED_KEYS}
+    return profiles
+
+
+def base_settings(use_backoff):
+    middlewares = {"eu_ctr.middlewares.BackoffRetryMiddleware": 560} if use_backoff else {}
+    settings = {
+        'LOG_LEVEL': 'WARNING',
+        'ROBOTSTXT_OBEY': False,
+        'TELNETCONSOLE_ENABLED': False,
+        'DOWNLOADER_MIDDLEWARES': middlewares,
+        'RETRY_TIMES': project_settings.RETRY_TIMES,
+        'RETRY_HTTP_CODES': project_settings.RETRY_HTTP_CODES if use_backoff else [429, 503],
+    }
+    for key in ('BACKOFF_HTTP_CODES', 'BACKOFF_RETRY_TIMES', 'BACKOFF_BASE_DELAY', 'BACKOFF_MAX_DELAY'):
+        settings[key] = getattr(project_settings, key)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200, help="páginas por crawl")
+    parser.add_argument('--latency', type=float, default=0.05, help="latência do servidor (s)")
+    parser.add_argument('--rate', type=int, default=40, help="pedidos/s aceites antes de responder 429")
+    parser.add_argument('--profiles', nargs='*', help="perfis a correr (por omissão, todos)")
+    parser.add_argument('--no-backoff', action='store_true', help="usar apenas o RetryMiddleware do Scrapy")
+    args = parser.parse_args()
+
+    MockRegistry.latency = args.latency
+    MockRegistry.rate = args.rate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockRegistry)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    profiles = spider_profiles()
+    if args.profiles:
+        profiles = {k: v for k, v in profiles.items() if k in args.profiles}
+
+    # Um único reactor: os perfis correm em sequência, cada um com o seu Crawler
+    install_reactor(project_settings.TWISTED_REACTOR)
+    from twisted.internet import reactor
+
+    settings = base_settings(not args.no_backoff)
+    configure_logging({'LOG_LEVEL': settings['LOG_LEVEL']})
+    runner = CrawlerRunner(settings)
+    results = []
+
+    @defer.inlineCallbacks
+    def run_all():
+        for name, profile in profiles.items():
+            spidercls = type(f"Bench_{name}", (BenchSpider,), {'custom_settings': profile})
+            crawler = runner.create_crawler(spidercls)
+            throttled_before = MockRegistry.throttled
+            MockRegistry.max_in_flight = 0
+            start = time.perf_counter()
+            yield runner.crawl(crawler, base_url=base_url, pages=args.pages)
+            elapsed = time.perf_counter() - start
+
+            stats = crawler.stats.get_stats()
+            items = stats.get('item_scraped_count', 0)
+            results.append({
+                'profile': name,
+                'items': items,
+                'seconds': round(elapsed, 2),
+                'items_per_s': round(items / elapsed, 1) if elapsed else 0.0,
+                'max_in_flight': MockRegistry.max_in_flight,
+                'http_429': MockRegistry.throttled - throttled_before,
+                'retries': stats.get('retry/count', 0),
+                'gave_up': stats.get('retry/max_reached', 0),
+                'max_backoff_s': stats.get('backoff/max_delay', 0),
+            })
+            print(f"{name}: {items} itens em {elapsed:.2f}s")
+
+    d = run_all()
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+    server.shutdown()
+
+    report = pd.DataFrame(results).sort_values('items_per_s', ascending=False)
+    print(f"\nServidor: latência {args.latency}s, limite {args.rate} pedidos/s, {args.pages} páginas por perfil")
+    print(report.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark das etapas do ETL (etl/etl.py) com dados sintéticos a várias escalas do volume português.
+
+Para cada escala, os dados são gerados por benchmarks/synthetic_data.py e cada etapa corre isolada, com as
+saídas intermédias da etapa anterior; os ficheiros escritos pelo ETL vão para um diretório temporário.
+São reportados o tempo de cada etapa e, numa segunda passagem com tracemalloc, o pico de memória alocada
+pelo Python (NumPy e pandas incluídos; buffers do Arrow não). A coluna `growth` compara o tempo com o da
+menor escala: uma etapa cujo crescimento excede o da escala é a primeira a partir quando o volume aumentar.
+As mesmas etapas são medidas pelo pytest-benchmark em tests/test_etl_stages.py (para correr em CI).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/etl_stages.py --scales 1 10 100 --out /tmp/etl_stages.csv
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "etl"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import etl as etl_pipeline  # noqa: E402
+from synthetic_data import make_dataset  # noqa: E402
+
+
+def etl_stages(data, out_dir):
+    """
+    Etapas do ETL pela ordem de execução do `run()`.
+
+    :param data: dicionário com as fontes (`trials`, `ctis`, `pap`, `aact`)
+    :param out_dir: diretório para os ficheiros escritos pelo ETL
+    :return: lista de (nome, função que recebe e atualiza o dicionário de resultados intermédios)
+    """
+    def path(name):
+        return os.path.join(out_dir, name)
+
+    return [
+        ('clean_trials', lambda r: r.update(trials_clean=etl_pipeline.clean_trials(data['trials']))),
+        ('clean_ctis', lambda r: r.update(ctis_clean=etl_pipeline.clean_ctis(data['ctis']))),
+        ('merge_trials_eu', lambda r: r.update(trials_eu=etl_pipeline.merge_trials_eu(
+            r['trials_clean'], r['ctis_clean'], sponsor_table_path=path('sponsor_lookup.parquet')))),
+        ('clean_aact', lambda r: r.update(aact_clean=etl_pipeline.clean_aact(data['aact']))),
+        # Volume português: uma única partição de país, como no `run()` por omissão
+        ('final_merge', lambda r: r.update(full=etl_pipeline.final_merge(
+            r['trials_eu'], r['aact_clean'], crosswalk_path=path('id_crosswalk.parquet')).assign(country='pt'))),
+        ('save_outputs', lambda r: r.update(full_compact=etl_pipeline.save_outputs(
+            r['full'], full_df_path=path('full_df'), excel_path=None,
+            search_index_path=path('search.sqlite'), facets_path=path('facets.parquet')))),
+        ('save_pap', lambda r: r.update(pap_page=etl_pipeline.save_pap(
+            data['pap'], path('pap_clean.parquet'), path('pap_summary.parquet')))),
+        ('clean_pap', lambda r: r.update(pap_clean=etl_pipeline.clean_pap(data['pap'], r['full'].columns))),
+    ]
+
+
+def run_stages(data, measure_memory=False, out_dir=None):
+    """
+    Corre as etapas em sequência; se uma falhar, as seguintes não correm.
+
+    :param data: dicionário com as fontes (ver synthetic_data.make_dataset)
+    :param measure_memory: medir o pico de memória de cada etapa com tracemalloc
+    :param out_dir: diretório onde manter os ficheiros escritos pelo ETL (por omissão, um diretório temporário)
+    :return: lista de dicionários com `stage`, `seconds`, `peak_mb`, `rows` e `error`
+    """
+    results, rows = {}, []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, stage in etl_stages(data, out_dir or tmp_dir):
+            if measure_memory:
+                tracemalloc.start()
+            before = set(results)
+            start = time.perf_counter()
+            error = None
+            try:
+                stage(results)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - start
+            peak_mb = None
+            if measure_memory:
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+
+            produced = [results[k] for k in set(results) - before]
+            rows.append({
+                'stage': name,
+                'seconds': round(seconds, 3),
+                'peak_mb': None if peak_mb is None else round(peak_mb, 1),
+                'rows': len(produced[0]) if produced else None,
+                'error': error,
+            })
+            if error:
+                print(f"  {name}: falhou ({error})")
+                break
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help="escalas do volume português")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="não medir o pico de memória (mais rápido)")
+    parser.add_argument('--out', help="CSV com os resultados")
+    args = parser.parse_args()
+
+    report = []
+    for scale in args.scales:
+        data = make_dataset(scale, args.seed)
+        print(f"Escala {scale:g}: " + ', '.join(f"{k} {len(v):,}" for k, v in data.items()))
+
+        timings = run_stages(data)
+        if not args.no_memory:
+            memory = {r['stage']: r['peak_mb'] for r in run_stages(data, measure_memory=True)}
+            for r in timings:
+                r['peak_mb'] = memory.get(r['stage'])
+        report += [dict(scale=scale, **r) for r in timings]
+
+    report = pd.DataFrame(report)
+    smallest = report['scale'].min()
+    base = report[report['scale'] == smallest].set_index('stage')['seconds']
+    report['growth'] = (report['seconds'] / report['stage'].map(base)).round(1)
+
+    print()
+    print(report.drop(columns='error').to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark do tempo de importação dos módulos da aplicação (`python -X importtime`).
+
+Cada módulo é importado num interpretador novo, várias vezes, e é reportada a mediana do tempo cumulativo,
+as importações mais pesadas e se algum módulo proibido foi carregado (ex.: o SDK do LLM em utils.data, que
+é importado por todas as páginas). Termina com código 1 se um módulo exceder o orçamento ou carregar um módulo
+proibido, para poder ser usado como verificação antes de publicar; tests/test_import_time.py faz a mesma
+verificação na suite de testes.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/import_time.py --repeat 5 --top 10
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Módulo → (orçamento em ms, módulos que não podem ser importados)
+MODULES = {
+    'utils.data': (1500, ('groq', 'requests')),
+    'utils.llm': (1500, ('groq',)),
+    'utils.filters': (800, ('streamlit', 'groq')),
+    'utils.search': (200, ('streamlit', 'pandas', 'groq')),
+    'utils.export': (1500, ('groq',)),
+    'utils.profiling': (1500, ('pyinstrument', 'groq')),
+}
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def import_profile(module):
+    """
+    Importa `module` num interpretador novo com `-X importtime`.
+
+    :param module: nome do módulo
+    :return: dicionário nome → (self_us, cumulative_us, profundidade) de todos os módulos carregados
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}:\n{result.stderr.strip().splitlines()[-1]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            profile[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return profile
+
+
+def check_module(module, repeat=5):
+    """
+    Mede o tempo de importação de `module` e compara-o com o orçamento de MODULES.
+
+    :param module: nome do módulo
+    :param repeat: importações (reporta a mediana)
+    :return: tuplo (mediana do tempo cumulativo em ms, módulos proibidos carregados, último perfil,
+        estado: 'ok' ou a descrição da falha)
+    """
+    budget_ms, forbidden = MODULES.get(module, (None, ()))
+    profiles = [import_profile(module) for _ in range(repeat)]
+
+    total_ms = statistics.median(p[module][1] for p in profiles) / 1000
+    loaded = [name for name in forbidden if any(name in p for p in profiles)]
+
+    status = 'ok'
+    if loaded:
+        status = f"importa {', '.join(loaded)}"
+    elif budget_ms is not None and total_ms > budget_ms:
+        status = f"acima do orçamento de {budget_ms} ms"
+    return total_ms, loaded, profiles[-1], status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', help="módulos a medir (por omissão, todos os de MODULES)")
+    parser.add_argument('--repeat', type=int, default=5, help="importações por módulo (reporta a mediana)")
+    parser.add_argument('--top', type=int, default=5, help="importações mais pesadas a listar por módulo")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules or MODULES:
+        try:
+            total_ms, _, last, status = check_module(module, args.repeat)
+        except RuntimeError as e:
+            print(e)
+            failures.append(module)
+            continue
+        if status != 'ok':
+            failures.append(module)
+
+        print(f"\n{module}: {total_ms:.1f} ms ({status})")
+        # Pacotes de topo (profundidade 1) que mais contribuem para o tempo cumulativo
+        heaviest = sorted(
+            ((name, cumulative) for name, (_, cumulative, depth) in last.items() if depth == 1),
+            key=lambda x: x[1], reverse=True,
+        )
+        for name, cumulative in heaviest[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    if failures:
+        print(f"\nFalharam: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
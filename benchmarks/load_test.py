@@ -0,0 +1,372 @@
+"""
+Teste de carga da aplicação (ptoolctex.py) com várias sessões em simultâneo.
+
+Para cada nível de concorrência N, a aplicação é lançada localmente (`streamlit run`, sem browser) sobre dados
+sintéticos gerados por benchmarks/synthetic_data.py e processados pelas etapas do ETL; são abertas N sessões
+pelo websocket do Streamlit (/_stcore/stream), que falam o protocolo do browser (BackMsg/ForwardMsg): cada uma
+entra pela página inicial, navega para a sua página e percorre várias vezes uma sequência de alterações de
+filtros e exportações. Um rerun é
+cronometrado desde o envio do estado dos widgets até à mensagem `script_finished` do servidor.
+
+São reportados, por N, os percentis p50/p95 e o máximo da latência dos reruns, o nº de erros (exceções na
+página) e a memória residente (RSS) do processo do servidor: após o arranque, o pico durante a carga e no fim.
+Cada nível corre num servidor novo, para que a memória de um nível não contamine o seguinte.
+
+Os valores dos widgets são enviados como o browser os envia na versão do Streamlit instalada (opções pelo texto
+mostrado); a ligação usa o pacote `websockets`, uma dependência do Streamlit.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/load_test.py --users 1 5 10 20 --rounds 3 --out /tmp/load_test.csv
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from page_latency import build_sources  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+CONDITIONS = ["cancer", "diabetes", "asthma", "hepatitis", "arthritis"]
+TERMS = ["breast", "lung", "pediatric", "chronic", "placebo"]
+
+# Carregar num botão, se estiver na página (o "Prepare export" dá lugar ao download quando o ficheiro já existe)
+PRESS = object()
+
+
+def _option(i):
+    # i-ésima opção do multiselect (circular), com o texto mostrado ao utilizador
+    return lambda widget: [widget.options[i % len(widget.options)]] if widget.options else []
+
+
+def infography_steps(i):
+    """Interações da sessão `i` na página Infography: (nome, {chave ou rótulo do widget: valor})."""
+    return [
+        ('therapeutic_area', {'facet_therapeutic_area': _option(i)}),
+        ('study_type', {'facet_study_type': _option(i)}),
+        ('export', {'export_trials_prepare': PRESS}),
+        ('interventions', {'facet_interventions': _option(i)}),
+        ('clear', {'facet_therapeutic_area': [], 'facet_study_type': [], 'facet_interventions': []}),
+    ]
+
+
+def researcher_steps(i):
+    """Interações da sessão `i` nos filtros PICOTSS da página Researcher."""
+    return [
+        ('condition', {'Condition / Disease': CONDITIONS[i % len(CONDITIONS)]}),
+        ('sex', {'Sex': 'Female'}),
+        ('other_term', {'Other search term': TERMS[i % len(TERMS)]}),
+        ('export', {'export_picotss_prepare': PRESS}),
+        ('clear', {'Condition / Disease': '', 'Other search term': '', 'Sex': 'All'}),
+    ]
+
+
+# Página (url_pathname no st.navigation) → interações
+PAGES = {
+    'Infography': infography_steps,
+    'Researcher': researcher_steps,
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    """Memória residente do processo (MB), pelo psutil ou, sem ele, por /proc (Linux)."""
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss / 2**20
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return float('nan')
+
+
+def start_server(sources_dir, port, log_path, timeout):
+    """
+    Lança `streamlit run ptoolctex.py` sem browser e espera que responda ao health check.
+
+    :param log_path: ficheiro para a saída do servidor (um pipe por ler encheria e bloquearia o servidor)
+    """
+    env = dict(os.environ, PTOOLCTEX_SOURCES=sources_dir)
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', 'ptoolctex.py',
+             '--server.headless', 'true', '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+            cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f"O servidor terminou no arranque:\n{log.read()[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"O servidor não respondeu em {timeout:.0f} s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class Session:
+    """
+    Uma sessão do browser: mantém as páginas do st.navigation, os widgets da última execução e o estado que lhes foi
+    dado. Como o browser, entra pela página inicial e navega pelo hash da página; pedir logo uma página pelo nome
+    pode executá-la sem o ptoolctex.py (o Streamlit ainda reconhece a pasta `pages/` das apps antigas).
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.page = ''
+        self.page_hash = ''
+        self.pages = {}
+        self.widgets = {}
+        self.states = {}
+        self.ws = None
+
+    async def connect(self, timeout):
+        import websockets
+
+        # Sob carga o servidor demora a aceitar ligações; sem pings, para um rerun longo não fechar a ligação
+        self.ws = await websockets.connect(
+            self.url, subprotocols=['streamlit'], max_size=None, open_timeout=timeout, ping_interval=None,
+        )
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    def _find(self, name):
+        # Widgets com chave pelo sufixo do id ($$ID-<hash>-<chave>); os restantes pelo rótulo
+        for widget_id, (kind, widget) in self.widgets.items():
+            if widget_id.endswith(f"-{name}") or widget.label == name:
+                return widget_id, kind, widget
+        raise LookupError(f"Widget '{name}' não encontrado na página {self.page}")
+
+    def set(self, updates):
+        """
+        Aplica {chave ou rótulo: valor}; o valor pode ser uma função do proto do widget (ex.: escolher opções).
+
+        :return: nº de widgets alterados (botões PRESS ausentes da página são ignorados)
+        """
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        changed = 0
+        for name, value in updates.items():
+            try:
+                widget_id, kind, widget = self._find(name)
+            except LookupError:
+                if value is PRESS:
+                    continue
+                raise
+            if value is PRESS:
+                value = True
+            elif callable(value):
+                value = value(widget)
+            state = WidgetState(id=widget_id)
+            if kind == 'button':
+                state.trigger_value = bool(value)
+            elif kind == 'checkbox':
+                state.bool_value = bool(value)
+            elif kind == 'multiselect':
+                state.string_array_value.data.extend(value)
+            else:
+                state.string_value = value
+            self.states[widget_id] = state
+            changed += 1
+        return changed
+
+    async def rerun(self, timeout):
+        """
+        Envia o estado dos widgets e espera pelo fim da execução.
+
+        :return: (segundos, nº de exceções mostradas na página)
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.page_name = self.page
+        message.rerun_script.page_script_hash = self.page_hash
+        message.rerun_script.query_string = ''
+        # Só os widgets ainda presentes na página; os botões valem apenas para este rerun
+        message.rerun_script.widget_states.widgets.extend(
+            state for widget_id, state in self.states.items() if widget_id in self.widgets
+        )
+        self.states = {k: s for k, s in self.states.items() if s.WhichOneof('value') != 'trigger_value'}
+
+        widgets, errors = {}, 0
+        start = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), timeout))
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    errors += 1
+                widget = getattr(element, element_type)
+                # Widgets de entrada (gráficos e tabelas também têm id, mas não rótulo)
+                if 'label' in widget.DESCRIPTOR.fields_by_name and getattr(widget, 'id', ''):
+                    widgets[widget.id] = (element_type, widget)
+            elif kind == 'navigation':
+                self.pages = {p.url_pathname: p.page_script_hash for p in forward.navigation.app_pages}
+            elif kind == 'page_not_found':
+                raise RuntimeError(f"Página não encontrada: {self.page}")
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    errors += 1
+                break
+        seconds = time.perf_counter() - start
+        self.widgets = widgets
+        return seconds, errors
+
+    async def navigate(self, page, timeout):
+        """Muda de página, como um clique na barra lateral (os widgets da página anterior são esquecidos)."""
+        if page not in self.pages:
+            raise RuntimeError(f"Página não encontrada no st.navigation: {page}")
+        self.page, self.page_hash = page, self.pages[page]
+        self.widgets, self.states = {}, {}
+        return await self.rerun(timeout)
+
+
+async def run_session(url, page, index, rounds, think, timeout, results):
+    """Abre a página e percorre `rounds` vezes as interações, acrescentando cada rerun a `results`."""
+    session = Session(url)
+    await session.connect(timeout)
+    try:
+        seconds, errors = await session.rerun(timeout)
+        results.append({'page': page, 'step': 'home', 'seconds': seconds, 'errors': errors})
+        seconds, errors = await session.navigate(page, timeout)
+        results.append({'page': page, 'step': 'open', 'seconds': seconds, 'errors': errors})
+        for _ in range(rounds):
+            for step, updates in PAGES[page](index):
+                # Tempo de reflexão entre interações, para as sessões não andarem em passo certo
+                await asyncio.sleep(random.uniform(0, 2 * think))
+                if not session.set(updates):
+                    continue
+                seconds, errors = await session.rerun(timeout)
+                results.append({'page': page, 'step': step, 'seconds': seconds, 'errors': errors})
+    finally:
+        await session.close()
+
+
+async def run_level(port, pid, users, pages, rounds, think, timeout, sample_every=0.2):
+    """Corre `users` sessões em simultâneo (páginas alternadas) e amostra a RSS do servidor enquanto correm."""
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    results, peak = [], [rss_mb(pid)]
+
+    async def sample():
+        while True:
+            peak.append(rss_mb(pid))
+            await asyncio.sleep(sample_every)
+
+    sampler = asyncio.create_task(sample())
+    try:
+        outcomes = await asyncio.gather(*(
+            run_session(url, pages[i % len(pages)], i, rounds, think, timeout, results) for i in range(users)
+        ), return_exceptions=True)
+    finally:
+        sampler.cancel()
+    failed = [o for o in outcomes if isinstance(o, BaseException)]
+    return results, np.nanmax(peak), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 5, 10], help="níveis de concorrência (N)")
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES),
+                        help="páginas a abrir (as sessões alternam entre elas)")
+    parser.add_argument('--rounds', type=int, default=3, help="repetições da sequência de interações por sessão")
+    parser.add_argument('--think', type=float, default=0.5, help="tempo médio entre interações (s)")
+    parser.add_argument('--scale', type=float, default=1, help="escala do volume português")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=300, help="tempo máximo de cada rerun e do arranque (s)")
+    parser.add_argument('--out', help="CSV com os resultados")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='ptoolctex_load_')
+    sources_dir = os.path.join(work_dir, 'sources')
+    os.makedirs(sources_dir)
+    rows = []
+    try:
+        volumes = build_sources(args.scale, args.seed, sources_dir)
+        print(f"Escala {args.scale:g}: " + ', '.join(f"{k} {v:,}" for k, v in volumes.items()))
+
+        for users in args.users:
+            port = _free_port()
+            process = start_server(sources_dir, port, os.path.join(work_dir, f"server_{users}.log"), args.timeout)
+            try:
+                idle = rss_mb(process.pid)
+                results, peak, failed = asyncio.run(run_level(
+                    port, process.pid, users, args.pages, args.rounds, args.think, args.timeout,
+                ))
+                end = rss_mb(process.pid)
+            finally:
+                stop_server(process)
+
+            for error in failed[:3]:
+                print(f"  N={users}: sessão falhou ({error!r})")
+            reruns = pd.DataFrame(results)
+            ms = reruns.loc[~reruns['step'].isin(['home', 'open']), 'seconds'].to_numpy() * 1000 if len(reruns) else np.array([])
+            opens = reruns.loc[reruns['step'] == 'open', 'seconds'].to_numpy() * 1000 if len(reruns) else np.array([])
+            rows.append({
+                'users': users,
+                'reruns': len(ms),
+                'open_p50_ms': round(float(np.percentile(opens, 50))) if len(opens) else None,
+                'p50_ms': round(float(np.percentile(ms, 50))) if len(ms) else None,
+                'p95_ms': round(float(np.percentile(ms, 95))) if len(ms) else None,
+                'max_ms': round(float(ms.max())) if len(ms) else None,
+                'errors': int(reruns['errors'].sum()) if len(reruns) else 0,
+                'failed_sessions': len(failed),
+                'rss_idle_mb': round(idle),
+                'rss_peak_mb': round(peak),
+                'rss_end_mb': round(end),
+            })
+            print(f"  N={users}: p95 {rows[-1]['p95_ms']} ms, RSS pico {rows[-1]['rss_peak_mb']} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = pd.DataFrame(rows)
+    print()
+    print(report.to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Benchmark da latência de rerun das páginas Infography e Researcher com o AppTest do Streamlit.
+
+Para cada escala, os dados são gerados por benchmarks/synthetic_data.py e processados pelas etapas do ETL
+para um diretório temporário, indicado às páginas através de PTOOLCTEX_SOURCES. Cada página é carregada
+uma vez (arranque a frio, sem caches) e depois percorre várias vezes uma sequência de interações nos filtros
+(multiselects da sidebar, campos PICOTSS); cada interação é um rerun cronometrado.
+
+São reportados os percentis p50/p95 e o máximo por página e escala. Com --baseline, o p95 é comparado com o
+de uma execução anterior (gravada com --save-baseline) e o script termina com código 1 se algum p95 piorar
+mais do que --tolerance; --max-p95-ms impõe um limite absoluto.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/page_latency.py --scales 1 10 --rounds 5 --save-baseline /tmp/page_latency.json
+    python benchmarks/page_latency.py --scales 1 10 --rounds 5 --baseline /tmp/page_latency.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# As páginas importam `utils` a partir da raiz, como em `streamlit run ptoolctex.py`
+sys.path.insert(0, ROOT_DIR)
+
+from etl_stages import run_stages  # noqa: E402
+from synthetic_data import make_dataset  # noqa: E402
+
+PAGES = {
+    'infography': os.path.join(ROOT_DIR, "pages", "01_Infography.py"),
+    'researcher': os.path.join(ROOT_DIR, "pages", "02_Researcher.py"),
+}
+
+
+def _by_label(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"Widget '{label}' não encontrado")
+
+
+def infography_steps(facets):
+    """Interações na sidebar da página Infography: (nome, função que recebe o AppTest)."""
+    top = {facet: group.sort_values('count', ascending=False)['value'].iloc[0]
+           for facet, group in facets.groupby('facet')}
+    return [
+        ('therapeutic_area', lambda at: at.multiselect(key='facet_therapeutic_area').set_value([top['therapeutic_area']])),
+        ('study_type', lambda at: at.multiselect(key='facet_study_type').set_value([top['study_type']])),
+        ('live_counts_on', lambda at: at.toggle(key='facet_live_counts').set_value(True)),
+        ('interventions', lambda at: at.multiselect(key='facet_interventions').set_value([top['interventions']])),
+        ('live_counts_off', lambda at: at.toggle(key='facet_live_counts').set_value(False)),
+        ('clear', lambda at: [at.multiselect(key=f"facet_{facet}").set_value([]) for facet in top]),
+    ]
+
+
+def researcher_steps(facets):
+    """Interações nos filtros PICOTSS da página Researcher."""
+    return [
+        ('condition', lambda at: _by_label(at.text_input, "Condition / Disease").input("cancer")),
+        ('intervention', lambda at: _by_label(at.text_input, "Intervention").input("mab")),
+        ('sex', lambda at: _by_label(at.selectbox, "Sex").select("Female")),
+        ('age', lambda at: _by_label(at.selectbox, "Age group").select("18-64 years")),
+        ('other_term', lambda at: _by_label(at.text_input, "Other search term").input("breast")),
+        ('study_type', lambda at: _by_label(at.selectbox, "Study Type").select("Interventional")),
+        ('clear', lambda at: [
+            _by_label(at.text_input, label).input("")
+            for label in ("Condition / Disease", "Intervention", "Other search term")
+        ] + [
+            _by_label(at.selectbox, label).select("All")
+            for label in ("Sex", "Age group", "Study Type")
+        ]),
+    ]
+
+
+STEPS = {
+    'infography': infography_steps,
+    'researcher': researcher_steps,
+}
+
+
+def build_sources(scale, seed, sources_dir):
+    """Gera os dados sintéticos e corre as etapas do ETL, deixando os ficheiros servidos em `sources_dir`."""
+    data = make_dataset(scale, seed)
+    stages = run_stages(data, out_dir=sources_dir)
+    failed = [s for s in stages if s['error']]
+    if failed:
+        raise RuntimeError(f"ETL falhou na etapa {failed[0]['stage']}: {failed[0]['error']}")
+    return {source: len(df) for source, df in data.items()}
+
+
+def measure_page(page, sources_dir, rounds, timeout):
+    """
+    Carrega a página e executa `rounds` vezes a sequência de interações.
+
+    :return: (segundos do primeiro run, lista de dicionários com `step` e `seconds` de cada rerun)
+    """
+    from streamlit.testing.v1 import AppTest
+
+    facets = pd.read_parquet(os.path.join(sources_dir, "facets.parquet"))
+    at = AppTest.from_file(PAGES[page], default_timeout=timeout)
+
+    start = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"{page}: {at.exception[0].message}")
+
+    reruns = []
+    for _ in range(rounds):
+        for step, interact in STEPS[page](facets):
+            interact(at)
+            start = time.perf_counter()
+            at.run()
+            reruns.append({'step': step, 'seconds': time.perf_counter() - start})
+            if at.exception:
+                raise RuntimeError(f"{page} ({step}): {at.exception[0].message}")
+    return cold, reruns
+
+
+def check(report, baseline, tolerance, max_p95_ms):
+    """Regressões do p95 face ao baseline (relativas) e ao limite absoluto."""
+    failures = []
+    for row in report.itertuples():
+        key = f"{row.page}@{row.scale:g}"
+        if max_p95_ms is not None and row.p95_ms > max_p95_ms:
+            failures.append(f"{key}: p95 {row.p95_ms:.0f} ms > limite {max_p95_ms:.0f} ms")
+        reference = (baseline or {}).get(key)
+        if reference is not None and row.p95_ms > reference * (1 + tolerance):
+            failures.append(f"{key}: p95 {row.p95_ms:.0f} ms > baseline {reference:.0f} ms (+{tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help="escalas do volume português")
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--rounds', type=int, default=5, help="repetições da sequência de interações")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help="tempo máximo de cada run (s)")
+    parser.add_argument('--baseline', help="JSON com os p95 de referência (ms)")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="agravamento máximo do p95 face ao baseline")
+    parser.add_argument('--max-p95-ms', type=float, help="limite absoluto do p95 (ms)")
+    parser.add_argument('--save-baseline', help="gravar os p95 desta execução como baseline")
+    args = parser.parse_args()
+
+    # As páginas usam caminhos relativos à raiz (assets, .streamlit); o diretório dos dados é lido por utils.data
+    # na importação, pelo que é o mesmo para todas as escalas (o conteúdo é substituído e as caches limpas)
+    os.chdir(ROOT_DIR)
+    work_dir = tempfile.mkdtemp(prefix='ptoolctex_pages_')
+    sources_dir = os.path.join(work_dir, 'sources')
+    os.environ['PTOOLCTEX_SOURCES'] = sources_dir
+
+    import streamlit as st
+
+    rows = []
+    try:
+        for scale in args.scales:
+            shutil.rmtree(sources_dir, ignore_errors=True)
+            os.makedirs(sources_dir)
+            volumes = build_sources(scale, args.seed, sources_dir)
+            print(f"Escala {scale:g}: " + ', '.join(f"{k} {v:,}" for k, v in volumes.items()))
+
+            for page in args.pages:
+                # Arranque a frio em cada página e escala
+                st.cache_data.clear()
+                st.cache_resource.clear()
+                cold, reruns = measure_page(page, sources_dir, args.rounds, args.timeout)
+                seconds = np.array([r['seconds'] for r in reruns]) * 1000
+                rows.append({
+                    'page': page,
+                    'scale': scale,
+                    'cold_ms': round(cold * 1000),
+                    'reruns': len(seconds),
+                    'p50_ms': round(float(np.percentile(seconds, 50))),
+                    'p95_ms': round(float(np.percentile(seconds, 95))),
+                    'max_ms': round(float(seconds.max())),
+                })
+                slowest = pd.DataFrame(reruns).groupby('step')['seconds'].median().sort_values().index[-1]
+                print(f"  {page}: p95 {rows[-1]['p95_ms']} ms (interação mais lenta: {slowest})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = pd.DataFrame(rows)
+    print()
+    print(report.to_string(index=False))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({f"{r['page']}@{r['scale']:g}": r['p95_ms'] for r in rows}, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(report, baseline, args.tolerance, args.max_p95_ms)
+    if failures:
+        print("\nRegressões de latência:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark da disposição dos ficheiros Parquet do dataset servido (etl.save_df_dataset) com dados sintéticos.
+
+Para cada escala, os dados gerados por benchmarks/synthetic_data.py passam pelas etapas do ETL até ao DataFrame
+final compactado, que é gravado com a disposição anterior (`default`: escrita do PyArrow por omissão, sem ordenação)
+e com a atual (`tuned`: etl.write_parquet), esta também com os tamanhos de row group de --row-group-sizes.
+Para cada disposição são medidos o tamanho em disco e a mediana do tempo de leitura de:
+  - full: o dataset completo, como a aplicação o carrega;
+  - date: uma janela de um ano de start_date;
+  - id: um ensaio pelo nct_id e outro pelo eudract_nr (média de --lookups pesquisas).
+Para as janelas de datas e as pesquisas por id é também reportada a fração dos row groups que ficam por ler depois
+da eliminação pelas estatísticas min/max. O PyArrow não lê os filtros de Bloom; se o DuckDB estiver instalado, as
+pesquisas por id são medidas também com ele (`id_duckdb_ms`), que os usa para saltar row groups.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/parquet_layout.py --scales 1 10 --row-group-sizes 4096 65536 --out /tmp/parquet_layout.csv
+"""
+import argparse
+import functools
+import glob
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT_DIR, "etl"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import etl as etl_pipeline  # noqa: E402
+from schema import finalize_schema  # noqa: E402
+from synthetic_data import make_dataset  # noqa: E402
+
+# Janela de datas consultada (um ano a meio do intervalo gerado pelo synthetic_data)
+DATE_WINDOW = ('2015-01-01', '2016-01-01')
+
+
+def build_full(data, tmp_dir):
+    """DataFrame final compactado, pelas mesmas etapas do `run()` (um país)."""
+    trials_eu = etl_pipeline.merge_trials_eu(
+        etl_pipeline.clean_trials(data['trials']), etl_pipeline.clean_ctis(data['ctis']),
+        sponsor_table_path=os.path.join(tmp_dir, 'sponsor_lookup.parquet'))
+    full = etl_pipeline.final_merge(
+        trials_eu, etl_pipeline.clean_aact(data['aact']),
+        crosswalk_path=os.path.join(tmp_dir, 'id_crosswalk.parquet'))
+    return finalize_schema(full.assign(country='pt'))
+
+
+def layouts(row_group_sizes):
+    """Disposições a comparar: nome → (colunas de ordenação, função de escrita, tamanho do row group)."""
+    partitions = list(etl_pipeline.DATASET_PARTITIONS.values())
+    tuned = partitions + [etl_pipeline.SORT_COLUMN]
+    result = {
+        'default': (partitions, lambda table, path: pq.write_table(table, path), None),
+        'tuned': (tuned, etl_pipeline.write_parquet, etl_pipeline.ROW_GROUP_SIZE),
+    }
+    for size in row_group_sizes:
+        if size != etl_pipeline.ROW_GROUP_SIZE:
+            result[f'tuned_rg{size}'] = (tuned, functools.partial(etl_pipeline.write_parquet, row_group_size=size), size)
+    return result
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 2)
+
+
+def row_groups_read(dataset, expression):
+    """Row groups que sobram depois da eliminação das partições e das estatísticas min/max, e o total."""
+    total = sum(fragment.num_row_groups for fragment in dataset.get_fragments())
+    kept = sum(len(fragment.split_by_row_group(filter=expression)) for fragment in dataset.get_fragments(expression))
+    return kept, total
+
+
+def measure(root, ids, repeat):
+    dataset = ds.dataset(root, format='parquet', partitioning='hive')
+    files = glob.glob(os.path.join(root, '**', '*.parquet'), recursive=True)
+
+    date_type = dataset.schema.field(etl_pipeline.SORT_COLUMN).type
+    start, end = (pa.scalar(pd.Timestamp(d), type=date_type) for d in DATE_WINDOW)
+    date_filter = (ds.field(etl_pipeline.SORT_COLUMN) >= start) & (ds.field(etl_pipeline.SORT_COLUMN) < end)
+    id_filters = [ds.field(col) == value for col, value in ids]
+
+    date_kept, total = row_groups_read(dataset, date_filter)
+    id_kept = [row_groups_read(dataset, f)[0] for f in id_filters]
+    report = {
+        'files': len(files),
+        'row_groups': total,
+        'size_mb': round(sum(os.path.getsize(f) for f in files) / 2**20, 2),
+        'full_ms': _median_ms(lambda: dataset.to_table(), repeat),
+        'date_ms': _median_ms(lambda: dataset.to_table(filter=date_filter), repeat),
+        'date_rg_read': round(date_kept / total, 3),
+        'id_ms': round(statistics.mean(_median_ms(lambda f=f: dataset.to_table(filter=f), repeat)
+                                       for f in id_filters), 2),
+        'id_rg_read': round(statistics.mean(id_kept) / total, 3),
+    }
+
+    try:
+        import duckdb
+    except ImportError:
+        return report
+
+    con = duckdb.connect()
+    source = f"read_parquet('{root}/**/*.parquet', hive_partitioning = true)"
+    report['id_duckdb_ms'] = round(statistics.mean(
+        _median_ms(lambda col=col, value=value: con.execute(
+            f"SELECT * FROM {source} WHERE {col} = ?", [value]).fetch_arrow_table(), repeat)
+        for col, value in ids
+    ), 2)
+    return report
+
+
+def sample_ids(full, n, rng):
+    """Identificadores existentes, alternando entre nct_id e eudract_nr."""
+    ids = []
+    for i in range(n):
+        col = etl_pipeline.BLOOM_FILTER_COLUMNS[i % len(etl_pipeline.BLOOM_FILTER_COLUMNS)]
+        values = full[col].dropna().to_numpy()
+        ids.append((col, str(rng.choice(values))))
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help="escalas do volume português")
+    parser.add_argument('--row-group-sizes', type=int, nargs='*', default=[],
+                        help="outros tamanhos de row group a comparar com a disposição atual")
+    parser.add_argument('--lookups', type=int, default=10, help="número de pesquisas por id")
+    parser.add_argument('--repeat', type=int, default=5, help="repetições de cada leitura (mediana)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="CSV com os resultados")
+    args = parser.parse_args()
+
+    report = []
+    rng = np.random.default_rng(args.seed)
+    for scale in args.scales:
+        data = make_dataset(scale, args.seed)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            full = build_full(data, tmp_dir)
+            ids = sample_ids(full, args.lookups, rng)
+            print(f"Escala {scale:g}: {len(full):,} ensaios")
+
+            for name, (sort_by, writer, row_group_size) in layouts(args.row_group_sizes).items():
+                df = full.sort_values(sort_by, kind='stable', na_position='last', ignore_index=True)
+                root = os.path.join(tmp_dir, name)
+                etl_pipeline.save_df_dataset(df, root, writer=writer)
+                result = dict(scale=scale, layout=name, row_group_size=row_group_size, **measure(root, ids, args.repeat))
+                report.append(result)
+                print(f"  {name}: {result['size_mb']} MB, full {result['full_ms']} ms, date {result['date_ms']} ms, "
+                      f"id {result['id_ms']} ms")
+
+    report = pd.DataFrame(report)
+    print()
+    print(report.to_string(index=False))
+    if args.out:
+        report.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Gerador de dados sintéticos com a forma das saídas dos scrapers (`ctis`, `trials`, `pap`) e da extração AACT.
+
+Os volumes de referência (escala 1) correspondem aproximadamente aos ensaios com centros em Portugal; as escalas
+10 e 100 simulam a extensão a outros países. Os identificadores são gerados com sobreposição entre fontes
+(ensaios transitados para o CTIS, números EudraCT na AACT, NCT no EU-CTR) para que o crosswalk e os merges
+façam trabalho realista.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/synthetic_data.py --scale 10 --out /tmp/ptoolctex_x10
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Volumes aproximados das fontes para Portugal (escala 1)
+BASE_VOLUME = {
+    'trials': 3000,
+    'ctis': 600,
+    'pap': 180,
+    'aact': 5000,
+}
+
+# Proporção de sobreposição entre registos
+OVERLAP = {
+    'ctis_transitioned': 0.15,  # ensaios do CTIS com número EudraCT de um ensaio do EU-CTR
+    'trials_with_nct': 0.2,     # ensaios do EU-CTR com número NCT de um estudo da AACT
+    'aact_with_eudract': 0.25,  # estudos da AACT com número EudraCT de um ensaio do EU-CTR
+}
+
+AREAS = [
+    ('Cancer', 'C04'), ('Respiratory Tract Diseases', 'C08'), ('Cardiovascular Diseases', 'C14'),
+    ('Nervous System Diseases', 'C10'), ('Immune System Diseases', 'C20'), ('Digestive System Diseases', 'C06'),
+    ('Nutritional and Metabolic Diseases', 'C18'), ('Virus Diseases', 'C02'), ('Skin and Connective Tissue Diseases', 'C17'),
+    ('Eye Diseases', 'C11'), ('Blood and lymphatic diseases', 'C15'), ('Musculoskeletal Diseases', 'C05'),
+]
+CONDITIONS = [
+    'Breast Cancer', 'Non-Small Cell Lung Cancer', 'Multiple Myeloma', 'Type 2 Diabetes Mellitus', 'Asthma',
+    'Chronic Obstructive Pulmonary Disease', 'Heart Failure', 'Atrial Fibrillation', 'Multiple Sclerosis',
+    'Alzheimer Disease', 'Psoriasis', 'Rheumatoid Arthritis', 'Crohn Disease', 'Ulcerative Colitis', 'HIV Infections',
+    'Hepatitis B', 'Amyotrophic Lateral Sclerosis', 'Spinal Muscular Atrophy', 'Atopic Dermatitis', 'Hemophilia A',
+    'Prostate Cancer', 'Melanoma', 'Obesity', 'Migraine', 'Macular Degeneration', 'Sickle Cell Disease',
+]
+DRUGS = [
+    'Pembrolizumab', 'Nivolumab', 'Tirzepatide', 'Semaglutide', 'Dupilumab', 'Ocrelizumab', 'Lecanemab', 'Tofersen',
+    'Risankizumab', 'Upadacitinib', 'Dapagliflozin', 'Empagliflozin', 'Daratumumab', 'Olaparib', 'Trastuzumab deruxtecan',
+    'Emicizumab', 'Faricimab', 'Atogepant', 'Lenacapavir', 'Placebo',
+]
+SPONSORS = [
+    ('Boehringer Ingelheim International GmbH', 'Pharmaceutical company'),
+    ('Novartis Pharma AG', 'Pharmaceutical company'),
+    ('F. Hoffmann-La Roche Ltd', 'Pharmaceutical company'),
+    ('AstraZeneca AB', 'Pharmaceutical company'),
+    ('Eli Lilly and Company', 'Pharmaceutical company'),
+    ('Merck Sharp & Dohme LLC', 'Pharmaceutical company'),
+    ('Centro Hospitalar Universitário de Lisboa Norte', 'Hospital/Clinic/Other health care facility'),
+    ('Universidade de Coimbra', 'Educational Institution'),
+    ('European Organisation for Research and Treatment of Cancer', 'Non-Profit Organisation'),
+]
+STATUS_EU = ['Completed', 'Ongoing', 'Prematurely Ended', 'Restarted', 'Temporarily Halted']
+CRITERIA = [
+    'Signed informed consent', 'Age 18 years or older', 'ECOG performance status 0-1',
+    'Adequate organ function', 'Measurable disease per RECIST 1.1', 'HbA1c between 7.0% and 10.5%',
+    'Pregnant or breastfeeding women', 'Active infection requiring systemic therapy', 'Prior treatment with the study drug',
+    'History of severe hypersensitivity', 'Participation in another interventional trial',
+]
+
+# Etiquetas das secções E.6, E.7, E.8 e F.1 das páginas do EU-CTR (colunas expandidas pelo clean_trials)
+TRIAL_SCOPE_LABELS = [
+    'Diagnosis', 'Prophylaxis', 'Therapy', 'Safety', 'Efficacy', 'Pharmacokinetic', 'Pharmacodynamic',
+    'Bioequivalence', 'Dose response', 'Pharmacogenetic', 'Pharmacogenomic', 'Pharmacoeconomic', 'Others',
+    'Other scope of the trial description',
+]
+TRIAL_PHASE_LABELS = [
+    'Human pharmacology (Phase I)', 'First administration to humans', 'Bioequivalence study', 'Other',
+    'Other trial type description', 'Therapeutic exploratory (Phase II)', 'Therapeutic confirmatory (Phase III)',
+    'Therapeutic use (Phase IV)',
+]
+TRIAL_DESIGN_LABELS = [
+    'Controlled', 'Randomised', 'Open', 'Single blind', 'Double blind', 'Parallel group', 'Cross over', 'Other',
+    'Other trial design description', 'Other medicinal product(s)', 'Placebo', 'Comparator of controlled trial',
+    'Number of treatment arms in the trial', 'The trial involves single site in the Member State concerned',
+    'The trial involves multiple sites in the Member State concerned',
+    'Number of sites anticipated in Member State concerned', 'The trial involves multiple Member States',
+    'Number of sites anticipated in the EEA', 'Trial being conducted both within and outside the EEA',
+    'Trial being conducted completely outside of the EEA',
+    'If E.8.6.1 or E.8.6.2 are Yes, specify the regions in which trial sites are planned',
+    'Trial has a data monitoring committee',
+    'Definition of the end of the trial and justification where it is not the last visit of the last subject undergoing the trial',
+    'In the Member State concerned years', 'In the Member State concerned months', 'In the Member State concerned days',
+    'In all countries concerned by the trial years', 'In all countries concerned by the trial months',
+    'In all countries concerned by the trial days',
+]
+AGE_LABELS = [
+    'Trial has subjects under 18', 'In Utero', 'Preterm newborn infants (up to gestational age < 37 weeks)',
+    'Newborns (0-27 days)', 'Infants and toddlers (28 days-23 months)', 'Children (2-11years)',
+    'Adolescents (12-17 years)', 'Adults (18-64 years)', 'Elderly (>=65 years)',
+    'Number of subjects for this age range:',
+]
+CTIS_PHASES = [
+    'Human pharmacology (Phase I)', 'Therapeutic exploratory (Phase II)', 'Therapeutic confirmatory  (Phase III)',
+    'Therapeutic use (Phase IV)', 'Phase I and Phase II (Integrated)', 'Phase II and Phase III (Integrated)',
+]
+CTIS_AGES = ['0-17 years', '18-64 years', '65+ years']
+
+AACT_PHASES = ['EARLY_PHASE1', 'PHASE1', 'PHASE1/PHASE2', 'PHASE2', 'PHASE2/PHASE3', 'PHASE3', 'PHASE4', 'NA']
+AACT_STATUS = ['COMPLETED', 'RECRUITING', 'ACTIVE_NOT_RECRUITING', 'TERMINATED', 'WITHDRAWN', 'NOT_YET_RECRUITING']
+AACT_SOURCE_CLASS = ['INDUSTRY', 'OTHER', 'NIH', 'OTHER_GOV', 'NETWORK']
+
+
+def _dates(rng, n, start='2004-01-01', end='2025-06-30'):
+    start, end = pd.Timestamp(start).value // 10**9, pd.Timestamp(end).value // 10**9
+    return pd.to_datetime(rng.integers(start, end, n), unit='s').normalize()
+
+
+def _pick(rng, values, n, k=None):
+    if k is None:
+        return [values[i] for i in rng.integers(0, len(values), n)]
+    return [[values[i] for i in rng.choice(len(values), size=kk, replace=False)] for kk in rng.integers(1, k + 1, n)]
+
+
+def _flags(rng, n, p=0.5):
+    return np.where(rng.random(n) < p, '1', '0')
+
+
+def eudract_numbers(rng, n, offset=0):
+    years = rng.integers(2004, 2023, n)
+    return [f"{y}-{offset + i:06d}-{c:02d}" for i, (y, c) in enumerate(zip(years, rng.integers(10, 99, n)))]
+
+
+def make_trials(n, rng, nct_pool=()):
+    """Ensaios do registo antigo (EU-CTR), com a forma da saída do TrialsSpider."""
+    eudract = eudract_numbers(rng, n)
+    nct = np.array([None] * n, dtype=object)
+    if len(nct_pool):
+        linked = rng.random(n) < OVERLAP['trials_with_nct']
+        nct[linked] = rng.choice(np.asarray(nct_pool), linked.sum())
+    start = _dates(rng, n, end='2023-01-30')
+    end = start + pd.to_timedelta(rng.integers(180, 3000, n), unit='D')
+    sponsors = _pick(rng, SPONSORS, n)
+    areas = _pick(rng, AREAS, n)
+
+    def sections(labels):
+        # Secções Yes/No da página de detalhe, já com 1/0 como no spider
+        values = rng.random((n, len(labels))) < 0.4
+        return [{label: '1' if v else '0' for label, v in zip(labels, row)} for row in values]
+
+    design = sections(TRIAL_DESIGN_LABELS)
+    for d, arms in zip(design, rng.integers(1, 5, n)):
+        d['Number of treatment arms in the trial'] = str(arms)
+
+    df = pd.DataFrame({
+        'title': [f"A study of {d} in {c}" for d, c in zip(_pick(rng, DRUGS, n), _pick(rng, CONDITIONS, n))],
+        'eudract_nr': eudract,
+        'nct_nr': nct,
+        'trial_design': [json.dumps(d) for d in design],
+        'trial_scope': [json.dumps(d) for d in sections(TRIAL_SCOPE_LABELS)],
+        'trial_phase': [json.dumps(d) for d in sections(TRIAL_PHASE_LABELS)],
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'Protocol': [f"PRT-{i:06d}" for i in rng.integers(0, 10**6, n)],
+        'Sponsor': [s for s, _ in sponsors],
+        'therapeutic_area': [f"Diseases [C] - {a} [{code}]" for a, code in areas],
+        'condition': [json.dumps(c) for c in _pick(rng, CONDITIONS, n, k=2)],
+    })
+    for label in AGE_LABELS:
+        df[f"Age_{label.replace(' ', '_')}"] = _flags(rng, n, 0.3)
+    df['Gender_F'] = _flags(rng, n, 0.9)
+    df['Gender_M'] = _flags(rng, n, 0.9)
+    df['inclusion_crt'] = [json.dumps(c) for c in _pick(rng, CRITERIA[:6], n, k=4)]
+    df['exclusion_crt'] = [json.dumps(c) for c in _pick(rng, CRITERIA[6:], n, k=4)]
+    df['status'] = _pick(rng, STATUS_EU, n)
+    df['url'] = [f"https://www.clinicaltrialsregister.eu/ctr-search/trial/{e}/PT" for e in eudract]
+    return df
+
+
+def make_ctis(n, rng, eudract_pool=()):
+    """Ensaios do CTIS, com a forma da saída do CtisEuSpider."""
+    years = rng.integers(2022, 2026, n)
+    ct_numbers = np.array([f"{y}-5{i:05d}-{c:02d}-00" for i, (y, c) in enumerate(zip(years, rng.integers(10, 99, n)))],
+                          dtype=object)
+    if len(eudract_pool):
+        transitioned = rng.random(n) < OVERLAP['ctis_transitioned']
+        ct_numbers[transitioned] = [f"{e}-00" for e in rng.choice(np.asarray(eudract_pool), transitioned.sum())]
+    start = _dates(rng, n, start='2022-01-31')
+    end = start + pd.to_timedelta(rng.integers(180, 2500, n), unit='D')
+    sponsors = _pick(rng, SPONSORS, n)
+    areas = _pick(rng, AREAS, n, k=2)
+
+    return pd.DataFrame({
+        'title': [f"A trial of {d} in patients with {c}" for d, c in zip(_pick(rng, DRUGS, n), _pick(rng, CONDITIONS, n))],
+        'eudract_nr': ct_numbers,
+        'nct_nr': None,
+        'trial_phase': rng.integers(1, 8, n).astype(str),
+        'trial_phase_desc': _pick(rng, CTIS_PHASES, n),
+        'trial_design': None,
+        'trial_scope': None,
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'Protocol': [f"CT-{i:06d}" for i in rng.integers(0, 10**6, n)],
+        'Sponsor': [s for s, _ in sponsors],
+        'Sponsor_type': [t for _, t in sponsors],
+        'therapeutic_area': [json.dumps([f"Diseases [C] - {a} [{code}]" for a, code in a_list]) for a_list in areas],
+        'condition': _pick(rng, CONDITIONS, n),
+        'Disease': None,
+        'Age': [', '.join(a) for a in _pick(rng, CTIS_AGES, n, k=2)],
+        'Gender': _pick(rng, ['Female, Male', 'Female', 'Male'], n),
+        'inclusion_crt': [json.dumps(c) for c in _pick(rng, CRITERIA[:6], n, k=4)],
+        'exclusion_crt': [json.dumps(c) for c in _pick(rng, CRITERIA[6:], n, k=4)],
+        'nr_enrolled': rng.integers(5, 2000, n).astype(str),
+        'url': [f"https://euclinicaltrials.eu/ctis-public-api/retrieve/{c}" for c in ct_numbers],
+        'status': rng.integers(1, 12, n),
+    })
+
+
+def make_pap(n, rng):
+    """Programas de acesso precoce do Infarmed, com a forma da saída do PapInfarmedSpider."""
+    drugs = _pick(rng, DRUGS[:-1], n)
+    decided = _dates(rng, n, start='2015-01-01')
+    active = rng.random(n) < 0.7
+    with_costs = pd.array(np.where(rng.random(n) < 0.3, None, rng.random(n) < 0.5), dtype='boolean')
+    return pd.DataFrame({
+        'Nome': pd.array([f"{d[:6]}{i % 97}" for i, d in enumerate(drugs)], dtype='string'),
+        'DCI': pd.array(drugs, dtype='string'),
+        'decisao': pd.array(_pick(rng, ['Deferido', 'Indeferido', 'Deferido parcialmente'], n), dtype='string'),
+        'data_decisao': pd.array(decided.strftime('%d/%m/%Y'), dtype='string'),
+        'detalhes': pd.array([f"{d} é indicado para o tratamento de adultos com {c}."
+                              for d, c in zip(drugs, _pick(rng, CONDITIONS, n))], dtype='string'),
+        'n_doentes': pd.array(np.where(rng.random(n) < 0.3, None, rng.integers(1, 300, n)), dtype='Int64'),
+        'cond_observ': pd.array(np.where(active, 'PAP ativo com custos', 'PAP inativo'), dtype='string'),
+        'PAP_act': pd.array(active, dtype='boolean'),
+        'c_custos': with_costs,
+        'recurr_n_dtes': pd.array(np.where(rng.random(n) < 0.01, 'ano', None), dtype='string'),
+    })
+
+
+def make_aact(n, rng):
+    """Estudos da AACT (ClinicalTrials.gov), com as colunas devolvidas pela AACT_QUERY do ETL (sem números EudraCT)."""
+    nct = [f"NCT{i:08d}" for i in rng.choice(10**8, n, replace=False)]
+    submitted = _dates(rng, n, start='2000-01-01')
+    start = submitted + pd.to_timedelta(rng.integers(0, 200, n), unit='D')
+    completion = start + pd.to_timedelta(rng.integers(90, 3000, n), unit='D')
+    sponsors = _pick(rng, SPONSORS, n)
+    conditions = _pick(rng, CONDITIONS, n, k=3)
+    criteria = [
+        "Inclusion Criteria:\n\n* " + "\n* ".join(inc) + "\n\nExclusion Criteria:\n\n* " + "\n* ".join(exc)
+        for inc, exc in zip(_pick(rng, CRITERIA[:6], n, k=4), _pick(rng, CRITERIA[6:], n, k=4))
+    ]
+    min_age = rng.integers(0, 40, n).astype(float)
+    max_age = min_age + rng.integers(10, 60, n)
+    min_unit = np.where(min_age < 2, 'Months', 'Years')
+    observational = rng.random(n) < 0.25
+
+    def sparse(values, p=0.1):
+        # Colunas de texto livre raramente preenchidas (nunca totalmente vazias, como nos dados reais)
+        return np.where(rng.random(n) < p, _pick(rng, values, n), None)
+
+    return pd.DataFrame({
+        'nct_id': nct,
+        'eudract_id': None,
+        'terms': [[c.split()[0]] for c in _pick(rng, CONDITIONS, n)],
+        'grouping': [[a] for a, _ in _pick(rng, AREAS, n)],
+        'condition': conditions,
+        'official_title': [f"A Study to Evaluate {d} in Participants With {c[0]}" for d, c in zip(_pick(rng, DRUGS, n), conditions)],
+        'acronym': np.where(rng.random(n) < 0.4, [f"ACR{i}" for i in range(n)], None),
+        'phase': np.where(observational, 'NA', _pick(rng, AACT_PHASES, n)),
+        'study_type': np.where(observational, 'OBSERVATIONAL', 'INTERVENTIONAL'),
+        'allocation': np.where(observational, None, _pick(rng, ['RANDOMIZED', 'NON_RANDOMIZED', 'NA'], n)),
+        'intervention_model': np.where(observational, None, _pick(rng, ['PARALLEL', 'CROSSOVER', 'SINGLE_GROUP', 'SEQUENTIAL'], n)),
+        'intervention_model_description': sparse(['Participants are randomized 1:1', 'Single arm, open-label']),
+        'observational_model': np.where(observational, _pick(rng, ['COHORT', 'CASE_CONTROL'], n), None),
+        'primary_purpose': np.where(observational, None, _pick(rng, ['TREATMENT', 'PREVENTION', 'DIAGNOSTIC'], n)),
+        'time_perspective': np.where(observational, _pick(rng, ['PROSPECTIVE', 'RETROSPECTIVE'], n), None),
+        'masking': np.where(observational, None, _pick(rng, ['NONE', 'SINGLE', 'DOUBLE', 'TRIPLE', 'QUADRUPLE'], n)),
+        'masking_description': sparse(['Double-blind, placebo-controlled']),
+        'subject_masked': rng.random(n) < 0.3,
+        'caregiver_masked': rng.random(n) < 0.2,
+        'investigator_masked': rng.random(n) < 0.3,
+        'outcomes_assessor_masked': rng.random(n) < 0.3,
+        'overall_status': _pick(rng, AACT_STATUS, n),
+        'source': [s for s, _ in sponsors],
+        'source_class': _pick(rng, AACT_SOURCE_CLASS, n),
+        'baseline_population': sparse(['All randomized participants']),
+        'enrollment': rng.integers(5, 5000, n).astype(float),
+        'enrollment_type': _pick(rng, ['ACTUAL', 'ESTIMATED'], n),
+        'gender': _pick(rng, [['ALL'], ['FEMALE'], ['MALE']], n),
+        'minimum_age_num': min_age,
+        'minimum_age_unit': min_unit,
+        'maximum_age_num': max_age,
+        'maximum_age_unit': 'Years',
+        'number_of_arms': rng.integers(1, 5, n).astype(float),
+        'number_of_groups': np.where(observational, rng.integers(1, 4, n), np.nan),
+        'interv': _pick(rng, DRUGS, n, k=2),
+        'criteria': [[c] for c in criteria],
+        'keys': _pick(rng, [c.lower() for c in CONDITIONS], n, k=3),
+        'why_stopped': sparse(['Sponsor decision', 'Slow recruitment'], p=0.05),
+        'study_first_submitted_date': submitted,
+        'start_month_year': start.strftime('%Y-%m'),
+        'start_date': start,
+        'start_date_type': _pick(rng, ['ACTUAL', 'ESTIMATED'], n),
+        'completion_month_year': completion.strftime('%Y-%m'),
+        'completion_date': completion,
+        'completion_date_type': _pick(rng, ['ACTUAL', 'ESTIMATED'], n),
+        'has_expanded_access': rng.random(n) < 0.02,
+        'expanded_access_nctid': sparse([f"NCT{i:08d}" for i in range(100)], p=0.02),
+        'expanded_access_status_for_nctid': sparse(['Available', 'No longer available'], p=0.02),
+        'expanded_access_type_individual': sparse([True], p=0.01),
+        'expanded_access_type_intermediate': sparse([True], p=0.01),
+        'expanded_access_type_treatment': sparse([True], p=0.01),
+    })
+
+
+def make_dataset(scale=1, seed=0):
+    """
+    Gera as quatro fontes do ETL a uma dada escala do volume português.
+
+    :param scale: multiplicador de BASE_VOLUME (ex.: 1, 10, 100)
+    :param seed: semente do gerador aleatório
+    :return: dicionário com os DataFrames `trials`, `ctis`, `pap` e `aact`
+    """
+    rng = np.random.default_rng(seed)
+    n = {source: max(int(volume * scale), 1) for source, volume in BASE_VOLUME.items()}
+
+    aact = make_aact(n['aact'], rng)
+    trials = make_trials(n['trials'], rng, nct_pool=aact['nct_id'].to_numpy())
+    eudract_pool = trials['eudract_nr'].to_numpy()
+    # Os números EudraCT da AACT vêm do EU-CTR (a tabela AACT é gerada primeiro para fornecer os NCT)
+    linked = rng.random(len(aact)) < OVERLAP['aact_with_eudract']
+    aact['eudract_id'] = aact['eudract_id'].astype(object)
+    aact.loc[linked, 'eudract_id'] = rng.choice(eudract_pool, linked.sum())
+
+    return {
+        'trials': trials,
+        'ctis': make_ctis(n['ctis'], rng, eudract_pool=eudract_pool),
+        'pap': make_pap(n['pap'], rng),
+        'aact': aact,
+    }
+
+
+def write_dataset(data, out_dir, country='pt'):
+    """
+    Grava as fontes como o ETL as espera: as dos scrapers em `country=…/source=…/<fonte>.parquet` e a extração AACT
+    em `aact/country=…/aact.parquet`.
+    """
+    for source, df in data.items():
+        parts = ['aact', f"country={country}"] if source == 'aact' else [f"country={country}", f"source={source}"]
+        folder = os.path.join(out_dir, *parts)
+        os.makedirs(folder, exist_ok=True)
+        df.to_parquet(os.path.join(folder, f"{source}.parquet"), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1, help="multiplicador do volume português")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--country', default='pt', help="país das partições gravadas")
+    parser.add_argument('--out', required=True, help="diretório de saída")
+    args = parser.parse_args()
+
+    data = make_dataset(args.scale, args.seed)
+    write_dataset(data, args.out, args.country)
+    for source, df in data.items():
+        print(f"{source}: {len(df):,} linhas")
+
+
+if __name__ == '__main__':
+    main()
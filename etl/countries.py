@@ -0,0 +1,73 @@
+import os
+
+# Países que o ETL sabe processar: código ISO 3166-1 alfa-2 (o mesmo dos scrapers) → nome na tabela
+# ctgov.countries da AACT
+COUNTRY_NAMES = {
+    'at': 'Austria',
+    'be': 'Belgium',
+    'bg': 'Bulgaria',
+    'hr': 'Croatia',
+    'cy': 'Cyprus',
+    'cz': 'Czechia',
+    'dk': 'Denmark',
+    'ee': 'Estonia',
+    'fi': 'Finland',
+    'fr': 'France',
+    'de': 'Germany',
+    'gr': 'Greece',
+    'hu': 'Hungary',
+    'is': 'Iceland',
+    'ie': 'Ireland',
+    'it': 'Italy',
+    'lv': 'Latvia',
+    'li': 'Liechtenstein',
+    'lt': 'Lithuania',
+    'lu': 'Luxembourg',
+    'mt': 'Malta',
+    'nl': 'Netherlands',
+    'no': 'Norway',
+    'pl': 'Poland',
+    'pt': 'Portugal',
+    'ro': 'Romania',
+    'sk': 'Slovakia',
+    'si': 'Slovenia',
+    'es': 'Spain',
+    'se': 'Sweden',
+}
+
+# Países processados quando o ETL corre sem indicação
+DEFAULT_COUNTRIES = ('pt',)
+
+
+def partition_dir(root, country, source=None):
+    """
+    Diretório de uma partição Hive (`country=…` e, opcionalmente, `source=…`) de um dataset.
+
+    Args:
+        root (str): Raiz do dataset.
+        country (str): Código do país.
+        source (str, optional): Fonte dos dados.
+
+    Returns:
+        str: Caminho do diretório.
+    """
+    parts = [f'country={country}'] + ([f'source={source}'] if source is not None else [])
+    return os.path.join(root, *parts)
+
+
+def dataset_countries(root):
+    """
+    Países presentes num dataset particionado por `country=…`.
+
+    Args:
+        root (str): Raiz do dataset.
+
+    Returns:
+        list: Códigos dos países, ordenados.
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name.split('=', 1)[1] for name in os.listdir(root)
+        if name.startswith('country=') and os.path.isdir(os.path.join(root, name))
+    )
@@ -0,0 +1,253 @@
+import logging
+from itertools import combinations
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Formatos dos identificadores de cada registo
+EUDRACT_PATTERN = r'(\d{4}-\d{6}-\d{2})'
+CT_NUMBER_PATTERN = r'(\d{4}-\d{6}-\d{2}-\d{2})'
+NCT_PATTERN = r'(NCT\d{8})'
+
+# Números CTIS de ensaios transitados mantêm o número EudraCT como prefixo
+# (os ensaios submetidos de raiz no CTIS usam a série 5xxxxx)
+TRANSITIONED_PATTERN = r'^(\d{4}-[0-4]\d{5}-\d{2})-\d{2}$'
+
+ID_TYPES = ['eudract_nr', 'ct_number', 'nct_id']
+
+
+def _as_string(df, col):
+    if col not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype='string')
+    return df[col].astype('string').str.strip().str.upper()
+
+
+def extract_registry_ids(df, eudract_col='eudract_nr', nct_col='nct_nr'):
+    """
+    Extrai e normaliza os identificadores de registo (EudraCT, CTIS ctNumber e NCT) de um DataFrame.
+
+    A coluna `eudract_col` pode conter números EudraCT (registo antigo) ou ctNumbers do CTIS, que são
+    separados aqui. Para ensaios transitados, o número EudraCT embutido no ctNumber é também extraído.
+
+    Args:
+        df (pd.DataFrame): DataFrame com os ensaios.
+        eudract_col (str): Coluna com o número EudraCT/ctNumber.
+        nct_col (str): Coluna com o número NCT.
+
+    Returns:
+        pd.DataFrame: DataFrame com as colunas `eudract_nr`, `ct_number` e `nct_id`, com o mesmo índice de `df`.
+    """
+    raw = _as_string(df, eudract_col)
+
+    ct_number = raw.str.extract(CT_NUMBER_PATTERN, expand=False)
+    eudract = (
+        raw.where(ct_number.isna())
+        .str.extract(EUDRACT_PATTERN, expand=False)
+        .fillna(ct_number.str.extract(TRANSITIONED_PATTERN, expand=False))
+    )
+    nct = _as_string(df, nct_col).str.extract(NCT_PATTERN, expand=False)
+
+    return pd.DataFrame({'eudract_nr': eudract, 'ct_number': ct_number, 'nct_id': nct}, index=df.index)
+
+
+def build_id_crosswalk(*id_frames):
+    """
+    Constrói a tabela de correspondência entre identificadores (EudraCT ↔ CTIS ctNumber ↔ NCT).
+
+    Cada linha dos DataFrames de identificadores liga os seus ids entre si; os componentes ligados
+    resultantes correspondem a um único ensaio, identificado por `trial_key`.
+
+    Um ensaio tem no máximo um id de cada tipo. Um id ligado diretamente a dois ids diferentes do mesmo tipo
+    (por exemplo, um NCT indicado por dois ensaios EudraCT) é ambíguo e não liga nenhum deles; uma ligação
+    que juntaria, por transitividade, dois ids do mesmo tipo também é ignorada. Os ensaios em causa ficam
+    separados em vez de serem fundidos numa só linha.
+
+    Args:
+        *id_frames (pd.DataFrame): DataFrames devolvidos por `extract_registry_ids`.
+
+    Returns:
+        pd.DataFrame: Tabela longa com as colunas `id_value`, `id_type` e `trial_key` (um id por linha).
+    """
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    # Ligações diretas (pares de ids da mesma linha) e, por id, os ids de cada tipo a que está ligado
+    id_type = {}
+    edges = {}
+    partners = {}
+    for ids in id_frames:
+        for row in ids[ID_TYPES].to_numpy(dtype=object):
+            values = [v for v in row if isinstance(v, str)]
+            for col, v in zip(ID_TYPES, row):
+                if isinstance(v, str):
+                    id_type.setdefault(v, col)
+                    parent.setdefault(v, v)
+            for a, b in combinations(values, 2):
+                edges[a, b] = None
+                partners.setdefault(a, {}).setdefault(id_type[b], set()).add(b)
+                partners.setdefault(b, {}).setdefault(id_type[a], set()).add(a)
+
+    ambiguous = {v for v, linked in partners.items() if any(len(same) > 1 for same in linked.values())}
+    types = {v: {t} for v, t in id_type.items()}  # tipos de id de cada componente, pela raiz
+    ignored = []
+    for a, b in edges:
+        if a in ambiguous or b in ambiguous:
+            ignored.append((a, b))
+            continue
+        ra, rb = find(a), find(b)
+        if ra == rb:
+            continue
+        if types[ra] & types[rb]:
+            ignored.append((a, b))
+            continue
+        parent[rb] = ra
+        types[ra] |= types.pop(rb)
+
+    if ignored:
+        logger.warning('Crosswalk: %d ligações ignoradas por juntarem ensaios distintos (%d ids ambíguos, ex.: %s); '
+                       'esses ensaios ficam separados.',
+                       len(ignored), len(ambiguous), ', '.join(sorted(ambiguous)[:5]))
+
+    # A chave de cada ensaio é o primeiro id por ordem de preferência (EudraCT, ctNumber, NCT)
+    rank = {col: i for i, col in enumerate(ID_TYPES)}
+    crosswalk = pd.DataFrame({
+        'id_value': list(id_type.keys()),
+        'id_type': list(id_type.values()),
+    })
+    crosswalk['component'] = [find(v) for v in crosswalk['id_value']]
+    crosswalk['_rank'] = crosswalk['id_type'].map(rank)
+
+    keys = (
+        crosswalk.sort_values(['_rank', 'id_value'])
+        .drop_duplicates('component')
+        .set_index('component')['id_value']
+    )
+
+    return (
+        crosswalk.assign(trial_key=lambda x: x['component'].map(keys))
+        .drop(columns=['component', '_rank'])
+        .sort_values(['trial_key', 'id_type'])
+        .reset_index(drop=True)
+    )
+
+
+def assign_trial_key(ids, crosswalk, prefix):
+    """
+    Atribui a `trial_key` a cada linha a partir do índice da tabela de correspondência.
+
+    Linhas sem qualquer identificador recebem uma chave única (`<prefix>-<índice>`) para nunca serem
+    emparelhadas entre si no merge.
+
+    Args:
+        ids (pd.DataFrame): DataFrame devolvido por `extract_registry_ids`.
+        crosswalk (pd.DataFrame): Tabela devolvida por `build_id_crosswalk`.
+        prefix (str): Prefixo das chaves atribuídas a linhas sem identificador.
+
+    Returns:
+        pd.Series: Série com a `trial_key` de cada linha.
+    """
+    index = crosswalk.set_index('id_value')['trial_key']
+
+    key = pd.Series(pd.NA, index=ids.index, dtype='object')
+    for col in ID_TYPES:
+        key = key.fillna(ids[col].map(index))
+
+    fallback = pd.Series([f'{prefix}-{i}' for i in range(len(ids))], index=ids.index)
+    return key.fillna(fallback)
+
+
+def conflicting_components(crosswalk):
+    """
+    Ensaios da tabela de correspondência que juntam mais do que um id do mesmo tipo.
+
+    A união é transitiva, pelo que uma única referência cruzada errada (por exemplo, um NCT indicado em dois
+    ensaios EudraCT distintos) fundiria ensaios diferentes na mesma `trial_key`; `build_id_crosswalk` ignora
+    essas ligações, pelo que só tabelas construídas de outra forma têm componentes destes.
+
+    Args:
+        crosswalk (pd.DataFrame): Tabela devolvida por `build_id_crosswalk`.
+
+    Returns:
+        pd.DataFrame: Uma linha por `trial_key` suspeita, com o número de ids de cada tipo (`eudract_nr`,
+            `ct_number`, `nct_id`).
+    """
+    counts = (
+        crosswalk.groupby(['trial_key', 'id_type']).size()
+        .unstack(fill_value=0)
+        .reindex(columns=ID_TYPES, fill_value=0)
+    )
+    return counts[(counts > 1).any(axis=1)]
+
+
+def _coalesce(df, rank, ascending):
+    # Uma linha por trial_key: os campos em falta da linha preferida (primeira pela ordem de `rank`)
+    # são preenchidos com os das outras linhas do mesmo ensaio
+    return (
+        df.assign(_rank=rank)
+        .sort_values('_rank', kind='stable', ascending=ascending)
+        .drop(columns='_rank')
+        .groupby('trial_key', sort=False).first()
+        .reset_index()
+        [df.columns]
+    )
+
+
+def merge_on_crosswalk(trials_eu, aact_df, crosswalk=None):
+    """
+    Junta os ensaios europeus com os da ClinicalTrials.gov através da `trial_key` comum.
+
+    Ao contrário de um merge direto por `eudract_nr`, evita o produto cartesiano das linhas sem número
+    EudraCT e junta os duplicados entre registos (ensaios transitados para o CTIS e linhas repetidas
+    da AACT) numa só linha por ensaio.
+
+    Args:
+        trials_eu (pd.DataFrame): Ensaios europeus (registo antigo e CTIS).
+        aact_df (pd.DataFrame): Ensaios da AACT, com as colunas `nct_id` e `eudract_nr`.
+        crosswalk (pd.DataFrame, optional): Tabela de correspondência já construída.
+
+    Returns:
+        tuple: (DataFrame resultante do merge, tabela de correspondência usada).
+    """
+    trials_eu = trials_eu.reset_index(drop=True)
+    aact_df = aact_df.reset_index(drop=True)
+
+    eu_ids = extract_registry_ids(trials_eu, eudract_col='eudract_nr', nct_col='nct_nr')
+    aact_ids = extract_registry_ids(aact_df, eudract_col='eudract_nr', nct_col='nct_id')
+
+    # Uma tabela construída de outra forma pode juntar ensaios distintos (ver `conflicting_components`):
+    # é reconstruída, para não fundir as suas linhas
+    if crosswalk is not None and len(conflicting_components(crosswalk)):
+        logger.warning('Crosswalk: a tabela indicada junta ensaios distintos; a reconstruir a partir dos dados.')
+        crosswalk = None
+    if crosswalk is None:
+        crosswalk = build_id_crosswalk(eu_ids, aact_ids)
+
+    # Em duplicados, prevalece o registo do CTIS e, na AACT, as linhas com número EudraCT; os campos
+    # que lhes faltam vêm das restantes linhas do mesmo ensaio
+    eu = _coalesce(
+        trials_eu.assign(trial_key=assign_trial_key(eu_ids, crosswalk, 'eu')),
+        rank=eu_ids['ct_number'].notna(), ascending=False,
+    )
+    aact = _coalesce(
+        aact_df.assign(trial_key=assign_trial_key(aact_ids, crosswalk, 'aact')),
+        rank=aact_ids['eudract_nr'].notna(), ascending=False,
+    ).rename(columns={'eudract_nr': 'eudract_nr_aact'})
+
+    logger.info('Crosswalk: %d ensaios, %d duplicados EU e %d duplicados AACT fundidos.',
+                crosswalk['trial_key'].nunique(), len(trials_eu) - len(eu), len(aact_df) - len(aact))
+
+    merged = (
+        pd.merge(eu, aact, on='trial_key', how='outer')
+        .assign(eudract_nr=lambda x: x['eudract_nr'].fillna(x['eudract_nr_aact']))
+        .drop(columns=['eudract_nr_aact'])
+    )
+
+    return merged, crosswalk
@@ -1,45 +1,77 @@
-import pandas as pd
-import duckdb as db
-import numpy as np
-import re
 import ast
+import json
+import logging
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from countries import COUNTRY_NAMES, DEFAULT_COUNTRIES, partition_dir
+from crosswalk import merge_on_crosswalk
+from facets import save_facets
+from pap import save_pap
+from schema import finalize_schema, memory_report
+from search_index import build_search_index
+from sponsors import apply_sponsor_table, build_sponsor_table, load_sponsor_table
+
+# Caminhos relativos à raiz do repositório, para que o ETL possa correr a partir de qualquer diretório
+# (linha de comandos em etl/ ou página Settings da aplicação)
+ETL_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(ETL_DIR)
+SCRAPED_DATA_DIR = os.path.join(ROOT_DIR, 'scrapers', 'eu_ctr', 'data')
+SOURCES_DIR = os.path.join(ROOT_DIR, 'sources')
+
+SPONSOR_TABLE_PATH = os.path.join(SOURCES_DIR, 'sponsor_lookup.parquet')
+# Tabela de correspondência de identificadores de cada país (id_crosswalk/country=…/id_crosswalk.parquet)
+ID_CROSSWALK_DIR = os.path.join(SOURCES_DIR, 'id_crosswalk')
+# Dataset servido à aplicação, particionado à Hive por país e fonte (full_df/country=…/source=…/part-0.parquet)
+FULL_DF_PATH = os.path.join(SOURCES_DIR, 'full_df')
+# Índice de pesquisa de texto (SQLite FTS5) sobre o full_df de todos os países; o rowid é a coluna `row_id`
+SEARCH_INDEX_PATH = os.path.join(SOURCES_DIR, 'search.sqlite')
+# Vocabulário e contagens das colunas filtráveis por país (opções dos filtros da aplicação)
+FACETS_PATH = os.path.join(SOURCES_DIR, 'facets.parquet')
+# Programas de acesso precoce na forma usada pela página Infography, e os seus agregados por ano/decisão/flags
+PAP_CLEAN_PATH = os.path.join(SOURCES_DIR, 'pap_clean.parquet')
+PAP_SUMMARY_PATH = os.path.join(SOURCES_DIR, 'pap_summary.parquet')
+# Última extração bem-sucedida da AACT de cada país (aact/country=…/aact.parquet), usada quando a base de dados
+# não está acessível
+AACT_SNAPSHOT_DIR = os.path.join(SOURCES_DIR, 'aact')
+EXCEL_EXPORT_PATH = os.path.join(ETL_DIR, 'data', 'full_merge.xlsx')
+
+AACT_USER = 'oliviaoliveira'
+AACT_PASSWORD = 'a123456B#'
 
 # ## Extraction
 # data from scrapping relevant websites
 
-ctis = pd.read_parquet('../scrapers/eu_ctr/data/ctis.parquet')
-
-pap = pd.read_parquet('../scrapers/eu_ctr/data/pap.parquet')
+def extract_scraped(data_dir=SCRAPED_DATA_DIR, country='pt'):
+    """
+    Lê os ficheiros Parquet produzidos pelos scrapers para um país (partição `country=…/source=…`).
 
-trials = pd.read_parquet('../scrapers/eu_ctr/data/trials.parquet')
+    Args:
+        data_dir (str): Diretório de saída dos scrapers.
+        country (str): Código do país.
 
+    Returns:
+        tuple: DataFrames `ctis`, `pap` e `trials`; `pap` é None se não houver PAP do país (só os há para Portugal).
+    """
+    def path(source):
+        return os.path.join(partition_dir(data_dir, country, source), f'{source}.parquet')
 
-# data from the aact innitiative
+    ctis = pd.read_parquet(path('ctis'))
+    pap = pd.read_parquet(path('pap')) if os.path.exists(path('pap')) else None
+    trials = pd.read_parquet(path('trials'))
+    return ctis, pap, trials
 
-con = db.connect()
-con.execute("INSTALL postgres_scanner")
-
-con.execute(
-    '''
-    LOAD postgres_scanner;
-    SET pg_debug_show_queries = False;
-    ATTACH '
-        host=aact-db.ctti-clinicaltrials.org
-        port=5432
-        dbname=aact
-        user=oliviaoliveira
-        password=a123456B#
-        connect_timeout=10
-    ' AS aact (TYPE POSTGRES, READ_ONLY, SCHEMA ctgov);
-
-    USE aact.ctgov;
-    '''
-)
 
-cursor = con.cursor()
+# data from the aact innitiative
 
-qry = '''
--- Query Principal para estudos em Portugal
+AACT_QUERY = '''
+-- Query Principal para estudos num país (parâmetro: nome do país na tabela countries)
 WITH extra_info AS (
     SELECT *
     FROM aact.ctgov.id_information
@@ -147,14 +179,65 @@ FROM aact.ctgov.studies s
          LEFT OUTER JOIN elig AS e on e.nct_id = s.nct_id
          LEFT OUTER JOIN key AS k on k.nct_id = s.nct_id
          LEFT OUTER JOIN inter on inter.nct_id = s.nct_id
-WHERE c.name = 'Portugal'
+WHERE c.name = ?
   AND c.removed = false
 ORDER BY study_first_submitted_date DESC;
 '''
 
-aact_cursor = cursor.execute(qry)
 
-aact_df = aact_cursor.fetch_df()
+def extract_aact(user=AACT_USER, password=AACT_PASSWORD, country='pt', snapshot_dir=AACT_SNAPSHOT_DIR):
+    """
+    Extrai os estudos com centros num país da base de dados AACT (ClinicalTrials.gov).
+
+    Cada extração bem-sucedida é guardada na partição do país em `snapshot_dir`; se a base de dados não estiver
+    acessível, é usada a última extração guardada.
+
+    Args:
+        user (str): Utilizador da AACT.
+        password (str): Palavra-passe da AACT.
+        country (str): Código do país (ver countries.COUNTRY_NAMES).
+        snapshot_dir (str): Diretório das cópias locais das extrações.
+
+    Returns:
+        pd.DataFrame: Resultado da query `AACT_QUERY`.
+    """
+    snapshot_path = os.path.join(partition_dir(snapshot_dir, country), 'aact.parquet')
+    try:
+        import duckdb as db
+
+        con = db.connect()
+        con.execute("INSTALL postgres_scanner")
+
+        con.execute(
+            f'''
+            LOAD postgres_scanner;
+            SET pg_debug_show_queries = False;
+            ATTACH '
+                host=aact-db.ctti-clinicaltrials.org
+                port=5432
+                dbname=aact
+                user={user}
+                password={password}
+                connect_timeout=10
+            ' AS aact (TYPE POSTGRES, READ_ONLY, SCHEMA ctgov);
+
+            USE aact.ctgov;
+            '''
+        )
+
+        cursor = con.cursor()
+        aact_cursor = cursor.execute(AACT_QUERY, [COUNTRY_NAMES[country]])
+        aact_df = aact_cursor.fetch_df()
+    except Exception as e:
+        if not os.path.exists(snapshot_path):
+            raise
+        print(f'AACT indisponível ({e}); a usar a extração guardada em {snapshot_path}')
+        return pd.read_parquet(snapshot_path)
+
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    aact_df.to_parquet(snapshot_path, index=False)
+    return aact_df
+
 
 # ## Transform
 # ### Portuguese Trials from Clinical Trials EU
@@ -162,214 +245,218 @@ aact_df = aact_cursor.fetch_df()
 
 # #### Clean of old database
 
-cols_w_dicts = ['trial_design', 'trial_scope', 'trial_phase']
+def clean_trials(trials):
+    cols_w_dicts = ['trial_design', 'trial_scope', 'trial_phase']
 
-# drop of columns with only null values
-trials_clean = trials.copy().dropna(axis=0, how='all').dropna(axis=1, how='all')
+    # drop of columns with only null values
+    trials_clean = trials.copy().dropna(axis=0, how='all').dropna(axis=1, how='all')
+
+    # Convert stringified dictionaries into Python dictionaries and expand the 'trial_design' column
+    for col in cols_w_dicts:
+        _temp = pd.json_normalize(trials_clean[col].apply(ast.literal_eval))
+        _temp.columns = ['.'.join([col, i.strip().replace(' ', '_')]) for i in _temp.columns]
+        _temp.infer_objects()
+        trials_clean = (
+            pd.concat([trials_clean, _temp], axis=1)
+            .drop(columns=[col])
+        )
+    return trials_clean
 
-# Convert stringified dictionaries into Python dictionaries and expand the 'trial_design' column
-for col in cols_w_dicts:
-    _temp = pd.json_normalize(trials_clean[col].apply(ast.literal_eval))
-    _temp.columns = ['.'.join([col, i.strip().replace(' ', '_')]) for i in _temp.columns]
-    _temp.infer_objects()
-    trials_clean = (
-        pd.concat([trials_clean, _temp], axis=1)
-        .drop(columns=[col])
-    )
 
 # #### Clean of new database
-# drop of columns with only null values
-ctis_clean = ctis.copy().dropna(axis=0, how='all').dropna(axis=1, how='all')
-
-cols_w_cols = ['Age', 'Gender']
-# Convert stringified dictionaries into Python dictionaries and expand the 'trial_design' column
-for col in cols_w_cols:
-    _temp = ctis_clean[col].str.get_dummies(', ')
-    _temp.columns = ['.'.join([col, i.strip().replace(' ', '_')]) for i in _temp.columns]
-    _temp.infer_objects()
-    ctis_clean = (
-        pd.concat([ctis_clean, _temp], axis=1)
-        .drop(columns=[col])
-    )
 
-phase_cols = ['Phase_I', 'Phase_II', 'Phase_III', 'Phase_IV']
+def clean_ctis(ctis):
+    # drop of columns with only null values
+    ctis_clean = ctis.copy().dropna(axis=0, how='all').dropna(axis=1, how='all')
 
-# Create dummy columns by iterating through rows
-for col in phase_cols:
-    phase_pattern = r'\b' + re.escape(col.replace('_', ' ')) + r'\b'
-    ctis_clean[col] = ctis_clean['trial_phase_desc'].str.contains(phase_pattern, regex=True).astype(int)
+    cols_w_cols = ['Age', 'Gender']
+    # Convert stringified dictionaries into Python dictionaries and expand the 'trial_design' column
+    for col in cols_w_cols:
+        _temp = ctis_clean[col].str.get_dummies(', ')
+        _temp.columns = ['.'.join([col, i.strip().replace(' ', '_')]) for i in _temp.columns]
+        _temp.infer_objects()
+        ctis_clean = (
+            pd.concat([ctis_clean, _temp], axis=1)
+            .drop(columns=[col])
+        )
 
-ctis_clean = ctis_clean.drop(columns=['trial_phase_desc'])
+    phase_cols = ['Phase_I', 'Phase_II', 'Phase_III', 'Phase_IV']
 
-# #### Merge of trials database
+    # Create dummy columns by iterating through rows
+    for col in phase_cols:
+        phase_pattern = r'\b' + re.escape(col.replace('_', ' ')) + r'\b'
+        ctis_clean[col] = ctis_clean['trial_phase_desc'].str.contains(phase_pattern, regex=True).astype(int)
 
-def normalize_inner_duplicates(column):
-    """
-    Normaliza valores duplicados em células de uma coluna pandas. Remove duplicações textuais em strings separadas por vírgulas.
+    ctis_clean = ctis_clean.drop(columns=['trial_phase_desc'])
+    return ctis_clean
 
-    Args:
-        column (pd.Series): Coluna do DataFrame a ser normalizada.
 
-    Returns:
-        pd.Series: Coluna com valores duplicados normalizados.
-    """
-    return column.apply(
-        lambda cell: ', '.join(dict.fromkeys(cell.split(', ')).keys()) if isinstance(cell, str) else cell
-    )
+# #### Merge of trials database
 
+def merge_trials_eu(trials_clean, ctis_clean, sponsor_table_path=SPONSOR_TABLE_PATH):
+    trials_eu = (
+        pd.concat([trials_clean, ctis_clean], axis=0)
+        .sort_values(by='start_date', ascending=True)
+        .assign(
+            start_date=lambda x: pd.to_datetime(x['start_date'], format='%Y-%m-%d', errors='coerce'),
+            end_date=lambda x: pd.to_datetime(x['end_date'], format='%Y-%m-%d', errors='coerce'),
+            Age_0_17_years=lambda x: pd.to_numeric(x['Age.0-17_years'], errors='coerce')
+            .fillna(pd.to_numeric(x['Age_Trial_has_subjects_under_18'], errors='coerce'))
+            .fillna(pd.to_numeric(x['Age_Adolescents_(12-17_years)'], errors='coerce'))
+            .fillna(pd.to_numeric(x['Age_Children_(2-11years)'], errors='coerce'))
+            .fillna(pd.to_numeric(x['Age_Infants_and_toddlers_(28_days-23_months)'], errors='coerce'))
+            .fillna(pd.to_numeric(x['Age_Newborns_(0-27_days)'], errors='coerce'))
+            .fillna(pd.to_numeric(x['Age_Preterm_newborn_infants_(up_to_gestational_age_<_37_weeks)'], errors='coerce'))
+            .astype('boolean'),
+            Age_18_64_years=lambda x: pd.to_numeric(x['Age_Adults_(18-64_years)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Age.18-64_years'], errors='coerce'))
+            .astype('boolean'),
+            Age_65p_years=lambda x: pd.to_numeric(x['Age_Elderly_(>=65_years)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Age.65+_years'], errors='coerce'))
+            .astype('boolean'),
+            Gender_F=lambda x: pd.to_numeric(x['Gender_F'], errors='coerce')
+            .fillna(pd.to_numeric(x['Gender.Female'], errors='coerce'))
+            .astype('boolean'),
+            Gender_M=lambda x: pd.to_numeric(x['Gender_M'], errors='coerce')
+            .fillna(pd.to_numeric(x['Gender.Male'], errors='coerce'))
+            .astype('boolean'),
+            trial_design_Controlled=lambda x: pd.to_numeric(x['trial_design.Controlled'], errors='coerce').astype('boolean'),
+            trial_design_Randomised=lambda x: pd.to_numeric(x['trial_design.Randomised'], errors='coerce').astype('boolean'),
+            trial_design_Open=lambda x: pd.to_numeric(x['trial_design.Open'], errors='coerce').astype('boolean'),
+            trial_design_Single_blind=lambda x: pd.to_numeric(x['trial_design.Single_blind'], errors='coerce').astype('boolean'),
+            trial_design_Double_blind=lambda x: pd.to_numeric(x['trial_design.Double_blind'], errors='coerce').astype('boolean'),
+            trial_design_Parallel_group=lambda x: pd.to_numeric(x['trial_design.Parallel_group'], errors='coerce').astype('boolean'),
+            trial_design_Cross_over=lambda x: pd.to_numeric(x['trial_design.Cross_over'], errors='coerce').astype('boolean'),
+            trial_design_Other_medicinal_product=lambda x: pd.to_numeric(x['trial_design.Other_medicinal_product(s)'], errors='coerce').astype('boolean'),
+            trial_design_Placebo=lambda x: pd.to_numeric(x['trial_design.Placebo'], errors='coerce').astype('boolean'),
+            trial_scope_Diagnosis=lambda x: pd.to_numeric(x['trial_scope.Diagnosis'], errors='coerce').astype('boolean'),
+            trial_scope_Prophylaxis=lambda x: pd.to_numeric(x['trial_scope.Prophylaxis'], errors='coerce').astype('boolean'),
+            trial_scope_Therapy=lambda x: pd.to_numeric(x['trial_scope.Therapy'], errors='coerce').astype('boolean'),
+            trial_scope_Safety=lambda x: pd.to_numeric(x['trial_scope.Safety'], errors='coerce').astype('boolean'),
+            trial_scope_Efficacy=lambda x: pd.to_numeric(x['trial_scope.Efficacy'], errors='coerce').astype('boolean'),
+            trial_scope_Pharmacokinetic=lambda x: pd.to_numeric(x['trial_scope.Pharmacokinetic'], errors='coerce').astype('boolean'),
+            trial_scope_Pharmacodynamic=lambda x: pd.to_numeric(x['trial_scope.Pharmacodynamic'], errors='coerce').astype('boolean'),
+            trial_scope_Bioequivalence=lambda x: pd.to_numeric(x['trial_scope.Bioequivalence'], errors='coerce').astype('boolean'),
+            trial_scope_Dose_response=lambda x: pd.to_numeric(x['trial_scope.Dose_response'], errors='coerce').astype('boolean'),
+            trial_scope_Pharmacogenetic=lambda x: pd.to_numeric(x['trial_scope.Pharmacogenetic'], errors='coerce').astype('boolean'),
+            trial_scope_Pharmacogenomic=lambda x: pd.to_numeric(x['trial_scope.Pharmacogenomic'], errors='coerce').astype('boolean'),
+            trial_phase_First_administration_to_humans=lambda x: pd.to_numeric(x['trial_phase.First_administration_to_humans'], errors='coerce').astype('boolean'),
+            trial_phase_Bioequivalence_study=lambda x: pd.to_numeric(x['trial_phase.Bioequivalence_study'], errors='coerce').astype('boolean'),
+            trial_Phase_I=lambda x: pd.to_numeric(x['trial_phase.Human_pharmacology_(Phase_I)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Phase_I'], errors='coerce'))
+            .astype('boolean')
+            .fillna(False),
+            trial_Phase_II=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_exploratory_(Phase_II)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Phase_II'], errors='coerce'))
+            .astype('boolean')
+            .fillna(False),
+            trial_Phase_III=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_confirmatory_(Phase_III)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Phase_III'], errors='coerce'))
+            .astype('boolean')
+            .fillna(False),
+            trial_Phase_IV=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_use_(Phase_IV)'], errors='coerce')
+            .fillna(pd.to_numeric(x['Phase_IV'], errors='coerce'))
+            .astype('boolean')
+            .fillna(False),
+        )
+    )
 
-trials_eu = (
-    pd.concat([trials_clean, ctis_clean], axis=0)
-    .sort_values(by='start_date', ascending=True)
-    .assign(
-        start_date=lambda x: pd.to_datetime(x['start_date'], format='%Y-%m-%d', errors='coerce'),
-        end_date=lambda x: pd.to_datetime(x['end_date'], format='%Y-%m-%d', errors='coerce'),
-        Sponsor=lambda x: normalize_inner_duplicates(x['Sponsor']).str.strip(),
-        Sponsor_type=lambda x: normalize_inner_duplicates(x['Sponsor_type']).str.strip(),
-        Age_0_17_years=lambda x: pd.to_numeric(x['Age.0-17_years'], errors='coerce')
-        .fillna(pd.to_numeric(x['Age_Trial_has_subjects_under_18'], errors='coerce'))
-        .fillna(pd.to_numeric(x['Age_Adolescents_(12-17_years)'], errors='coerce'))
-        .fillna(pd.to_numeric(x['Age_Children_(2-11years)'], errors='coerce'))
-        .fillna(pd.to_numeric(x['Age_Infants_and_toddlers_(28_days-23_months)'], errors='coerce'))
-        .fillna(pd.to_numeric(x['Age_Newborns_(0-27_days)'], errors='coerce'))
-        .fillna(pd.to_numeric(x['Age_Preterm_newborn_infants_(up_to_gestational_age_<_37_weeks)'], errors='coerce'))
-        .astype('boolean'),
-        Age_18_64_years=lambda x: pd.to_numeric(x['Age_Adults_(18-64_years)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Age.18-64_years'], errors='coerce'))
-        .astype('boolean'),
-        Age_65p_years=lambda x: pd.to_numeric(x['Age_Elderly_(>=65_years)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Age.65+_years'], errors='coerce'))
-        .astype('boolean'),
-        Gender_F=lambda x: pd.to_numeric(x['Gender_F'], errors='coerce')
-        .fillna(pd.to_numeric(x['Gender.Female'], errors='coerce'))
-        .astype('boolean'),
-        Gender_M=lambda x: pd.to_numeric(x['Gender_M'], errors='coerce')
-        .fillna(pd.to_numeric(x['Gender.Male'], errors='coerce'))
-        .astype('boolean'),
-        trial_design_Controlled=lambda x: pd.to_numeric(x['trial_design.Controlled'], errors='coerce').astype('boolean'),
-        trial_design_Randomised=lambda x: pd.to_numeric(x['trial_design.Randomised'], errors='coerce').astype('boolean'),
-        trial_design_Open=lambda x: pd.to_numeric(x['trial_design.Open'], errors='coerce').astype('boolean'),
-        trial_design_Single_blind=lambda x: pd.to_numeric(x['trial_design.Single_blind'], errors='coerce').astype('boolean'),
-        trial_design_Double_blind=lambda x: pd.to_numeric(x['trial_design.Double_blind'], errors='coerce').astype('boolean'),
-        trial_design_Parallel_group=lambda x: pd.to_numeric(x['trial_design.Parallel_group'], errors='coerce').astype('boolean'),
-        trial_design_Cross_over=lambda x: pd.to_numeric(x['trial_design.Cross_over'], errors='coerce').astype('boolean'),
-        trial_design_Other_medicinal_product=lambda x: pd.to_numeric(x['trial_design.Other_medicinal_product(s)'], errors='coerce').astype('boolean'),
-        trial_design_Placebo=lambda x: pd.to_numeric(x['trial_design.Placebo'], errors='coerce').astype('boolean'),
-        trial_scope_Diagnosis=lambda x: pd.to_numeric(x['trial_scope.Diagnosis'], errors='coerce').astype('boolean'),
-        trial_scope_Prophylaxis=lambda x: pd.to_numeric(x['trial_scope.Prophylaxis'], errors='coerce').astype('boolean'),
-        trial_scope_Therapy=lambda x: pd.to_numeric(x['trial_scope.Therapy'], errors='coerce').astype('boolean'),
-        trial_scope_Safety=lambda x: pd.to_numeric(x['trial_scope.Safety'], errors='coerce').astype('boolean'),
-        trial_scope_Efficacy=lambda x: pd.to_numeric(x['trial_scope.Efficacy'], errors='coerce').astype('boolean'),
-        trial_scope_Pharmacokinetic=lambda x: pd.to_numeric(x['trial_scope.Pharmacokinetic'], errors='coerce').astype('boolean'),
-        trial_scope_Pharmacodynamic=lambda x: pd.to_numeric(x['trial_scope.Pharmacodynamic'], errors='coerce').astype('boolean'),
-        trial_scope_Bioequivalence=lambda x: pd.to_numeric(x['trial_scope.Bioequivalence'], errors='coerce').astype('boolean'),
-        trial_scope_Dose_response=lambda x: pd.to_numeric(x['trial_scope.Dose_response'], errors='coerce').astype('boolean'),
-        trial_scope_Pharmacogenetic=lambda x: pd.to_numeric(x['trial_scope.Pharmacogenetic'], errors='coerce').astype('boolean'),
-        trial_scope_Pharmacogenomic=lambda x: pd.to_numeric(x['trial_scope.Pharmacogenomic'], errors='coerce').astype('boolean'),
-        trial_phase_First_administration_to_humans=lambda x: pd.to_numeric(x['trial_phase.First_administration_to_humans'], errors='coerce').astype('boolean'),
-        trial_phase_Bioequivalence_study=lambda x: pd.to_numeric(x['trial_phase.Bioequivalence_study'], errors='coerce').astype('boolean'),
-        trial_Phase_I=lambda x: pd.to_numeric(x['trial_phase.Human_pharmacology_(Phase_I)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Phase_I'], errors='coerce'))
-        .astype('boolean')
-        .fillna(False),
-        trial_Phase_II=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_exploratory_(Phase_II)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Phase_II'], errors='coerce'))
-        .astype('boolean')
-        .fillna(False),
-        trial_Phase_III=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_confirmatory_(Phase_III)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Phase_III'], errors='coerce'))
-        .astype('boolean')
-        .fillna(False),
-        trial_Phase_IV=lambda x: pd.to_numeric(x['trial_phase.Therapeutic_use_(Phase_IV)'], errors='coerce')
-        .fillna(pd.to_numeric(x['Phase_IV'], errors='coerce'))
-        .astype('boolean')
-        .fillna(False),
+    cols_drop = [
+        'Age_Preterm_newborn_infants_(up_to_gestational_age_<_37_weeks)',
+        'Age_Newborns_(0-27_days)',
+        'Age_Infants_and_toddlers_(28_days-23_months)',
+        'Age_Children_(2-11years)',
+        'Age_Adolescents_(12-17_years)',
+        'Age_Adults_(18-64_years)',
+        'Age_Elderly_(>=65_years)',
+        'Age_Number_of_subjects_for_this_age_range:',
+        'trial_design.The_trial_involves_single_site_in_the_Member_State_concerned',
+        'trial_design.The_trial_involves_multiple_sites_in_the_Member_State_concerned',
+        'trial_design.Number_of_sites_anticipated_in_Member_State_concerned',
+        'trial_design.The_trial_involves_multiple_Member_States',
+        'trial_design.Trial_being_conducted_both_within_and_outside_the_EEA',
+        'trial_design.Trial_being_conducted_completely_outside_of_the_EEA',
+        'trial_design.Trial_has_a_data_monitoring_committee',
+        'trial_design.In_the_Member_State_concerned_years',
+        'trial_design.In_the_Member_State_concerned_months',
+        'trial_design.In_the_Member_State_concerned_days',
+        'trial_design.In_all_countries_concerned_by_the_trial_years',
+        'trial_design.In_all_countries_concerned_by_the_trial_months',
+        'trial_design.In_all_countries_concerned_by_the_trial_days',
+        'trial_design.Number_of_sites_anticipated_in_the_EEA',
+        'trial_design.If_E.8.6.1_or_E.8.6.2_are_Yes,_specify_the_regions_in_which_trial_sites_are_planned',
+        'trial_phase.Other_trial_type_description',
+        'trial_design.Other_trial_design_description',
+        'trial_scope.Others',
+        'trial_scope.Other_scope_of_the_trial_description',
+        'trial_phase',
+        'Gender.Female',
+        'Gender.Male',
+        'trial_design.Controlled',
+        'trial_design.Randomised',
+        'trial_design.Open',
+        'trial_design.Single_blind',
+        'trial_design.Double_blind',
+        'trial_design.Parallel_group',
+        'trial_design.Cross_over',
+        'trial_design.Other',
+        'trial_design.Other_medicinal_product(s)',
+        'trial_design.Comparator_of_controlled_trial',
+        'trial_design.Placebo',
+        'trial_scope.Diagnosis',
+        'trial_scope.Prophylaxis',
+        'trial_scope.Therapy',
+        'trial_scope.Safety',
+        'trial_scope.Efficacy',
+        'trial_scope.Pharmacokinetic',
+        'trial_scope.Pharmacodynamic',
+        'trial_scope.Bioequivalence',
+        'trial_scope.Dose_response',
+        'trial_scope.Pharmacogenetic',
+        'trial_scope.Pharmacoeconomic',
+        'trial_scope.Pharmacogenomic',
+        'trial_phase.Human_pharmacology_(Phase_I)',
+        'trial_phase.First_administration_to_humans',
+        'trial_phase.Bioequivalence_study',
+        'trial_phase.Other',
+        'trial_phase.Therapeutic_exploratory_(Phase_II)',
+        'trial_phase.Therapeutic_confirmatory_(Phase_III)',
+        'trial_phase.Therapeutic_use_(Phase_IV)',
+        'Age.0-17_years',
+        'Age.18-64_years',
+        'Age.65+_years',
+        'Phase_I',
+        'Phase_II',
+        'Phase_III',
+        'Phase_IV',
+        'Age_Trial_has_subjects_under_18',
+        'Age_In_Utero',
+    ] + [i for i in trials_eu.columns if i.startswith('trial_design.Definition_of_the_end_of_the_trial_and_justification_where')]
+
+    # Tabela persistente de canonicalização de promotores (nome normalizado → nome canónico, tipos),
+    # reutilizada e atualizada entre execuções
+    sponsor_table = build_sponsor_table(
+        trials_eu['Sponsor'],
+        trials_eu['Sponsor_type'],
+        previous=load_sponsor_table(sponsor_table_path),
     )
-)
+    sponsor_table.to_parquet(sponsor_table_path, index=False)
+
+    sponsors = apply_sponsor_table(trials_eu['Sponsor'], sponsor_table)
 
-cols_drop = [
-    'Age_Preterm_newborn_infants_(up_to_gestational_age_<_37_weeks)',
-    'Age_Newborns_(0-27_days)',
-    'Age_Infants_and_toddlers_(28_days-23_months)',
-    'Age_Children_(2-11years)',
-    'Age_Adolescents_(12-17_years)',
-    'Age_Adults_(18-64_years)',
-    'Age_Elderly_(>=65_years)',
-    'Age_Number_of_subjects_for_this_age_range:',
-    'trial_design.The_trial_involves_single_site_in_the_Member_State_concerned',
-    'trial_design.The_trial_involves_multiple_sites_in_the_Member_State_concerned',
-    'trial_design.Number_of_sites_anticipated_in_Member_State_concerned',
-    'trial_design.The_trial_involves_multiple_Member_States',
-    'trial_design.Trial_being_conducted_both_within_and_outside_the_EEA',
-    'trial_design.Trial_being_conducted_completely_outside_of_the_EEA',
-    'trial_design.Trial_has_a_data_monitoring_committee',
-    'trial_design.In_the_Member_State_concerned_years',
-    'trial_design.In_the_Member_State_concerned_months',
-    'trial_design.In_the_Member_State_concerned_days',
-    'trial_design.In_all_countries_concerned_by_the_trial_years',
-    'trial_design.In_all_countries_concerned_by_the_trial_months',
-    'trial_design.In_all_countries_concerned_by_the_trial_days',
-    'trial_design.Number_of_sites_anticipated_in_the_EEA',
-    'trial_design.If_E.8.6.1_or_E.8.6.2_are_Yes,_specify_the_regions_in_which_trial_sites_are_planned',
-    'trial_phase.Other_trial_type_description',
-    'trial_design.Other_trial_design_description',
-    'trial_scope.Others',
-    'trial_scope.Other_scope_of_the_trial_description',
-    'trial_phase',
-    'Gender.Female',
-    'Gender.Male',
-    'trial_design.Controlled',
-    'trial_design.Randomised',
-    'trial_design.Open',
-    'trial_design.Single_blind',
-    'trial_design.Double_blind',
-    'trial_design.Parallel_group',
-    'trial_design.Cross_over',
-    'trial_design.Other',
-    'trial_design.Other_medicinal_product(s)',
-    'trial_design.Comparator_of_controlled_trial',
-    'trial_design.Placebo',
-    'trial_scope.Diagnosis',
-    'trial_scope.Prophylaxis',
-    'trial_scope.Therapy',
-    'trial_scope.Safety',
-    'trial_scope.Efficacy',
-    'trial_scope.Pharmacokinetic',
-    'trial_scope.Pharmacodynamic',
-    'trial_scope.Bioequivalence',
-    'trial_scope.Dose_response',
-    'trial_scope.Pharmacogenetic',
-    'trial_scope.Pharmacoeconomic',
-    'trial_scope.Pharmacogenomic',
-    'trial_phase.Human_pharmacology_(Phase_I)',
-    'trial_phase.First_administration_to_humans',
-    'trial_phase.Bioequivalence_study',
-    'trial_phase.Other',
-    'trial_phase.Therapeutic_exploratory_(Phase_II)',
-    'trial_phase.Therapeutic_confirmatory_(Phase_III)',
-    'trial_phase.Therapeutic_use_(Phase_IV)',
-    'Age.0-17_years',
-    'Age.18-64_years',
-    'Age.65+_years',
-    'Phase_I',
-    'Phase_II',
-    'Phase_III',
-    'Phase_IV',
-    'Age_Trial_has_subjects_under_18',
-    'Age_In_Utero',
-] + [i for i in trials_eu.columns if i.startswith('trial_design.Definition_of_the_end_of_the_trial_and_justification_where')]
-
-sponsor_dict = trials_eu.dropna(subset='Sponsor_type').groupby('Sponsor').agg({'Sponsor_type': lambda x: ', '.join(set((', '.join(set(x))).split(', ')))}).drop_duplicates()
-
-trials_eu = (
-    trials_eu
-    .drop(columns=cols_drop)
-    .assign(
-        Sponsor_type=lambda x: x['Sponsor'].map(sponsor_dict['Sponsor_type'])  # Está correcto?
+    trials_eu = (
+        trials_eu
+        .drop(columns=cols_drop)
+        .assign(
+            Sponsor=sponsors['Sponsor'],
+            Sponsor_type=sponsors['Sponsor_type'],
+        )
     )
-)
+    return trials_eu
+
 
 # ### Clinical Trials .gov
+
 def normalize_age_to_years_series(num_series, unit_series):
     # Converte valores com base na unidade
     years = np.where(unit_series == 'Years', num_series,  # Se unidade for anos, mantém
@@ -379,66 +466,67 @@ def normalize_age_to_years_series(num_series, unit_series):
     return pd.Series(years, index=num_series.index)
 
 
-aact_df_clean = (
-    pd.concat([
-        aact_df,
-        pd.get_dummies(aact_df['phase']),
-        pd.get_dummies(aact_df['allocation'], prefix='allocation'),
-        pd.get_dummies(aact_df['intervention_model'], prefix='intervention_model'),
-        pd.get_dummies(aact_df['masking'], prefix='masking'),
-        pd.get_dummies(aact_df['gender'].apply(lambda x: ' | '.join(map(str, x)) if isinstance(x, (list, tuple)) else pd.NA),prefix='Gender'),
-    ], axis=1)
-    .dropna(axis=0, how='all')
-    .dropna(axis=1, how='all')
-    .rename(columns={
-        'eudract_id': 'eudract_nr',
-        'official_title': 'title',
-        'acronym': 'Protocol',
-    })
-    .assign(
-        terms=lambda x: x['terms'].apply(lambda groupn: ' | '.join(map(str, groupn)) if isinstance(groupn, (list, tuple)) else groupn),
-        grouping=lambda x: x['grouping'].apply(lambda groupn: ' | '.join(map(str, groupn)) if isinstance(groupn, (list, tuple)) else groupn),
-        condition=lambda x: x['condition'].apply(lambda cond: ' | '.join(map(str, cond)) if isinstance(cond, (list, tuple)) else cond),
-        study_type=lambda x: x['study_type'].astype('category'),
-        intervention_model=lambda x: x['intervention_model'].astype('category'),
-        intervention_model_description=lambda x: x['intervention_model_description'].astype('category'),
-        observational_model=lambda x: x['observational_model'].astype('category'),
-        primary_purpose=lambda x: x['primary_purpose'].astype('category'),
-        time_perspective=lambda x: x['time_perspective'].astype('category'),
-        masking=lambda x: x['masking'].astype('category'),
-        overall_status=lambda x: x['overall_status'].astype('category'),
-        source_class=lambda x: x['source_class'].astype('category'),
-        enrollment_type=lambda x: x['enrollment_type'].astype('category'),
-        trial_Phase_I=lambda x: x['PHASE1'].fillna(x['PHASE1/PHASE2']).astype('boolean'),
-        trial_Phase_II=lambda x: x['PHASE2'].fillna(x['PHASE1/PHASE2']).astype('boolean'),
-        trial_Phase_III=lambda x: x['PHASE3'].fillna(x['PHASE2/PHASE3']).astype('boolean'),
-        trial_Phase_IV=lambda x: x['PHASE4'].astype('boolean'),
-        maximum_age_num=lambda x: normalize_age_to_years_series(x['maximum_age_num'], x['maximum_age_unit']),
-        minimum_age_num=lambda x: normalize_age_to_years_series(x['minimum_age_num'], x['minimum_age_unit']),
-        allocation_RANDOMIZED=lambda x: x['allocation_RANDOMIZED'].astype('boolean'),
-        allocation_NON_RANDOMIZED=lambda x: x['allocation_NON_RANDOMIZED'].astype('boolean'),
+def clean_aact(aact_df):
+    aact_df_clean = (
+        pd.concat([
+            aact_df,
+            pd.get_dummies(aact_df['phase']),
+            pd.get_dummies(aact_df['allocation'], prefix='allocation'),
+            pd.get_dummies(aact_df['intervention_model'], prefix='intervention_model'),
+            pd.get_dummies(aact_df['masking'], prefix='masking'),
+            pd.get_dummies(aact_df['gender'].apply(lambda x: ' | '.join(map(str, x)) if isinstance(x, (list, tuple)) else pd.NA),prefix='Gender'),
+        ], axis=1)
+        .dropna(axis=0, how='all')
+        .dropna(axis=1, how='all')
+        .rename(columns={
+            'eudract_id': 'eudract_nr',
+            'official_title': 'title',
+            'acronym': 'Protocol',
+        })
+        .assign(
+            terms=lambda x: x['terms'].apply(lambda groupn: ' | '.join(map(str, groupn)) if isinstance(groupn, (list, tuple)) else groupn),
+            grouping=lambda x: x['grouping'].apply(lambda groupn: ' | '.join(map(str, groupn)) if isinstance(groupn, (list, tuple)) else groupn),
+            condition=lambda x: x['condition'].apply(lambda cond: ' | '.join(map(str, cond)) if isinstance(cond, (list, tuple)) else cond),
+            study_type=lambda x: x['study_type'].astype('category'),
+            intervention_model=lambda x: x['intervention_model'].astype('category'),
+            intervention_model_description=lambda x: x['intervention_model_description'].astype('category'),
+            observational_model=lambda x: x['observational_model'].astype('category'),
+            primary_purpose=lambda x: x['primary_purpose'].astype('category'),
+            time_perspective=lambda x: x['time_perspective'].astype('category'),
+            masking=lambda x: x['masking'].astype('category'),
+            overall_status=lambda x: x['overall_status'].astype('category'),
+            source_class=lambda x: x['source_class'].astype('category'),
+            enrollment_type=lambda x: x['enrollment_type'].astype('category'),
+            trial_Phase_I=lambda x: x['PHASE1'].fillna(x['PHASE1/PHASE2']).astype('boolean'),
+            trial_Phase_II=lambda x: x['PHASE2'].fillna(x['PHASE1/PHASE2']).astype('boolean'),
+            trial_Phase_III=lambda x: x['PHASE3'].fillna(x['PHASE2/PHASE3']).astype('boolean'),
+            trial_Phase_IV=lambda x: x['PHASE4'].astype('boolean'),
+            maximum_age_num=lambda x: normalize_age_to_years_series(x['maximum_age_num'], x['maximum_age_unit']),
+            minimum_age_num=lambda x: normalize_age_to_years_series(x['minimum_age_num'], x['minimum_age_unit']),
+            allocation_RANDOMIZED=lambda x: x['allocation_RANDOMIZED'].astype('boolean'),
+            allocation_NON_RANDOMIZED=lambda x: x['allocation_NON_RANDOMIZED'].astype('boolean'),
+        )
+        .drop(columns=[
+            'phase',
+            'NA',
+            'PHASE1',
+            'PHASE2',
+            'PHASE1/PHASE2',
+            'PHASE3',
+            'PHASE2/PHASE3',
+            'PHASE4',
+            'minimum_age_unit',
+            'maximum_age_unit',
+            'allocation_NA',
+            'allocation',
+            'Gender_',
+            'gender',
+        ], errors='ignore')
     )
-    .drop(columns=[
-        'phase',
-        'NA',
-        'PHASE1',
-        'PHASE2',
-        'PHASE1/PHASE2',
-        'PHASE3',
-        'PHASE2/PHASE3',
-        'PHASE4',
-        'minimum_age_unit',
-        'maximum_age_unit',
-        'allocation_NA',
-        'allocation',
-        'Gender_',
-        'gender',
-    ], errors='ignore')
-)
+    return aact_df_clean
 
 
 # ### Final Merge
-import json
 
 # Função para converter o conteúdo da célula em uma lista
 def transformar_em_lista(valor):
@@ -551,91 +639,6 @@ def clean_therapeutic_area(row):
 
     return pd.NA if not areas_unique else areas_unique
 
-full = (
-    pd.merge(trials_eu, aact_df_clean, on='eudract_nr', how='outer')
-    .assign(
-        title=lambda x: x['title_y'].fillna(x['title_x']),
-        Protocol=lambda x: x['Protocol_y'].fillna(x['Protocol_x']),
-        start_date=lambda x: x[['start_date_x', 'start_date_y']].min(axis=1).fillna(x['start_date_x'].replace(False, pd.NA)).fillna(x['start_date_y'].replace(False, pd.NA)),
-        end_date=lambda x: x[['end_date', 'completion_date']].max(axis=1).fillna(x['end_date'].replace(False, pd.NA)).fillna(x['completion_date'].replace(False, pd.NA)),
-        trial_Early_Phase_I=lambda x: x['EARLY_PHASE1'].fillna(False).astype('boolean'),
-        trial_Phase_I=lambda x: x['trial_Phase_I_y'].fillna(x['trial_Phase_I_x']).astype('boolean'),
-        trial_Phase_II=lambda x: x['trial_Phase_II_y'].fillna(x['trial_Phase_II_x']).astype('boolean'),
-        trial_Phase_III=lambda x: x['trial_Phase_III_y'].fillna(x['trial_Phase_III_x']).astype('boolean'),
-        trial_Phase_IV=lambda x: x['trial_Phase_IV_y'].fillna(x['trial_Phase_IV_x']).astype('boolean'),
-        condition=lambda x: x['condition_y'].fillna(x['condition_x']),
-        therapeutic_area=lambda x: x.apply(clean_therapeutic_area, axis=1),
-        keywords=lambda x: x['keys'].apply(ensure_list_format),
-        interventions=lambda x: x['interv'].apply(ensure_list_format),
-        Sponsor=lambda x: x['Sponsor'].fillna(x['source']),
-        Sponsor_type=lambda x: x['Sponsor_type'].fillna(x['source_class']),
-        status=lambda x: x['status'].fillna(x['overall_status'].astype(str)).astype(str).astype('category'),
-        inclusion_crt=lambda x: x.apply(lambda r: r['inclusion_crt'] if pd.notna(r['inclusion_crt']) else extract_criteria(r['criteria'], type='inclusion'), axis=1),
-        exclusion_crt=lambda x: x.apply(lambda r: r['exclusion_crt'] if pd.notna(r['exclusion_crt']) else extract_criteria(r['criteria'], type='exclusion'), axis=1),
-        enrollment=lambda x: x['enrollment'].fillna(x['nr_enrolled']),
-        Gender_F=lambda x: x['Gender_F'].fillna(x['Gender_FEMALE'] if 'Gender_FEMALE' in x.columns else False).astype('boolean'),
-        Gender_M=lambda x: x['Gender_M'].fillna(x['Gender_MALE'] if 'Gender_MALE' in x.columns else False).astype('boolean'),
-        Age_0_17_years=lambda x: ((x['minimum_age_num'] <= 17) & (x['maximum_age_num'] >= 0)),
-        Age_18_64_years=lambda x: ((x['maximum_age_num'] <= 64) & (x['minimum_age_num'] >= 18)),
-        Age_65p_years=lambda x: (x['minimum_age_num'] >= 65),
-        trial_design_Randomised=lambda x: x['trial_design_Randomised'].fillna(x['allocation_RANDOMIZED'].replace(False, pd.NA)).fillna(~x['allocation_NON_RANDOMIZED']),
-        trial_design_Parallel_group=lambda x: x['trial_design_Parallel_group'].fillna(x['intervention_model_PARALLEL']),
-        trial_design_Cross_over=lambda x: x['trial_design_Cross_over'].fillna(x['intervention_model_CROSSOVER']),
-        trial_design_Controlled=lambda x: x['trial_design_Controlled'].fillna(~x['intervention_model_SINGLE_GROUP'].astype('boolean')),
-        masking_OPEN=lambda x: x['masking_NONE'].fillna(x['trial_design_Open']),
-        masking_SINGLE=lambda x: x['masking_SINGLE'].fillna(x['trial_design_Single_blind']),
-        masking_DOUBLE=lambda x: x['masking_DOUBLE'].fillna(x['trial_design_Double_blind']),
-        number_of_arms=lambda x: x['number_of_arms'].fillna(pd.to_numeric(x['trial_design.Number_of_treatment_arms_in_the_trial'], errors='coerce')),
-    )
-    .drop(columns=[
-        'title_x',
-        'title_y',
-        'Protocol_x',
-        'Protocol_y',
-        'start_date_x',
-        'start_date_y',
-        'completion_date',
-        'end_date',
-        'trial_Phase_I_x',
-        'trial_Phase_I_y',
-        'trial_Phase_II_x',
-        'trial_Phase_II_y',
-        'trial_Phase_III_x',
-        'trial_Phase_III_y',
-        'trial_Phase_IV_x',
-        'trial_Phase_IV_y',
-        'EARLY_PHASE1',
-        'condition_x',
-        'condition_y',
-        'source',
-        'source_class',
-        'overall_status',
-        'nr_enrolled',
-        'minimum_age_num',
-        'maximum_age_num',
-        'Gender_ALL',
-        'Gender_FEMALE',
-        'Gender_MALE',
-        'allocation_RANDOMIZED',
-        'allocation_NON_RANDOMIZED',
-        'intervention_model_PARALLEL',
-        'masking_NONE',
-        'masking_description',
-        'masking',
-        'trial_design_Open',
-        'trial_design_Single_blind',
-        'trial_design_Double_blind',
-        'intervention_model_CROSSOVER',
-        'trial_design.Number_of_treatment_arms_in_the_trial',
-        'terms',
-        'grouping',
-        'criteria',
-        'condition',
-        'keys',
-        'interv',
-    ], errors='ignore')
-    .sort_values(by='start_date', ascending=False)
-)
 
 def safe_serialize(obj):
     if obj is pd.NA or (isinstance(obj, float) and pd.isna(obj)):
@@ -645,7 +648,7 @@ def safe_serialize(obj):
     return obj
 
 
-def save_df_parquet(df, path):
+def to_arrow_table(df):
     def convert_value(x):
         if isinstance(x, (list, tuple, np.ndarray)):
             safe_value = safe_serialize(x)
@@ -654,8 +657,112 @@ def save_df_parquet(df, path):
             return None
         return x
 
-    df_converted = df.applymap(convert_value)
-    df_converted.to_parquet(path)
+    # Apenas as colunas object podem conter listas; as restantes mantêm o tipo compactado
+    df_converted = df.copy()
+    for col in df_converted.select_dtypes(include='object').columns:
+        df_converted[col] = df_converted[col].map(convert_value)
+
+    # O esquema (tipos compactados incluídos) é fixado uma vez para todo o DataFrame
+    return pa.Table.from_pandas(df_converted, preserve_index=False)
+
+
+# Disposição dos ficheiros Parquet servidos à aplicação (ver benchmarks/parquet_layout.py):
+# - linhas ordenadas por SORT_COLUMN, para que uma janela de datas só leia os row groups que a intersetam (estatísticas
+#   min/max de cada row group);
+# - row groups de ROW_GROUP_SIZE linhas: a aplicação lê partições inteiras, pelo que os row groups são grandes, mas
+#   pequenos o suficiente para que as janelas de datas e as pesquisas por id saltem a maior parte de cada ficheiro;
+# - zstd, dicionários (colunas categóricas e de baixa cardinalidade) e estatísticas por página (page index);
+# - filtros de Bloom nos identificadores, usados nas pesquisas por id pelos leitores que os suportam (ex.: DuckDB).
+SORT_COLUMN = 'start_date'
+ROW_GROUP_SIZE = 16_384
+BLOOM_FILTER_COLUMNS = ('nct_id', 'eudract_nr')
+BLOOM_FILTER_FPP = 0.01
+PARQUET_WRITE_OPTIONS = {
+    'compression': 'zstd',
+    'compression_level': 3,
+    'use_dictionary': True,
+    'write_statistics': True,
+    'write_page_index': True,
+}
+
+
+def write_parquet(table, path, row_group_size=ROW_GROUP_SIZE):
+    """
+    Escreve uma tabela Arrow com a disposição de PARQUET_WRITE_OPTIONS, filtros de Bloom nas colunas de
+    BLOOM_FILTER_COLUMNS presentes e a ordem de SORT_COLUMN registada nos metadados (a tabela já vem ordenada).
+
+    Args:
+        table (pa.Table): Tabela a escrever.
+        path (str): Caminho do ficheiro.
+        row_group_size (int): Número máximo de linhas por row group.
+    """
+    # Um filtro por row group, dimensionado para o nº de valores distintos que pode conter
+    ndv = max(min(table.num_rows, row_group_size), 1)
+    bloom_filters = {
+        col: {'ndv': ndv, 'fpp': BLOOM_FILTER_FPP} for col in BLOOM_FILTER_COLUMNS if col in table.column_names
+    }
+    sorting = None
+    if SORT_COLUMN in table.column_names:
+        sorting = [pq.SortingColumn(table.column_names.index(SORT_COLUMN), nulls_first=False)]
+    pq.write_table(
+        table, path, row_group_size=row_group_size, sorting_columns=sorting,
+        bloom_filter_options=bloom_filters or None, **PARQUET_WRITE_OPTIONS,
+    )
+
+
+def save_df_parquet(df, path):
+    # Escrita direta com o Arrow, ordenada por SORT_COLUMN
+    if SORT_COLUMN in df.columns:
+        df = df.sort_values(SORT_COLUMN, kind='stable', na_position='last')
+    table = to_arrow_table(df)
+    write_parquet(table, path)
+    return table.schema
+
+
+# Colunas das partições do dataset servido: diretório `country=…/source=…` ← coluna do DataFrame
+DATASET_PARTITIONS = {'country': 'country', 'source': 'source_dataset'}
+
+
+def save_df_dataset(df, root, partitions=DATASET_PARTITIONS, writer=write_parquet):
+    """
+    Grava o DataFrame como um dataset Parquet particionado à Hive (`country=…/source=…/part-0.parquet`).
+
+    Todas as partições partilham o esquema de `to_arrow_table` e são escritas por `write_parquet` (as linhas de cada
+    partição mantêm a ordem de `df`, que deve vir ordenado por SORT_COLUMN). As colunas que só definem partições
+    (`country`) não são gravadas nos ficheiros: os leitores recuperam-nas dos diretórios. O dataset é reescrito por
+    inteiro, para que não fiquem partições de países ou fontes que deixaram de existir.
+
+    Args:
+        df (pd.DataFrame): DataFrame a gravar, com as colunas de `partitions`.
+        root (str): Diretório do dataset.
+        partitions (dict): Nome de cada nível de partição → coluna com os valores.
+        writer (callable): Função que escreve uma tabela Arrow num caminho (ex.: outra disposição, nos benchmarks).
+
+    Returns:
+        pa.Schema: Esquema dos ficheiros gravados.
+    """
+    table = to_arrow_table(df)
+    keys = df[list(partitions.values())].astype(str)
+    # Colunas com o mesmo nome do nível existem só nos diretórios; as restantes (ex.: source_dataset) ficam também nos
+    # ficheiros, porque a aplicação as mostra
+    data = table.drop_columns([name for name, col in partitions.items() if name == col])
+
+    tmp_root = root + '.tmp'
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    for key, positions in keys.groupby(list(keys.columns), sort=True).indices.items():
+        key = key if isinstance(key, tuple) else (key,)
+        folder = os.path.join(tmp_root, *(f'{name}={value}' for name, value in zip(partitions, key)))
+        os.makedirs(folder)
+        writer(data.take(positions), os.path.join(folder, 'part-0.parquet'))
+
+    # Troca do dataset anterior pelo novo (a aplicação nunca vê uma mistura dos dois)
+    old_root = root + '.old'
+    shutil.rmtree(old_root, ignore_errors=True)
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.replace(tmp_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    return data.schema
 
 
 def load_df_parquet(path):
@@ -671,15 +778,12 @@ def load_df_parquet(path):
             return pd.NA
         return x
 
-    return df.applymap(revert_value)
-
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].map(revert_value)
+    return df
 
-# Coluna enrollment é um object que contém mais do que um tipo de dados ('float' e 'str')
-
-full['enrollment'] = pd.to_numeric(full['enrollment'], errors='coerce')
 
 # Saber se o estudo veio da ClinicalTrials.gov, ClinicalTrials EU
-
 def infer_source(row):
     if pd.notna(row.get('nct_id')):
         return 'clinicaltrials.gov'
@@ -689,36 +793,234 @@ def infer_source(row):
         return 'pap.infarmed'
     return 'unknown'
 
-full['source_dataset'] = full.apply(infer_source, axis=1)
 
-save_df_parquet(full, '../sources/full_df.parquet')
-full.to_excel('data/full_merge.xlsx', index=False)
+def final_merge(trials_eu, aact_df_clean, crosswalk_path):
+    # Tabela de correspondência EudraCT ↔ CTIS ctNumber ↔ NCT, construída uma vez por execução (e por país)
+    trials_merged, id_crosswalk = merge_on_crosswalk(trials_eu, aact_df_clean)
+    id_crosswalk.to_parquet(crosswalk_path, index=False)
+
+    full = (
+        trials_merged
+        .assign(
+            title=lambda x: x['title_y'].fillna(x['title_x']),
+            Protocol=lambda x: x['Protocol_y'].fillna(x['Protocol_x']),
+            start_date=lambda x: x[['start_date_x', 'start_date_y']].min(axis=1).fillna(x['start_date_x'].replace(False, pd.NA)).fillna(x['start_date_y'].replace(False, pd.NA)),
+            end_date=lambda x: x[['end_date', 'completion_date']].max(axis=1).fillna(x['end_date'].replace(False, pd.NA)).fillna(x['completion_date'].replace(False, pd.NA)),
+            trial_Early_Phase_I=lambda x: x['EARLY_PHASE1'].fillna(False).astype('boolean'),
+            trial_Phase_I=lambda x: x['trial_Phase_I_y'].fillna(x['trial_Phase_I_x']).astype('boolean'),
+            trial_Phase_II=lambda x: x['trial_Phase_II_y'].fillna(x['trial_Phase_II_x']).astype('boolean'),
+            trial_Phase_III=lambda x: x['trial_Phase_III_y'].fillna(x['trial_Phase_III_x']).astype('boolean'),
+            trial_Phase_IV=lambda x: x['trial_Phase_IV_y'].fillna(x['trial_Phase_IV_x']).astype('boolean'),
+            condition=lambda x: x['condition_y'].fillna(x['condition_x']),
+            therapeutic_area=lambda x: x.apply(clean_therapeutic_area, axis=1),
+            keywords=lambda x: x['keys'].apply(ensure_list_format),
+            interventions=lambda x: x['interv'].apply(ensure_list_format),
+            Sponsor=lambda x: x['Sponsor'].fillna(x['source']),
+            Sponsor_type=lambda x: x['Sponsor_type'].fillna(x['source_class']),
+            status=lambda x: x['status'].fillna(x['overall_status'].astype(str)).astype(str).astype('category'),
+            inclusion_crt=lambda x: x.apply(lambda r: r['inclusion_crt'] if pd.notna(r['inclusion_crt']) else extract_criteria(r['criteria'], type='inclusion'), axis=1),
+            exclusion_crt=lambda x: x.apply(lambda r: r['exclusion_crt'] if pd.notna(r['exclusion_crt']) else extract_criteria(r['criteria'], type='exclusion'), axis=1),
+            enrollment=lambda x: x['enrollment'].fillna(x['nr_enrolled']),
+            Gender_F=lambda x: x['Gender_F'].fillna(x['Gender_FEMALE'] if 'Gender_FEMALE' in x.columns else False).astype('boolean'),
+            Gender_M=lambda x: x['Gender_M'].fillna(x['Gender_MALE'] if 'Gender_MALE' in x.columns else False).astype('boolean'),
+            Age_0_17_years=lambda x: ((x['minimum_age_num'] <= 17) & (x['maximum_age_num'] >= 0)),
+            Age_18_64_years=lambda x: ((x['maximum_age_num'] <= 64) & (x['minimum_age_num'] >= 18)),
+            Age_65p_years=lambda x: (x['minimum_age_num'] >= 65),
+            trial_design_Randomised=lambda x: x['trial_design_Randomised'].fillna(x['allocation_RANDOMIZED'].replace(False, pd.NA)).fillna(~x['allocation_NON_RANDOMIZED']),
+            trial_design_Parallel_group=lambda x: x['trial_design_Parallel_group'].fillna(x['intervention_model_PARALLEL']),
+            trial_design_Cross_over=lambda x: x['trial_design_Cross_over'].fillna(x['intervention_model_CROSSOVER']),
+            trial_design_Controlled=lambda x: x['trial_design_Controlled'].fillna(~x['intervention_model_SINGLE_GROUP'].astype('boolean')),
+            masking_OPEN=lambda x: x['masking_NONE'].fillna(x['trial_design_Open']),
+            masking_SINGLE=lambda x: x['masking_SINGLE'].fillna(x['trial_design_Single_blind']),
+            masking_DOUBLE=lambda x: x['masking_DOUBLE'].fillna(x['trial_design_Double_blind']),
+            number_of_arms=lambda x: x['number_of_arms'].fillna(pd.to_numeric(x['trial_design.Number_of_treatment_arms_in_the_trial'], errors='coerce')),
+        )
+        .drop(columns=[
+            'title_x',
+            'title_y',
+            'Protocol_x',
+            'Protocol_y',
+            'start_date_x',
+            'start_date_y',
+            'completion_date',
+            'end_date',
+            'trial_Phase_I_x',
+            'trial_Phase_I_y',
+            'trial_Phase_II_x',
+            'trial_Phase_II_y',
+            'trial_Phase_III_x',
+            'trial_Phase_III_y',
+            'trial_Phase_IV_x',
+            'trial_Phase_IV_y',
+            'EARLY_PHASE1',
+            'condition_x',
+            'condition_y',
+            'source',
+            'source_class',
+            'overall_status',
+            'nr_enrolled',
+            'minimum_age_num',
+            'maximum_age_num',
+            'Gender_ALL',
+            'Gender_FEMALE',
+            'Gender_MALE',
+            'allocation_RANDOMIZED',
+            'allocation_NON_RANDOMIZED',
+            'intervention_model_PARALLEL',
+            'masking_NONE',
+            'masking_description',
+            'masking',
+            'trial_design_Open',
+            'trial_design_Single_blind',
+            'trial_design_Double_blind',
+            'intervention_model_CROSSOVER',
+            'trial_design.Number_of_treatment_arms_in_the_trial',
+            'terms',
+            'grouping',
+            'criteria',
+            'condition',
+            'keys',
+            'interv',
+        ], errors='ignore')
+        .sort_values(by='start_date', ascending=False)
+    )
+
+    # Coluna enrollment é um object que contém mais do que um tipo de dados ('float' e 'str')
+    full['enrollment'] = pd.to_numeric(full['enrollment'], errors='coerce')
+    full['source_dataset'] = full.apply(infer_source, axis=1)
+    return full
+
+
+def clean_pap(pap, columns):
+    """
+    Alinha os programas de acesso precoce (PAP) com o esquema do DataFrame final.
+
+    Args:
+        pap (pd.DataFrame): Dados do scraper do Infarmed.
+        columns (pd.Index): Colunas do DataFrame final.
+
+    Returns:
+        pd.DataFrame: PAP com as mesmas colunas (e ordem) de `columns`.
+    """
+    pap_clean = pap.copy()
+
+    # Normalizar colunas e datas
+    pap_clean = pap_clean.rename(columns={
+        'Nome': 'title',
+        'DCI': 'intervention',
+        'data_decisao': 'start_date',
+        'detalhes': 'condition',
+        'n_doentes': 'enrollment'
+    })
 
-pap_clean = pap.copy()
+    # Converter datas
+    pap_clean['start_date'] = pd.to_datetime(pap_clean['start_date'], format="%d/%m/%Y", errors='coerce')
 
-# Normalizar colunas e datas
-pap_clean = pap_clean.rename(columns={
-    'Nome': 'title',
-    'DCI': 'intervention',
-    'data_decisao': 'start_date',
-    'detalhes': 'condition',
-    'n_doentes': 'enrollment'
-})
+    # Garantir valores numéricos
+    pap_clean['enrollment'] = pd.to_numeric(pap_clean['enrollment'], errors='coerce')
 
-# Converter datas
-pap_clean['start_date'] = pd.to_datetime(pap_clean['start_date'], format="%d/%m/%Y", errors='coerce')
+    # Preencher colunas que existem no full com pd.NA para garantir alinhamento
+    for col in columns:
+        if col not in pap_clean.columns:
+            pap_clean[col] = pd.NA
 
-# Garantir valores numéricos
-pap_clean['enrollment'] = pd.to_numeric(pap_clean['enrollment'], errors='coerce')
+    # Adicionar coluna de source
+    pap_clean['source_dataset'] = 'PAP Infarmed'
 
-# Preencher colunas que existem no full com pd.NA para garantir alinhamento
-columns_in_full = full.columns
-for col in columns_in_full:
-    if col not in pap_clean.columns:
-        pap_clean[col] = pd.NA
+    # Reordenar colunas para corresponder à estrutura do full
+    return pap_clean[columns]
 
-# Adicionar coluna de source
-pap_clean['source_dataset'] = 'PAP Infarmed'
 
-# Reordenar colunas para corresponder à estrutura do full
-pap_clean = pap_clean[columns_in_full]
+# ## Load
+
+def save_outputs(full, full_df_path=FULL_DF_PATH, excel_path=None, search_index_path=SEARCH_INDEX_PATH,
+                 facets_path=FACETS_PATH):
+    # Compactação dos tipos (categorias, flags bit a bit, numéricos reduzidos) para o dataset servido
+    full_compact = finalize_schema(full)
+    print(memory_report(full, full_compact).head(20))
+
+    # Linhas pela ordem das partições e, em cada uma, por data de início (ver SORT_COLUMN); `row_id` identifica cada
+    # ensaio no índice de pesquisa, de modo que a aplicação pode carregar só alguns países e continuar a usar o mesmo
+    # índice
+    full_compact = full_compact.sort_values(
+        list(DATASET_PARTITIONS.values()) + [SORT_COLUMN], kind='stable', na_position='last', ignore_index=True)
+    full_compact['row_id'] = np.arange(len(full_compact), dtype=np.int32)
+
+    save_df_dataset(full_compact, full_df_path)
+    # Construído a partir do mesmo DataFrame gravado: o rowid de cada ensaio é a sua posição (= row_id)
+    build_search_index(full_compact, search_index_path)
+    save_facets(full_compact, facets_path)
+    if excel_path is not None:
+        full.to_excel(excel_path, index=False)
+    return full_compact
+
+
+def run(data_dir=SCRAPED_DATA_DIR, excel_path=EXCEL_EXPORT_PATH, on_stage=None, countries=DEFAULT_COUNTRIES):
+    """
+    Executa o ETL completo para cada país: extração, limpeza de cada fonte e junção; depois, a escrita do dataset
+    `sources/full_df` (particionado por país e fonte) e dos ficheiros derivados (`sources/search.sqlite` e
+    `sources/facets.parquet`), e a escrita dos PAP (`sources/pap_clean.parquet` e `sources/pap_summary.parquet`).
+
+    Args:
+        data_dir (str): Diretório de saída dos scrapers.
+        excel_path (str, optional): Caminho da exportação em Excel (None para não exportar).
+        on_stage (callable, optional): Função chamada com o nome de cada etapa, antes de a executar.
+        countries (tuple): Códigos dos países a processar (ver countries.COUNTRY_NAMES).
+
+    Returns:
+        dict: DataFrames `full` (compactado), `pap` e o número de registos de cada fonte (somados entre países).
+    """
+    def stage(name):
+        if on_stage is not None:
+            on_stage(name)
+
+    fulls, paps = [], []
+    counts = {'ctis': 0, 'trials': 0, 'pap': 0, 'aact': 0}
+    for country in countries:
+        stage(f'extract ({country})')
+        ctis, pap, trials = extract_scraped(data_dir, country)
+        aact_df = extract_aact(country=country)
+
+        stage(f'clean ({country})')
+        trials_eu = merge_trials_eu(clean_trials(trials), clean_ctis(ctis))
+        aact_df_clean = clean_aact(aact_df)
+
+        stage(f'merge ({country})')
+        crosswalk_dir = partition_dir(ID_CROSSWALK_DIR, country)
+        os.makedirs(crosswalk_dir, exist_ok=True)
+        full = final_merge(trials_eu, aact_df_clean, crosswalk_path=os.path.join(crosswalk_dir, 'id_crosswalk.parquet'))
+        fulls.append(full.assign(country=country))
+
+        # Os PAP do Infarmed só existem para Portugal
+        if pap is not None:
+            paps.append(pap)
+        for source, df in (('ctis', ctis), ('trials', trials), ('pap', pap), ('aact', aact_df)):
+            counts[source] += 0 if df is None else len(df)
+
+    stage('save')
+    full = pd.concat(fulls, ignore_index=True)
+    full_compact = save_outputs(full, excel_path=excel_path)
+
+    stage('pap')
+    pap_clean = None
+    if paps:
+        pap = pd.concat(paps, ignore_index=True)
+        save_pap(pap, PAP_CLEAN_PATH, PAP_SUMMARY_PATH)
+        pap_clean = clean_pap(pap, full.columns)
+
+    return {
+        'full': full_compact,
+        'pap': pap_clean,
+        'counts': counts,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ETL dos ensaios clínicos e dos PAP.")
+    parser.add_argument('--countries', nargs='+', default=list(DEFAULT_COUNTRIES), choices=sorted(COUNTRY_NAMES),
+                        help="códigos ISO 3166-1 alfa-2 dos países a processar")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    run(countries=args.countries)
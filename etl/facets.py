@@ -0,0 +1,94 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# Colunas com filtros de escolha múltipla na aplicação (categóricas ou listas)
+FACET_COLUMNS = ('study_type', 'therapeutic_area', 'interventions')
+
+
+def _items(value):
+    if isinstance(value, str) and value.startswith('__list__'):
+        try:
+            value = json.loads(value[len('__list__'):])
+        except ValueError:
+            return [value]
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [i for i in value if i is not None]
+    if value is None or value is pd.NA or (isinstance(value, float) and pd.isna(value)):
+        return []
+    return [value]
+
+
+def build_facets(df, columns=FACET_COLUMNS):
+    """
+    Constrói a tabela de facetas: o vocabulário de cada coluna filtrável, com o rótulo a mostrar e a contagem global.
+
+    Args:
+        df (pd.DataFrame): DataFrame final.
+        columns (tuple): Colunas categóricas ou de listas a incluir.
+
+    Returns:
+        pd.DataFrame: Colunas `facet`, `value` (normalizado), `label` (grafia mais frequente) e `count`
+            (número de ensaios com o valor), ordenada por faceta e valor.
+    """
+    frames = []
+    for col in columns:
+        if col not in df.columns:
+            continue
+        # Posições das linhas como índice (o índice de `df` pode ter duplicados); categorias tratadas como objetos
+        items = pd.Series(df[col].astype(object).to_numpy()).map(_items).explode().dropna()
+        long = pd.DataFrame({
+            'row': items.index,
+            'label': items.map(lambda v: re.sub(r'\s+', ' ', str(v)).strip()).to_numpy(),
+        })
+        # Valor normalizado: espaços colapsados, sem espaços nas pontas e em minúsculas
+        long['value'] = long['label'].str.lower()
+        long = long[long['value'] != '']
+
+        # Um ensaio conta uma vez por valor, mesmo que a lista o repita
+        counts = long.drop_duplicates(['row', 'value']).groupby('value').size()
+        labels = (
+            long.groupby(['value', 'label']).size()
+            .reset_index(name='n')
+            .sort_values(['value', 'n'], ascending=[True, False])
+            .drop_duplicates('value')
+            .set_index('value')['label']
+        )
+        frames.append(pd.DataFrame({
+            'facet': col,
+            'value': counts.index,
+            'label': labels.reindex(counts.index).to_numpy(),
+            'count': counts.to_numpy(),
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=['facet', 'value', 'label', 'count'])
+    return pd.concat(frames, ignore_index=True).sort_values(['facet', 'value'], ignore_index=True)
+
+
+def save_facets(df, path, columns=FACET_COLUMNS, by='country'):
+    """
+    Grava a tabela de facetas, com uma linha por valor e por país (coluna `by`) quando o DataFrame tem vários países:
+    a aplicação soma as contagens dos países que carrega.
+
+    Args:
+        df (pd.DataFrame): DataFrame final.
+        path (str): Caminho de `facets.parquet`.
+        columns (tuple): Colunas categóricas ou de listas a incluir.
+        by (str): Coluna do país.
+
+    Returns:
+        pd.DataFrame: Tabela de `build_facets`, com a coluna `by` se existir em `df`.
+    """
+    if by in df.columns:
+        facets = pd.concat(
+            [build_facets(group, columns).assign(**{by: key})
+             for key, group in df.groupby(by, sort=True, observed=True)],
+            ignore_index=True,
+        )
+    else:
+        facets = build_facets(df, columns)
+    facets.to_parquet(path, index=False)
+    return facets
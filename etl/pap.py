@@ -0,0 +1,120 @@
+import pandas as pd
+
+# Colunas da tabela de PAP servida à página Infography, pela ordem de gravação
+PAP_COLUMNS = [
+    'Nome', 'DCI', 'decisao', 'data_decisao', 'ano_decisao', 'detalhes', 'n_doentes', 'recurr_n_dtes',
+    'cond_observ', 'PAP_act', 'c_custos', 'deferimento', 'DCI_normalized',
+]
+
+# Dimensões dos agregados: qualquer combinação dos filtros da página é respondida somando as linhas que a cumprem
+PAP_SUMMARY_KEYS = ['ano_decisao', 'decisao', 'PAP_act', 'c_custos', 'deferimento']
+
+# Grafias da decisão no site do Infarmed (em minúsculas) → rótulo único
+DECISION_LABELS = {
+    'deferido': 'Deferido',
+    'indeferido': 'Indeferido',
+    'indeferimento': 'Indeferido',
+    'não aplicável': 'Não aplicável',
+    'na': 'Sem informação',
+}
+
+
+def _text(series):
+    # Texto com espaços colapsados; vazios passam a NA
+    text = series.astype('string').str.replace(r'\s+', ' ', regex=True).str.strip()
+    return text.mask(text == '')
+
+
+def _flag(series):
+    return series.astype('boolean')
+
+
+def transform_pap(pap):
+    """
+    Prepara os programas de acesso precoce (PAP) para a página: tipos fixos e colunas derivadas calculadas uma vez.
+
+    As colunas derivadas pelo scraper (`PAP_act`, `c_custos`, `deferimento`) são recalculadas a partir do texto
+    quando faltam (ficheiros de versões anteriores do scraper), com as mesmas regras.
+
+    Args:
+        pap (pd.DataFrame): Dados do PapInfarmedSpider.
+
+    Returns:
+        pd.DataFrame: Colunas de PAP_COLUMNS; `data_decisao` como data, `ano_decisao` e `n_doentes` inteiros,
+            flags booleanas (com NA quando desconhecidas) e `decisao` com um rótulo por tipo de decisão.
+    """
+    df = pd.DataFrame(index=pap.index)
+    for col in ('Nome', 'DCI', 'detalhes', 'cond_observ', 'recurr_n_dtes'):
+        df[col] = _text(pap[col]) if col in pap.columns else pd.Series(pd.NA, index=pap.index, dtype='string')
+
+    decisao = _text(pap['decisao']).str.lower()
+    df['decisao'] = decisao.map(lambda v: DECISION_LABELS.get(v, v.capitalize()) if isinstance(v, str) else v)
+    df['decisao'] = df['decisao'].astype('string')
+
+    data_decisao = pap['data_decisao']
+    if not pd.api.types.is_datetime64_any_dtype(data_decisao):
+        data_decisao = pd.to_datetime(data_decisao, format='%d/%m/%Y', errors='coerce')
+    df['data_decisao'] = data_decisao
+    df['ano_decisao'] = data_decisao.dt.year.astype('Int16')
+
+    df['n_doentes'] = pd.to_numeric(pap['n_doentes'], errors='coerce').astype('Int32')
+
+    cond_observ = df['cond_observ'].fillna('')
+    if 'PAP_act' in pap.columns:
+        df['PAP_act'] = _flag(pap['PAP_act']).fillna(False)
+    else:
+        df['PAP_act'] = cond_observ.str.contains('PAP ativo', regex=False).astype('boolean')
+
+    if 'c_custos' in pap.columns:
+        df['c_custos'] = _flag(pap['c_custos'])
+    else:
+        df['c_custos'] = pd.Series(pd.NA, index=pap.index, dtype='boolean')
+        df.loc[cond_observ.str.contains('com custos', regex=False), 'c_custos'] = True
+        df.loc[cond_observ.str.contains('sem custos', regex=False), 'c_custos'] = False
+
+    if 'deferimento' in pap.columns:
+        df['deferimento'] = _flag(pap['deferimento'])
+    else:
+        df['deferimento'] = pd.Series(pd.NA, index=pap.index, dtype='boolean')
+        df.loc[decisao.str.contains('defer', na=False), 'deferimento'] = True
+        df.loc[decisao.str.contains('indefer', na=False), 'deferimento'] = False
+
+    # DCI para cruzar com as intervenções dos ensaios: minúsculas, sem espaços repetidos (ver _text)
+    df['DCI_normalized'] = df['DCI'].str.lower()
+
+    return df[PAP_COLUMNS].sort_values('data_decisao', ascending=False, ignore_index=True)
+
+
+def summarize_pap(pap_clean):
+    """
+    Agregados dos PAP por ano, decisão e flags: nº de programas e de doentes de cada combinação.
+
+    Args:
+        pap_clean (pd.DataFrame): Resultado de `transform_pap`.
+
+    Returns:
+        pd.DataFrame: Colunas de PAP_SUMMARY_KEYS, `programs` e `patients`.
+    """
+    return (
+        pap_clean.groupby(PAP_SUMMARY_KEYS, dropna=False, observed=True)
+        .agg(programs=('Nome', 'size'), patients=('n_doentes', 'sum'))
+        .reset_index()
+    )
+
+
+def save_pap(pap, path, summary_path):
+    """
+    Grava a tabela de PAP da página e os respetivos agregados.
+
+    Args:
+        pap (pd.DataFrame): Dados do PapInfarmedSpider.
+        path (str): Caminho de `pap_clean.parquet`.
+        summary_path (str): Caminho de `pap_summary.parquet`.
+
+    Returns:
+        pd.DataFrame: Tabela de PAP gravada.
+    """
+    pap_clean = transform_pap(pap)
+    pap_clean.to_parquet(path, index=False)
+    summarize_pap(pap_clean).to_parquet(summary_path, index=False)
+    return pap_clean
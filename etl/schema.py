@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Booleanos em Arrow são guardados bit a bit (valores + máscara de nulos), tanto em memória como no Parquet
+PACKED_BOOL = pd.ArrowDtype(pa.bool_())
+
+
+def _is_flag(column):
+    if pd.api.types.is_bool_dtype(column.dtype):
+        return True
+    if column.dtype == object:
+        values = column.dropna()
+        return len(values) > 0 and values.map(lambda v: isinstance(v, (bool, np.bool_))).all()
+    return False
+
+
+def _is_low_cardinality(column, max_ratio, max_categories):
+    if not (column.dtype == object or pd.api.types.is_string_dtype(column.dtype)):
+        return False
+    values = column.dropna()
+    if len(values) == 0 or not values.map(lambda v: isinstance(v, str)).all():
+        return False
+    n_unique = values.nunique()
+    return n_unique <= max_categories and n_unique / len(values) <= max_ratio
+
+
+def finalize_schema(df, max_ratio=0.5, max_categories=1000):
+    """
+    Compacta os tipos de dados do DataFrame final antes de ser guardado e servido na aplicação.
+
+    - colunas de flags (booleanas ou objetos só com booleanos) passam a booleanos Arrow, guardados bit a bit;
+    - colunas de texto com poucos valores distintos são codificadas como `category` (dicionário no Parquet);
+    - colunas numéricas são reduzidas ao menor tipo que preserva os valores (floats inteiros passam a `Int`).
+
+    Args:
+        df (pd.DataFrame): DataFrame a compactar.
+        max_ratio (float): Razão máxima entre valores distintos e valores não nulos para codificar como `category`.
+        max_categories (int): Número máximo de valores distintos para codificar como `category`.
+
+    Returns:
+        pd.DataFrame: Novo DataFrame com os tipos compactados.
+    """
+    out = df.copy()
+
+    for col in out.columns:
+        column = out[col]
+        if _is_flag(column):
+            out[col] = column.astype('boolean').astype(PACKED_BOOL)
+        elif _is_low_cardinality(column, max_ratio, max_categories):
+            out[col] = column.astype('category')
+        elif pd.api.types.is_integer_dtype(column.dtype) and not isinstance(column.dtype, pd.ArrowDtype):
+            out[col] = pd.to_numeric(column, downcast='integer')
+        elif pd.api.types.is_float_dtype(column.dtype) and not isinstance(column.dtype, pd.ArrowDtype):
+            values = column.dropna()
+            if len(values) and (values == values.round()).all():
+                # Contagens guardadas como float (por causa dos nulos) passam a inteiros anuláveis
+                out[col] = pd.to_numeric(column.astype('Int64'), downcast='integer')
+            else:
+                out[col] = pd.to_numeric(column, downcast='float')
+
+    return out
+
+
+def memory_report(before, after):
+    """
+    Compara o uso de memória (profundo) por coluna entre duas versões de um DataFrame.
+
+    Args:
+        before (pd.DataFrame): DataFrame original.
+        after (pd.DataFrame): DataFrame compactado.
+
+    Returns:
+        pd.DataFrame: Tabela com o tipo e os bytes antes/depois de cada coluna, ordenada pela poupança.
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'bytes_after': after.memory_usage(deep=True, index=False),
+    })
+    report['saved'] = report['bytes_before'] - report['bytes_after']
+
+    total_before = report['bytes_before'].sum() / 1024 ** 2
+    total_after = report['bytes_after'].sum() / 1024 ** 2
+    print(f'Memória: {total_before:.2f} MB -> {total_after:.2f} MB '
+          f'({(1 - total_after / total_before) * 100 if total_before else 0:.1f}% de redução)')
+
+    return report.sort_values('saved', ascending=False)
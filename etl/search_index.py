@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+# Colunas indexadas e o respetivo peso no ranking BM25 (o título pesa mais do que os critérios)
+SEARCH_COLUMNS = {
+    'title': 10.0,
+    'therapeutic_area': 5.0,
+    'keywords': 4.0,
+    'interventions': 4.0,
+    'inclusion_crt': 1.0,
+    'exclusion_crt': 1.0,
+}
+
+# Tokenização Unicode sem acentos ("câncer" e "cancer" são o mesmo termo), com índices de prefixos de 2 e 3
+# caracteres para pesquisas como "pembro*"
+FTS_TOKENIZER = 'unicode61 remove_diacritics 2'
+FTS_PREFIX = '2 3'
+
+
+def _as_text(value):
+    # Listas (nativas ou serializadas como '__list__[...]') ficam com um item por linha
+    if isinstance(value, str) and value.startswith('__list__'):
+        try:
+            value = json.loads(value[len('__list__'):])
+        except ValueError:
+            return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return '\n'.join(str(i) for i in value if i is not None)
+    if value is None or value is pd.NA or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value)
+
+
+def build_search_index(df, path, key_column='trial_key'):
+    """
+    Constrói o índice de pesquisa de texto (SQLite FTS5) do DataFrame final.
+
+    Cada linha do índice tem como `rowid` a posição da linha em `df` (a mesma do ficheiro Parquet gravado),
+    para que os resultados possam ser combinados diretamente com máscaras booleanas sobre os dados.
+    A escrita é atómica: o índice só substitui o anterior depois de completo.
+
+    Args:
+        df (pd.DataFrame): DataFrame final, na ordem em que é gravado.
+        path (str): Caminho do ficheiro SQLite.
+        key_column (str): Coluna com o identificador do ensaio, guardada (sem indexar) junto do texto.
+
+    Returns:
+        int: Número de linhas indexadas.
+    """
+    columns = [col for col in SEARCH_COLUMNS if col in df.columns]
+    keys = df[key_column].astype('string') if key_column in df.columns else pd.Series(pd.NA, index=df.index)
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.execute(
+            f"CREATE VIRTUAL TABLE trials_fts USING fts5("
+            f"trial_key UNINDEXED, {', '.join(columns)}, "
+            f"tokenize='{FTS_TOKENIZER}', prefix='{FTS_PREFIX}')"
+        )
+        texts = [df[col].map(_as_text).to_list() for col in columns]
+        rows = (
+            (position, None if pd.isna(key) else key, *values)
+            for position, (key, *values) in enumerate(zip(keys, *texts))
+        )
+        con.executemany(
+            f"INSERT INTO trials_fts(rowid, trial_key, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+            rows,
+        )
+        # Junta os segmentos do índice num só: menos páginas lidas por pesquisa
+        con.execute("INSERT INTO trials_fts(trials_fts) VALUES ('optimize')")
+
+        con.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('row_count', str(len(df))),
+            ('columns', json.dumps(columns)),
+            ('weights', json.dumps([SEARCH_COLUMNS[col] for col in columns])),
+            ('built_at', str(time.time())),
+        ])
+        con.commit()
+    finally:
+        con.close()
+
+    os.replace(tmp_path, path)
+    return len(df)
@@ -0,0 +1,141 @@
+import os
+
+import pandas as pd
+
+
+def dedupe_parts(values, sep=', '):
+    """
+    Remove partes repetidas em strings separadas por `sep`, mantendo a ordem original.
+
+    Args:
+        values (pd.Series): Série de strings (idealmente já sem repetições).
+        sep (str): Separador das partes.
+
+    Returns:
+        pd.Series: Série com as partes únicas reunidas de novo, com o mesmo índice de `values`.
+    """
+    parts = (
+        values.astype('string').str.split(sep).explode().str.strip()
+        .rename('part').rename_axis('row').reset_index()
+        .dropna()
+        .query('part != ""')
+        .drop_duplicates()
+    )
+    return parts.groupby('row', sort=False)['part'].agg(sep.join).reindex(values.index)
+
+
+def normalize_sponsor_key(names):
+    """
+    Normaliza nomes de promotores para a chave da tabela de canonicalização
+    (minúsculas, sem pontuação nem espaços repetidos).
+
+    Args:
+        names (pd.Series): Nomes dos promotores.
+
+    Returns:
+        pd.Series: Chaves normalizadas.
+    """
+    return (
+        names.astype('string')
+        .str.lower()
+        .str.replace(r'[^\w\s,&/-]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def _join_types(types):
+    # types: série indexada pela chave, com tipos separados por vírgulas
+    return (
+        types.dropna().astype('string').str.split(',').explode().str.strip()
+        .rename('Sponsor_type').rename_axis('sponsor_key').reset_index()
+        .query('Sponsor_type != ""')
+        .drop_duplicates()
+        .sort_values(['sponsor_key', 'Sponsor_type'])
+        .groupby('sponsor_key')['Sponsor_type'].agg(', '.join)
+    )
+
+
+def build_sponsor_table(sponsor, sponsor_type, previous=None):
+    """
+    Constrói a tabela de canonicalização de promotores (chave normalizada → nome canónico, tipos de promotor).
+
+    Os cálculos são feitos sobre os pares (promotor, tipo) distintos e não linha a linha. O nome canónico é a
+    grafia mais frequente de cada chave; se existir uma tabela anterior, os seus nomes canónicos prevalecem e os
+    tipos são acumulados, para que os resultados se mantenham estáveis entre execuções do ETL.
+
+    Args:
+        sponsor (pd.Series): Coluna `Sponsor`.
+        sponsor_type (pd.Series): Coluna `Sponsor_type`.
+        previous (pd.DataFrame, optional): Tabela de uma execução anterior.
+
+    Returns:
+        pd.DataFrame: Tabela com as colunas `sponsor_key`, `Sponsor` e `Sponsor_type`.
+    """
+    pairs = (
+        pd.DataFrame({'raw': sponsor.astype('string'), 'types': sponsor_type.astype('string')})
+        .dropna(subset=['raw'])
+        .value_counts(dropna=False)
+        .rename('n')
+        .reset_index()
+    )
+    pairs['Sponsor'] = dedupe_parts(pairs['raw'])
+    pairs['sponsor_key'] = normalize_sponsor_key(pairs['Sponsor'])
+    pairs = pairs.dropna(subset=['sponsor_key']).query('sponsor_key != ""')
+
+    canonical = (
+        pairs.groupby(['sponsor_key', 'Sponsor'])['n'].sum()
+        .reset_index()
+        .sort_values(['sponsor_key', 'n', 'Sponsor'], ascending=[True, False, True])
+        .drop_duplicates('sponsor_key')
+        .set_index('sponsor_key')['Sponsor']
+    )
+    types = pairs.set_index('sponsor_key')['types']
+
+    if previous is not None and len(previous) > 0:
+        previous = previous.set_index('sponsor_key')
+        canonical = previous['Sponsor'].combine_first(canonical)
+        types = pd.concat([previous['Sponsor_type'], types])
+
+    return (
+        pd.DataFrame({'Sponsor': canonical, 'Sponsor_type': _join_types(types)})
+        .rename_axis('sponsor_key')
+        .reset_index()
+        .sort_values('sponsor_key', ignore_index=True)
+    )
+
+
+def apply_sponsor_table(sponsor, table):
+    """
+    Devolve o nome canónico e os tipos de promotor de cada linha, com uma única consulta à tabela.
+
+    A normalização é calculada apenas sobre os valores distintos de `sponsor`.
+
+    Args:
+        sponsor (pd.Series): Coluna `Sponsor`.
+        table (pd.DataFrame): Tabela devolvida por `build_sponsor_table`.
+
+    Returns:
+        pd.DataFrame: DataFrame com as colunas `Sponsor` e `Sponsor_type`, com o mesmo índice de `sponsor`.
+    """
+    raw = sponsor.astype('string')
+    uniques = pd.Series(raw.dropna().unique())
+    names = dedupe_parts(uniques)
+    keys = normalize_sponsor_key(names)
+
+    lookup = (
+        pd.DataFrame({'raw': uniques, 'sponsor_key': keys, 'name': names})
+        .merge(table, on='sponsor_key', how='left')
+        # Promotores sem entrada na tabela mantêm o nome original (sem repetições)
+        .assign(Sponsor=lambda x: x['Sponsor'].fillna(x['name']))
+        .set_index('raw')[['Sponsor', 'Sponsor_type']]
+    )
+
+    return lookup.reindex(raw.to_numpy()).set_axis(sponsor.index)
+
+
+def load_sponsor_table(path):
+    """Lê a tabela de canonicalização guardada, ou devolve None se ainda não existir."""
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
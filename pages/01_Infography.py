@@ -1,22 +1,33 @@
 import os
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
 from streamlit_extras.metric_cards import style_metric_cards
-from utils.auxiliary import parse_list_str, load_extras, normalize_list_column
+from utils.data import (
+    FULL_DF_PATH, SOURCES_DIR, dataset_mtime, parse_list_str, load_extras, load_facets, load_filter_index, load_pap,
+    read_dataset, select_countries,
+)
+from utils.export import export_widget
+from utils.profiling import mark
 
 st.set_page_config(layout="wide")
 
-# Define the data file path (assuming the notebook is running from the "etl" folder)
-data_path = os.path.join("sources", "full_df.parquet")
+mark('load')
+# Trials dataset written by the ETL, partitioned by country: only the partitions of the selected countries are read
+data_path = FULL_DF_PATH
+facets_path = os.path.join(SOURCES_DIR, "facets.parquet")
+countries = select_countries(data_path)
 
-# Load the parquet file into a DataFrame
+# Load the parquet dataset into a DataFrame
 try:
-    df = pd.read_parquet(data_path)
+    data_mtime = dataset_mtime(data_path)
+    df = read_dataset(data_path, countries, data_mtime)
 except Exception as e:
     st.error(f"Error loading data from {data_path}: {e}")
     st.stop()
 
+mark('header')
 header = st.container()
 header.image('assets/Banner.png', width=400)
 header.write("""<div class='fixed-header'/>""", unsafe_allow_html=True)
@@ -31,6 +42,7 @@ st.title("Infography & Insights")
 st.subheader("Data from Clinical Trials and Early Access Programs (Infarmed/PAP)")
 st.write("This area presents a visual representation of the data.")
 
+mark('key metrics')
 ### Main metrics
 st.markdown("### 🔢 Key Metrics")
 col1, col2, col3, col4 = st.columns(4)
@@ -56,55 +68,69 @@ with infograph_tabs[0]:
     # Multiple selectors for filtering
     # -------------------------------
 
-    # Selector for study types
+    mark('filters')
+    # Facet vocabularies come precomputed from the ETL (sources/facets.parquet) and selections are evaluated on the
+    # cached filter index, so the sidebar does not scan the dataset on each rerun
+    filter_index = load_filter_index(data_path, data_mtime, countries, _df=df)
+    facets = load_facets(facets_path, os.path.getmtime(facets_path) if os.path.exists(facets_path) else None,
+                         countries)
+
+    facet_filters = {
+        'study_type': "Select Study Types",
+        'therapeutic_area': "Select Therapeutic Areas",
+        'interventions': "Select Interventions",
+    }
+    # Options of each facet for the loaded countries: (labels, counts)
+    facet_options = {}
+    for col in facet_filters:
+        if facets is not None:
+            facet = facets[facets['facet'] == col]
+            facet_options[col] = (dict(zip(facet['value'], facet['label'])), dict(zip(facet['value'], facet['count'])))
+        else:
+            facet_options[col] = ({}, filter_index.facet_counts(col).to_dict())
+        # Values selected for other countries that are not options now are dropped before the widget is built
+        # (Streamlit rejects a multiselect value missing from its options)
+        key = f"facet_{col}"
+        if key in st.session_state:
+            labels, counts = facet_options[col]
+            st.session_state[key] = [v for v in st.session_state[key] if v in (labels or counts)]
+    selections = {col: st.session_state.get(f"facet_{col}", []) for col in facet_filters}
+    facet_masks = {
+        col: filter_index.isin(col, selected) if selected else filter_index.all()
+        for col, selected in selections.items()
+    }
+
+    # Selectors for study types, therapeutic areas and interventions
     with st.sidebar:
         st.subheader("🔎 Filters")
+        live_counts = st.toggle("Counts under current filters", key="facet_live_counts",
+                                help="Each option shows how many studies match it given the other selections.")
 
-        # Study Type
-        if "study_type" in df.columns:
-            study_type_options = sorted(df['study_type'].dropna().unique())
-            selected_study_types = st.multiselect("Select Study Types", options=study_type_options)
-        else:
-            st.warning("Column 'study_type' not available.")
-            selected_study_types = None
-
-        # Therapeutic Area
-        if "therapeutic_area" in df.columns:
-            df['therapeutic_area'] = df['therapeutic_area'].apply(parse_list_str)
-            therapeutic_area_options = normalize_list_column(df['therapeutic_area'])
-            selected_therapeutic_areas = st.multiselect("Select Therapeutic Areas", options=therapeutic_area_options)
-        else:
-            st.warning("Column 'therapeutic_area' not available.")
-            selected_therapeutic_areas = None
-
-        # Interventions
-        if "interventions" in df.columns:
-            df['interventions'] = df['interventions'].apply(parse_list_str)
-            intervention_options = normalize_list_column(df['interventions'])
-            selected_interventions = st.multiselect("Select Interventions", options=intervention_options)
-        else:
-            st.warning("Column 'interventions' not available.")
-            selected_interventions = None
-
+        for col, label in facet_filters.items():
+            if col not in df.columns:
+                st.warning(f"Column '{col}' not available.")
+                continue
 
-    # Apply filters to DataFrame
-    filtered_df = df.copy()
+            labels, counts = facet_options[col]
+            if live_counts:
+                others = np.logical_and.reduce([m for c, m in facet_masks.items() if c != col])
+                counts = filter_index.facet_counts(col, others).to_dict()
 
-    if selected_study_types:
-        filtered_df = filtered_df[filtered_df['study_type'].str.lower().isin([s.lower() for s in selected_study_types])]
+            st.multiselect(
+                label, options=list(labels or counts), key=f"facet_{col}",
+                format_func=lambda v, labels=labels, counts=counts: f"{labels.get(v, v)} ({counts.get(v, 0):,})",
+            )
 
-    if selected_therapeutic_areas:
-        filtered_df = filtered_df[filtered_df['therapeutic_area'].apply(
-            lambda x: any(term in [str(i).strip().lower() for i in x] for term in selected_therapeutic_areas) if isinstance(x, list) else False
-        )]
+    selected_study_types = selections['study_type']
+    selected_therapeutic_areas = selections['therapeutic_area']
+    selected_interventions = selections['interventions']
 
-    if selected_interventions:
-        filtered_df = filtered_df[filtered_df['interventions'].apply(
-            lambda x: any(term in [str(i).strip().lower() for i in x] for term in selected_interventions) if isinstance(x, list) else False
-        )]
+    # Apply filters to DataFrame: one mask combining all facets
+    filtered_df = df[np.logical_and.reduce(list(facet_masks.values()))].copy()
 
     st.markdown("---")
 
+    mark('chart: gender and age')
     # ─── Gender and Age ────────────────────────────────────────────────────
     st.markdown("#### Participation by Gender and Age")
     col1, col2, col3 = st.columns(3)
@@ -112,6 +138,7 @@ with infograph_tabs[0]:
     col2.metric("Male", int(filtered_df['Gender_M'].sum()))
     col3.metric("Children (0-17)", int(filtered_df['Age_0_17_years'].sum()))
 
+    mark('chart: temporal trend')
     # ─── Temporal Trend ──────────────────────────────────────────────────
     st.subheader("Temporal trend of studies")
     if "study_first_submitted_date" in filtered_df.columns:
@@ -128,6 +155,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: therapeutic areas')
     # ─── Therapeutic Areas ─────────────────────────────────────────────────────
     st.markdown("### 🧬 Therapeutic Areas Overview")
 
@@ -142,6 +170,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: study phase')
     # ─── Study Phase ───────────────────────────────────────────────────────
     st.subheader("Distribution by Study Phase")
     phase_counts = pd.DataFrame({
@@ -158,20 +187,22 @@ with infograph_tabs[0]:
     st.plotly_chart(fig, use_container_width=True)
 
     st.divider()
+    mark('chart: sponsors')
     # ─── Sponsors ───────────────────────────────────────────────────────
     st.markdown("#### Distribution by Sponsor")
-    sponsor_counts = filtered_df['Sponsor_type'].value_counts().head(10).reset_index()
+    sponsor_counts = filtered_df['Sponsor_type'].value_counts().loc[lambda s: s > 0].head(10).reset_index()
     sponsor_counts.columns = ['Sponsor type', 'Total']
     st.plotly_chart(px.bar(sponsor_counts, x='Sponsor type', y='Total', text='Total'), use_container_width=True)
 
     st.divider()
 
+    mark('chart: study and blinding types')
     st.markdown("### Study and Blinding Types Distribution")
     col3, col4 = st.columns(2)
     # ─── Study Types ──────────────────────────────────────────────────
     col3.write("Study types")
     if "study_type" in filtered_df.columns:
-        study_type_counts = filtered_df["study_type"].value_counts().reset_index()
+        study_type_counts = filtered_df["study_type"].value_counts().loc[lambda s: s > 0].reset_index()
         study_type_counts.columns = ["study_type", "count"]
         fig_study = px.bar(study_type_counts, y="study_type", x="count",
                            labels={"study_type": "Study Type", "count": "Count"},
@@ -204,6 +235,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: inclusion criteria')
     # ─── Inclusion and Exclusion Criteria ──────────────────────────────────────
     st.markdown("#### Studies with defined inclusion and exclusion criteria")
     filtered_df['has_criteria'] = filtered_df[['inclusion_crt', 'exclusion_crt']].notna().any(axis=1)
@@ -212,10 +244,11 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: intervention model')
     # ─── Interventional Model ───────────────────────────────────────────
     st.markdown("#### Intervention model")
     if 'intervention_model' in filtered_df.columns:
-        models = filtered_df['intervention_model'].value_counts().reset_index()
+        models = filtered_df['intervention_model'].value_counts().loc[lambda s: s > 0].reset_index()
         models.columns = ['Model', 'Total']
         st.plotly_chart(px.bar(models, x='Model', y='Total', text='Total'))
 
@@ -223,6 +256,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: enrollment')
     # ─── Enrollment Distribution ─────────────────────────────────────────────────
     st.markdown("### Enrollment Trends Over Time")
 
@@ -237,6 +271,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('chart: keywords')
     # ─── Keywords ──────────────────────────────────────────────────────
     st.markdown("#### Top Keywords")
     keywords = filtered_df['keywords'].dropna().apply(parse_list_str).explode()
@@ -246,6 +281,7 @@ with infograph_tabs[0]:
 
     st.divider()
 
+    mark('export')
     # ─── Download ──────────────────────────────────────────────────────
     st.subheader("📥 Export table with all the studies")
 
@@ -263,62 +299,81 @@ with infograph_tabs[0]:
     with st.expander("See table with all the studies", expanded=True):
         st.dataframe(df_export.sort_values(by='start_date', ascending=False))
 
-        csv = df_export.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download CSV", csv, "clinical_trials.csv", "text/csv")
+        # The file is only written when requested, and reused while the filters stay the same
+        export_widget(df_export, "clinical_trials", key="export_trials", state={
+            'data': data_mtime,
+            'countries': countries,
+            'study_types': selected_study_types,
+            'therapeutic_areas': selected_therapeutic_areas,
+            'interventions': selected_interventions,
+        })
 
     st.markdown("---")
 
 with infograph_tabs[1]:
     st.header("Early Access Programs (Infarmed)")
 
-    # Load PAP dataset
-    pap_path = os.path.join("sources", "pap_clean.parquet")
+    mark('pap: load')
+    # Early access programs are an Infarmed (Portuguese) dataset
+    if countries and 'pt' not in countries:
+        st.info("Early access programs are only available for Portugal (PT). Select it in the sidebar to see them.")
+        st.stop()
+
+    # Load PAP dataset: typed columns, flags and aggregates are prepared by the ETL and cached until it runs again
+    pap_path = os.path.join(SOURCES_DIR, "pap_clean.parquet")
     try:
-        pap_df = pd.read_parquet(pap_path)
+        pap_df, pap_summary = load_pap(pap_path, os.path.getmtime(pap_path))
     except Exception as e:
-        st.error(f"Error loading PAP data: {e}")
+        st.error(f"Error loading PAP data (run the ETL to rebuild it): {e}")
         st.stop()
 
     # Filters
     st.subheader("🔎 Filters")
     colf1, colf2, colf3, colf4 = st.columns(4)
 
-    anos = pap_df['ano_decisao'].dropna().sort_values().unique()
+    anos = sorted(pap_summary['ano_decisao'].dropna().astype(int).unique().tolist())
     ano_sel = colf1.multiselect("Year of Decision", options=anos, default=anos)
 
-    decisao_sel = colf2.multiselect("Decision", options=pap_df['decisao'].dropna().unique(), default=pap_df['decisao'].dropna().unique())
+    decisoes = pap_summary['decisao'].dropna().unique().tolist()
+    decisao_sel = colf2.multiselect("Decision", options=decisoes, default=decisoes)
 
     pap_act_sel = colf3.selectbox("PAP Active?", options=["Todos", "Ativo", "Inativo"])
 
     custos_sel = colf4.selectbox("With costs?", options=["Todos", "Com custos", "Sem custos"])
 
-    # Applying Filters
-    df_filtered = pap_df[
-        (pap_df['ano_decisao'].isin(ano_sel)) &
-        (pap_df['decisao'].isin(decisao_sel))
-        ]
-    if pap_act_sel != "Todos":
-        df_filtered = df_filtered[df_filtered['PAP_act'] == (pap_act_sel == "Ativo")]
-    if custos_sel != "Todos":
-        df_filtered = df_filtered[df_filtered['c_custos'] == (custos_sel == "Com custos")]
+    mark('pap: filter')
+    # Applying Filters: the same selection on the programs (table, INNs, export) and on the aggregates (KPIs, charts)
+    def pap_selection(frame):
+        mask = frame['ano_decisao'].isin(ano_sel) & frame['decisao'].isin(decisao_sel)
+        if pap_act_sel != "Todos":
+            mask &= frame['PAP_act'].eq(pap_act_sel == "Ativo")
+        if custos_sel != "Todos":
+            mask &= frame['c_custos'].eq(custos_sel == "Com custos")
+        return frame[mask.fillna(False).astype(bool)]
+
+    df_filtered = pap_selection(pap_df)
+    summary_filtered = pap_selection(pap_summary)
 
+    mark('pap: charts')
     # General PAP KPIs
+    total_programs = int(summary_filtered['programs'].sum())
+    approved = int(summary_filtered.loc[summary_filtered['deferimento'].fillna(False).astype(bool), 'programs'].sum())
     st.subheader("Overview of the PAP Programs")
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Total Programs", f"{len(df_filtered):,}")
-    col2.metric("% Approved", f"{(df_filtered['decisao'].value_counts(normalize=True).get('Deferido', 0)*100):.1f}%")
-    col3.metric("Active Programs", int(df_filtered['PAP_act'].sum()))
-    col4.metric("With Costs", int(df_filtered['c_custos'].sum()))
+    col1.metric("Total Programs", f"{total_programs:,}")
+    col2.metric("% Approved", f"{(approved / total_programs * 100 if total_programs else 0):.1f}%")
+    col3.metric("Active Programs", int(summary_filtered.loc[summary_filtered['PAP_act'].astype(bool), 'programs'].sum()))
+    col4.metric("With Costs", int(summary_filtered.loc[summary_filtered['c_custos'].fillna(False).astype(bool), 'programs'].sum()))
 
     # Temporal trend
     st.subheader("Temporal Trend of PAP Decisions")
-    yearly_counts = df_filtered['ano_decisao'].value_counts().sort_index()
+    yearly_counts = summary_filtered.groupby('ano_decisao')['programs'].sum().sort_index()
     fig = px.line(x=yearly_counts.index, y=yearly_counts.values, markers=True, labels={'x': 'Year', 'y': 'No. of decisions'})
     st.plotly_chart(fig, use_container_width=True)
 
     # Distribution of decision types
     st.subheader("Distribution of decision types")
-    decision_counts = df_filtered['decisao'].value_counts()
+    decision_counts = summary_filtered.groupby('decisao')['programs'].sum().sort_values(ascending=False)
     fig = px.pie(values=decision_counts.values, names=decision_counts.index, hole=0.4)
     st.plotly_chart(fig, use_container_width=True)
 
@@ -329,9 +384,15 @@ with infograph_tabs[1]:
     fig = px.bar(top_dcis, x="INN", y="Total", text="Total")
     st.plotly_chart(fig, use_container_width=True)
 
+    mark('pap: table and export')
     # Table & Download
     with st.expander("Table with PAP data", expanded=True):
         st.dataframe(df_filtered[['Nome', 'DCI', 'decisao', 'data_decisao', 'n_doentes', 'PAP_act', 'c_custos']].sort_values(by='data_decisao', ascending=False))
 
-        csv = df_filtered.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download CSV", csv, "early_access_programs.csv", "text/csv")
+        export_widget(df_filtered, "early_access_programs", key="export_pap", state={
+            'data': os.path.getmtime(pap_path),
+            'years': ano_sel,
+            'decisions': decisao_sel,
+            'pap_active': pap_act_sel,
+            'costs': custos_sel,
+        })
@@ -2,7 +2,17 @@ import os
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from utils.auxiliary import *
+from utils.data import FULL_DF_PATH, dataset_mtime, load_df_parquet, load_extras, load_filter_index, select_countries
+from utils.llm import (
+    format_system_final_role_template,
+    format_system_prefilter_role_template,
+    format_user_prompt_template,
+    get_groq_models,
+    get_trial_recommendation_groq,
+)
+from utils.export import export_widget
+from utils.filters import picotss_mask
+from utils.profiling import mark
 
 st.set_page_config(layout="wide")
 
@@ -22,11 +32,15 @@ st.write("This page helps researchers explore clinical trials based on different
          "typing a custom research question.")
 
 
+mark('load')
 # Load Data
-data_path = os.path.join("sources", "full_df.parquet")
+# Only the partitions of the selected countries are read
+data_path = FULL_DF_PATH
+countries = select_countries(data_path)
 try:
-    df = pd.read_parquet(data_path)
-    CT_data = load_df_parquet(data_path)
+    data_mtime = dataset_mtime(data_path)
+    CT_data = load_df_parquet(data_path, countries, data_mtime)
+    filter_index = load_filter_index(data_path, data_mtime, countries, _df=CT_data)
 except Exception as e:
     st.error(f"Error loading dataset: {e}")
     st.stop()
@@ -48,73 +62,61 @@ with researcher_tabs[0]:
 
     age_filter = colf1.selectbox("Age group", ["All", "0-17 years", "18-64 years", "65+ years"])
     sex_filter = colf2.selectbox("Sex", ["All", "Female", "Male"])
-    condition_filter = colf3.text_input("Condition / Disease")
-    intervention_filter = colf4.text_input("Intervention")
+    # With the search index, text filters match the start of words; without it, any part of the text
+    if filter_index.search is not None:
+        text_match_help = ('Each word matches the start of a word ("pembro" finds "pembrolizumab", "lizumab" does not) '
+                           'and accents are ignored.')
+        other_term_help = f"Searches titles, keywords, interventions and eligibility criteria. {text_match_help}"
+    else:
+        text_match_help = "Matches any part of the text, ignoring case."
+        other_term_help = f"Searches titles, therapeutic areas, keywords and interventions. {text_match_help}"
+    condition_filter = colf3.text_input("Condition / Disease", help=f"Searches therapeutic areas. {text_match_help}")
+    intervention_filter = colf4.text_input("Intervention", help=f"Searches interventions. {text_match_help}")
 
     colf5, colf6 = st.columns(2)
-    other_term = colf5.text_input("Other search term (keywords)")
+    other_term = colf5.text_input("Other search term", help=other_term_help)
     outcome_filter = colf6.text_input("Outcome measure")
 
     colf7, colf8 = st.columns(2)
     study_type_filter = colf7.selectbox("Study Type", ["All", "Interventional", "Observational"])
     study_status_filter = colf8.selectbox("Study Status", ["All", "Recruiting", "Ongoing", "Completed", "Expanded Access"])
 
-    # Applying filters
-    df_filtered = df.copy()
-
-    # Age filter
-    if age_filter == "0-17 years":
-        df_filtered = df_filtered[df_filtered['Age_0_17_years'] == True]
-    elif age_filter == "18-64 years":
-        df_filtered = df_filtered[df_filtered['Age_18_64_years'] == True]
-    elif age_filter == "65+ years":
-        df_filtered = df_filtered[df_filtered['Age_65p_years'] == True]
-
-    # Sex filter
-    if sex_filter == "Female":
-        df_filtered = df_filtered[df_filtered['Gender_F'] == True]
-    elif sex_filter == "Male":
-        df_filtered = df_filtered[df_filtered['Gender_M'] == True]
-
-    # Therapeutic area filter
-    df_filtered['therapeutic_area'] = df_filtered['therapeutic_area'].apply(parse_list_str)
-    if condition_filter:
-        df_filtered = df_filtered[
-            df_filtered['therapeutic_area'].apply(lambda x: any(condition_filter.lower() in str(i).lower() for i in x) if isinstance(x, list) else False)
-        ]
-
-    # Intervention filter
-    df_filtered['interventions'] = df_filtered['interventions'].apply(parse_list_str)
-    if condition_filter:
-        df_filtered = df_filtered[
-            df_filtered['interventions'].apply(lambda x: any(condition_filter.lower() in str(i).lower() for i in x) if isinstance(x, list) else False)
-        ]
-
-    # Other search term filter (keywords)
-    if other_term:
-        df_filtered = df_filtered[df_filtered['keywords'].apply(lambda x: other_term.lower() in str(x).lower())]
-
-    # Outcome measure filter
-    if outcome_filter and 'outcome_measures' in df_filtered.columns:
-        df_filtered = df_filtered[df_filtered['outcome_measures'].apply(lambda x: outcome_filter.lower() in str(x).lower())]
-
-    # Study type
-    if study_type_filter != "All":
-        df_filtered = df_filtered[df_filtered['study_type'].str.lower() == study_type_filter.lower()]
-
-    # Study status
-    if study_status_filter != "All":
-        df_filtered = df_filtered[df_filtered['status'].str.contains(study_status_filter, case=False, na=False)]
-
-    # Results
+    mark('filter')
+    # Applying filters: all criteria compiled into a single mask over the precomputed index
+    picotss = {
+        'age': age_filter,
+        'sex': sex_filter,
+        'condition': condition_filter,
+        'intervention': intervention_filter,
+        'other_term': other_term,
+        'outcome': outcome_filter,
+        'study_type': study_type_filter,
+        'status': study_status_filter,
+    }
+    picotss_filter = picotss_mask(filter_index, **picotss)
+    df_filtered = CT_data[picotss_filter]
+
+    mark('results')
+    # Results: ranked by relevance when searching free text (if the search index is available), else most recent first
+    relevance = filter_index.relevance(other_term) if other_term.strip() else None
+    results_table = df_filtered[['title', 'start_date', 'therapeutic_area', 'interventions', 'study_type', 'status']]
+    if relevance is not None:
+        results_table = results_table.iloc[relevance[picotss_filter].argsort(kind='stable')]
+    else:
+        results_table = results_table.sort_values(by='start_date', ascending=False)
+
     st.subheader(f"Findings: {len(df_filtered):,} trials")
     with st.expander("See table with details", expanded=True):
-        st.dataframe(df_filtered[['title', 'start_date', 'therapeutic_area', 'interventions', 'study_type', 'status']].sort_values(by='start_date', ascending=False))
-        csv = df_filtered.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download CSV", csv, "filtered_studies.csv", "text/csv")
-
+        st.dataframe(results_table)
+        export_widget(df_filtered, "filtered_studies", key="export_picotss", state={
+            'data': data_mtime,
+            'countries': countries,
+            **picotss,
+        })
+
+mark('llm setup')
 # TAB 2.2: Make my day
-with researcher_tabs[2]:
+with researcher_tabs[1]:
     st.header("🔍 Make my day!")
     st.write('This section tries to match the User\'s desired clinical context to the best scoring entries in the '
              'Clinical Trials Database. '
@@ -138,9 +140,18 @@ with researcher_tabs[2]:
                 'Certainty cutoff', min_value=0.1, max_value=1.0, value=2/3,
                 key='certainty_cutoff'
             )
+            st.checkbox(
+                'Only trials matching the PICOTSS filters', value=False,
+                key='prefilter_picotss',
+                help=f'Restricts the candidates sent to the LLMs to the {len(df_filtered):,} trials found in Tab 2.1.'
+            )
 
         with cols[1]:
             avail_models = get_groq_models()
+            if avail_models is None:
+                # No API access (missing secrets or offline): the rest of the tab needs the model list
+                st.warning("The list of GroQ models could not be loaded. Check the GROQ settings in the app secrets.")
+                st.stop()
 
             with st.expander("Sample of full Clinical Trial Database", icon='💽', expanded=False):
                 st.write(CT_data.columns)
@@ -184,9 +195,14 @@ with researcher_tabs[2]:
     if user_query and submit_button:
         st.write(f"Searching for studies related to: **{user_query}**")
 
+        mark('llm recommendation')
+        # The PICOTSS mask narrows the candidates before any prompt is built
+        candidates = CT_data[picotss_filter] if st.session_state.prefilter_picotss else CT_data
+        st.write(f"Candidate trials: {len(candidates):,}")
+
         st.write(get_trial_recommendation_groq(
             user_query,
-            CT_data,
+            candidates,
             chunk_size=st.session_state.prefilter_chunk_size,
             type_trials=st.session_state.prefilter_type_trials,
             proportion=st.session_state.prefilter_proportion,
@@ -3,7 +3,8 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 from streamlit_extras.metric_cards import style_metric_cards
-from utils.auxiliary import parse_list_str, load_extras
+from utils.data import parse_list_str, load_extras
+from utils import crawl_jobs
 
 st.set_page_config(layout="wide")
 
@@ -24,6 +25,7 @@ tabs = st.tabs([
     "General Settings",
     "CT Data update",
     "CT Data processing",
+    "Profiling",
 ])
 
 with tabs[0]:
@@ -42,13 +44,8 @@ with tabs[1]:
     st.write('All data is stored locally, for further processing and analysis')
     st.warning("⚠️ This is a lengthy process that may take several minutes to complete")
 
-    # Container for scraper status
-    status_container = st.empty()
-
     # Get list of available scrapers from scrapers directory
-    scrapers_path = "scrapers/eu_ctr/eu_ctr/spiders"
-    available_scrapers = [f for f in os.listdir(scrapers_path)
-                          if f.endswith('_spider.py')]
+    available_scrapers = crawl_jobs.list_spider_files()
 
     # Create multiselect for scrapers
     selected_scrapers = st.multiselect(
@@ -58,48 +55,82 @@ with tabs[1]:
         format_func=lambda x: x.replace('_spider.py', '').title()
     )
 
-    if st.button("Start Data Update", type="primary"):
-        if not selected_scrapers:
-            st.error("Please select at least one data source to update")
-        else:
-            import sys, os
-
-            # Adiciona o diretório "scrapers/eu_ctr" ao sys.path para que o pacote "eu_ctr.spiders" seja encontrado
-            base_dir = os.path.abspath(os.path.join("scrapers", "eu_ctr"))
-            if base_dir not in sys.path:
-                sys.path.insert(0, base_dir)
-
-            progress_bar = st.progress(0)
-
-            for idx, spider in enumerate(selected_scrapers):
-                spider_name = spider.replace('_spider.py', '')
-                status_container.info(f"Running {spider_name} spider...")
-
-                try:
-                    from scrapy.crawler import CrawlerProcess
-                    from scrapy.utils.project import get_project_settings
-
-                    settings = get_project_settings()
-                    process = CrawlerProcess(settings)
-
-                    # O módulo a ser importado será "eu_ctr.spiders.<spider_name>" (dentro de "scrapers/eu_ctr")
-                    module_name = f"eu_ctr.spiders.{spider_name}"
-                    spider_module = __import__(module_name, fromlist=[""])
+    crawl_countries = crawl_jobs.crawl_countries()
+    crawl_country = st.selectbox(
+        "Country",
+        crawl_countries,
+        index=crawl_countries.index('pt') if 'pt' in crawl_countries else 0,
+        format_func=str.upper,
+        help="Country searched in the European registers. Infarmed early access programs are always Portuguese."
+    )
 
-                    # Supondo que a classe do spider use CamelCase com "Spider" ao final
-                    spider_class_name = ''.join(word.capitalize() for word in spider_name.split('_')) + "Spider"
-                    spider_class = getattr(spider_module, spider_class_name)
+    incremental_update = st.checkbox(
+        "Incremental CTIS update",
+        value=True,
+        help="Only fetch CTIS trials decided since the last update (with a safety overlap). "
+             "Uncheck to walk all result pages."
+    )
 
-                    process.crawl(spider_class)
-                    process.start(stop_after_crawl=True)
+    run_parallel = st.checkbox(
+        "Run sources in parallel",
+        value=True,
+        help="Each source runs in its own process. Uncheck to run them one after the other."
+    )
 
-                    progress = (idx + 1) / len(selected_scrapers)
-                    progress_bar.progress(progress)
-                except Exception as e:
-                    st.error(f"Error running {spider_name} spider: {str(e)}")
-                    continue
+    def spider_kwargs(spider_name):
+        kwargs = {'country': crawl_country} if spider_name in ('ctis_eu', 'trials') else {}
+        if spider_name == 'ctis_eu':
+            kwargs['incremental'] = int(incremental_update)
+        return kwargs
 
-            status_container.success("Data update completed!")
+    if st.button("Start Data Update", type="primary"):
+        if not selected_scrapers:
+            st.error("Please select at least one data source to update")
+        else:
+            # Spiders run in background processes; the page only polls their progress files
+            spider_names = [crawl_jobs.spider_name_from_file(f) for f in selected_scrapers]
+            queue = [name for name in spider_names if not crawl_jobs.is_running(name)]
+            if run_parallel:
+                for name in queue:
+                    crawl_jobs.start_crawl(name, spider_kwargs(name))
+                queue = []
+            st.session_state['crawl_queue'] = [(name, spider_kwargs(name)) for name in queue]
+            st.session_state['crawl_jobs'] = spider_names
+
+    @st.fragment(run_every=2)
+    def crawl_progress():
+        jobs = st.session_state.get('crawl_jobs', [])
+        if not jobs:
+            return
+
+        # Sequential mode: start the next queued spider once nothing else is running
+        queue = st.session_state.get('crawl_queue', [])
+        if queue and not any(crawl_jobs.is_running(name) for name in jobs):
+            name, kwargs = queue.pop(0)
+            crawl_jobs.start_crawl(name, kwargs)
+
+        for name in jobs:
+            status = crawl_jobs.read_status(name) or {'state': 'queued'}
+            stats = status.get('stats', {})
+            elapsed = status.get('updated_at', 0) - status.get('started_at', 0)
+
+            cols = st.columns([2, 1, 1, 1, 1])
+            cols[0].markdown(f"**{name}** — {status['state']}")
+            cols[1].metric("Items", stats.get('item_scraped_count', 0))
+            cols[2].metric("Requests", stats.get('downloader/request_count', 0))
+            cols[3].metric("Errors", stats.get('log_count/ERROR', 0))
+            cols[4].metric("Elapsed", f"{max(elapsed, 0):.0f} s")
+            if status['state'] in crawl_jobs.ACTIVE_STATES and cols[0].button("Stop", key=f"stop_{name}"):
+                crawl_jobs.stop_crawl(name)
+
+        if not queue and not any(crawl_jobs.is_running(name) for name in jobs):
+            states = [(crawl_jobs.read_status(name) or {}).get('state') for name in jobs]
+            if all(state == 'finished' for state in states):
+                st.success("Data update completed!")
+            else:
+                st.warning("Data update stopped before completion; interrupted sources resume on the next run.")
+
+    crawl_progress()
 
     # Add information about last update
     st.divider()
@@ -110,7 +141,6 @@ with tabs[1]:
         import pandas as pd
         from datetime import datetime
 
-        base_path = os.path.join("scrapers", "eu_ctr", "data")
         files = {
             "Old CT European database": "trials.parquet",
             "European CTIS": "ctis.parquet",
@@ -119,21 +149,30 @@ with tabs[1]:
 
         update_info = []
 
+        # One output per source and country (data/country=…/source=…)
         for source, filename in files.items():
-            file_path = os.path.join(base_path, filename)
-            if os.path.exists(file_path):
-                # Read the parquet file and count the number of records
-                df = pd.read_parquet(file_path)
-                records_updated = len(df)
+            for country, file_path in crawl_jobs.output_files(filename):
+                # Row count from the pipeline manifest (or the parquet footer), without loading the data
+                metadata = crawl_jobs.output_metadata(file_path)
+                records_updated = metadata["row_count"]
 
                 # Get the last modification time of the file and format it
-                last_mod_timestamp = os.path.getmtime(file_path)
-                last_update = datetime.fromtimestamp(last_mod_timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                last_update = datetime.fromtimestamp(metadata["file_mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+
+                # Telemetry of the last crawl of this country, written by the scrapers next to the parquet files
+                runs = crawl_jobs.telemetry_runs(filename, country=country, limit=1)
+                telemetry = runs[0] if runs else {}
 
                 update_info.append({
                     "source": source,
+                    "country": country.upper(),
                     "last_update": last_update,
-                    "total_records": records_updated
+                    "total_records": records_updated,
+                    "source_watermark": metadata.get("source_watermark"),
+                    "duration_s": metadata.get("crawl_duration_s", telemetry.get("duration_s")),
+                    "items_per_s": telemetry.get("items_per_s"),
+                    "download_p95_s": telemetry.get("download_latency_s", {}).get("p95"),
+                    "max_rss_mb": telemetry.get("max_rss_mb"),
                 })
 
         if update_info:
@@ -142,67 +181,161 @@ with tabs[1]:
                 update_df,
                 column_config={
                     "source": "Data Source",
+                    "country": "Country",
                     "last_update": "Last Update",
-                    "total_records": "Total Records"
+                    "total_records": "Total Records",
+                    "source_watermark": "Newest Decision",
+                    "duration_s": st.column_config.NumberColumn("Crawl Duration (s)", format="%.0f"),
+                    "items_per_s": st.column_config.NumberColumn("Items/s", format="%.2f"),
+                    "download_p95_s": st.column_config.NumberColumn("Download p95 (s)", format="%.2f"),
+                    "max_rss_mb": st.column_config.NumberColumn("Peak Memory (MB)", format="%.0f"),
                 },
                 use_container_width=True
             )
+
+            with st.expander("Crawl performance history"):
+                history = pd.DataFrame([
+                    {
+                        "source": source,
+                        "country": (run.get("country") or "").upper(),
+                        "start_time": run.get("start_time"),
+                        "finish_reason": run.get("finish_reason"),
+                        "items": run.get("items"),
+                        "duration_s": run.get("duration_s"),
+                        "items_per_s": run.get("items_per_s"),
+                        "download_p95_s": run.get("download_latency_s", {}).get("p95"),
+                        "response_p95_bytes": run.get("response_size_bytes", {}).get("p95"),
+                        "max_rss_mb": run.get("max_rss_mb"),
+                        "errors": run.get("errors"),
+                    }
+                    for source, filename in files.items()
+                    for run in crawl_jobs.telemetry_runs(filename, limit=10)
+                ])
+                if history.empty:
+                    st.info("No crawl telemetry recorded yet.")
+                else:
+                    st.dataframe(history, use_container_width=True, hide_index=True)
         else:
             st.info("No update information available.")
     except Exception as e:
         st.error(f"Error loading update information: {e}")
 
 with tabs[2]:
-    import os
-    import pandas as pd
-    import streamlit as st
+    import sys
+
+    from datetime import datetime
+
+    from utils.export import export_widget
 
     st.header("Reprocess Clinical Trials Data")
-    st.write("This process will merge data from different sources into a single DataFrame.")
+    st.write("This process runs the ETL: it cleans each source, merges them through the trial id crosswalk "
+             "and rewrites the dataset used by the app.")
 
-    if st.button("Process Data"):
-        # Define data paths
-        base_data_path = os.path.join("scrapers", "eu_ctr", "data")
-        ctis_path = os.path.join(base_data_path, "ctis.parquet")
-        pap_path = os.path.join(base_data_path, "pap.parquet")
-        trials_path = os.path.join(base_data_path, "trials.parquet")
+    scraped_countries = crawl_jobs.scraped_countries()
+    etl_countries = st.multiselect(
+        "Countries", scraped_countries, default=scraped_countries, format_func=str.upper,
+        help="Countries with scraped data to include in the dataset; each one is a partition the app loads on demand."
+    )
+
+    if st.button("Process Data", disabled=not etl_countries):
+        # The ETL modules live in "etl" and import each other as top-level modules
+        etl_dir = os.path.abspath("etl")
+        if etl_dir not in sys.path:
+            sys.path.insert(0, etl_dir)
 
-        # Try to read the files
         try:
-            ctis_df = pd.read_parquet(ctis_path)
-            pap_df = pd.read_parquet(pap_path)
-            trials_df = pd.read_parquet(trials_path)
+            import etl as etl_pipeline
+
+            with st.status("Running ETL...", expanded=True) as etl_status:
+                result = etl_pipeline.run(
+                    excel_path=None,
+                    countries=etl_countries,
+                    on_stage=lambda name: etl_status.write(f"Stage: {name}")
+                )
+                etl_status.update(label="ETL complete", state="complete")
         except Exception as e:
-            st.error(f"Error reading data files: {e}")
+            st.error(f"Error processing data: {e}")
             st.stop()
 
-        st.info(f"ctis: {ctis_df.shape[0]} records | pap: {pap_df.shape[0]} records | trials: {trials_df.shape[0]} records")
+        # Only the reprocessed dataset is kept between reruns; exports are written when requested
+        result['finished_at'] = datetime.now().isoformat()
+        st.session_state['etl_result'] = result
+        # Cached frames and the filter/search indexes (cache_resource) all point at the replaced files
+        st.cache_data.clear()
+        st.cache_resource.clear()
+
+    result = st.session_state.get('etl_result')
+    if result is None:
+        st.info("Click the 'Process Data' button to combine the clinical trials data.")
+    else:
+        counts = result['counts']
+        st.info(" | ".join(f"{name}: {n:,} records" for name, n in counts.items()))
+        st.success(f"Processing complete. Total combined records: {len(result['full']):,}")
 
-        # Standardize columns so that the concatenation works even if the tables have different structures.
-        all_columns = set(ctis_df.columns).union(pap_df.columns).union(trials_df.columns)
-        ctis_df = ctis_df.reindex(columns=all_columns)
-        pap_df = pap_df.reindex(columns=all_columns)
-        trials_df = trials_df.reindex(columns=all_columns)
+        # Display the first 20 rows for preview
+        st.dataframe(result['full'].head(20))
 
-        # Concatenate the DataFrames vertically (stacking the records)
-        combined_df = pd.concat([ctis_df, pap_df, trials_df], ignore_index=True, sort=False)
+        # Downloads are written on request, in chunks, to a file reused until the next ETL run
+        export_widget(result['full'], "combined_ct_data", key="export_etl", state={'etl_run': result['finished_at']})
 
-        # Example cleaning: convert "start_date" column to datetime if it exists.
-        if "start_date" in combined_df.columns:
-            combined_df["start_date"] = pd.to_datetime(combined_df["start_date"], errors="coerce")
+with tabs[3]:
+    from utils import profiling
 
-        st.success(f"Processing complete. Total combined records: {combined_df.shape[0]:,}")
+    st.header("Page Profiling")
+    st.write("When enabled, each page run records the time spent in its named sections (data loading, filters, "
+             "each chart) and a profile of the whole run, written to the profiles folder.")
 
-        # Display the first 20 rows for preview
-        st.dataframe(combined_df.head(20))
-
-        # Allow download of the combined data as CSV
-        csv_data = combined_df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="📥 Download Combined Data (CSV)",
-            data=csv_data,
-            file_name="combined_ct_data.csv",
-            mime="text/csv"
+    if os.environ.get('PTOOLCTEX_PROFILE', '').lower() in ('1', 'true', 'yes'):
+        st.info("Profiling is enabled for all sessions (PTOOLCTEX_PROFILE).")
+    else:
+        # Kept outside the widget key, so the choice survives navigating to the other pages
+        st.toggle(
+            "Profile page runs in this session",
+            value=st.session_state.get(profiling.SESSION_KEY, False),
+            key="profiling_toggle",
+            on_change=lambda: st.session_state.update({profiling.SESSION_KEY: st.session_state.profiling_toggle}),
+            help="Uses pyinstrument when installed (HTML flamegraph), otherwise cProfile (.prof file)."
         )
+
+    runs = profiling.load_profiles()
+    if not runs:
+        st.info(f"No profiled runs in '{profiling.PROFILE_DIR}' yet.")
     else:
-        st.info("Click the 'Process Data' button to combine the clinical trials data.")
+        sections = pd.DataFrame([
+            {'page': run['page'], 'section': section['name'], 'seconds': section['seconds']}
+            for run in runs
+            for section in run['sections']
+        ])
+        if not sections.empty:
+            st.subheader("Slowest sections")
+            slowest = (
+                sections.groupby(['page', 'section'])['seconds']
+                .agg(runs='size', median='median', p95=lambda s: s.quantile(0.95), max='max')
+                .reset_index()
+                .sort_values('p95', ascending=False)
+                .head(15)
+            )
+            st.dataframe(
+                slowest,
+                column_config={
+                    "median": st.column_config.NumberColumn("Median (s)", format="%.3f"),
+                    "p95": st.column_config.NumberColumn("p95 (s)", format="%.3f"),
+                    "max": st.column_config.NumberColumn("Max (s)", format="%.3f"),
+                },
+                use_container_width=True, hide_index=True
+            )
+
+        st.subheader("Recent runs")
+        recent = pd.DataFrame(runs)[['started_at', 'page', 'seconds', 'status', 'profiler', 'profile_file']]
+        st.dataframe(
+            recent,
+            column_config={"seconds": st.column_config.NumberColumn("Duration (s)", format="%.3f")},
+            use_container_width=True, hide_index=True
+        )
+
+        profile_files = [f for f in recent['profile_file'] if f and os.path.exists(os.path.join(profiling.PROFILE_DIR, f))]
+        if profile_files:
+            cols = st.columns([3, 1], vertical_alignment='bottom')
+            selected_profile = cols[0].selectbox("Profile", profile_files)
+            with open(os.path.join(profiling.PROFILE_DIR, selected_profile), 'rb') as f:
+                cols[1].download_button("📥 Download profile", data=f, file_name=selected_profile)
@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.profiling import profile_run
 
 home = st.Page("pages/00_Home.py", title="Home | PToolCTex", icon="🏠", default=True)
 
@@ -18,4 +19,6 @@ pg = st.navigation(
     }
 )
 
-pg.run()
+# Opt-in profiling (PTOOLCTEX_PROFILE=1 or the Settings page): timings and profiles written to profiles/
+with profile_run(pg.title):
+    pg.run()
@@ -0,0 +1,74 @@
+import os
+
+# Países que os spiders sabem pesquisar: código ISO 3166-1 alfa-2 (usado no EU-CTR e nas partições de saída)
+# → código numérico ISO 3166-1, que o CTIS usa como identificador do Estado-Membro (`msc`)
+CTIS_MSC_CODES = {
+    'at': 40,
+    'be': 56,
+    'bg': 100,
+    'hr': 191,
+    'cy': 196,
+    'cz': 203,
+    'dk': 208,
+    'ee': 233,
+    'fi': 246,
+    'fr': 250,
+    'de': 276,
+    'gr': 300,
+    'hu': 348,
+    'is': 352,
+    'ie': 372,
+    'it': 380,
+    'lv': 428,
+    'li': 438,
+    'lt': 440,
+    'lu': 442,
+    'mt': 470,
+    'nl': 528,
+    'no': 578,
+    'pl': 616,
+    'pt': 620,
+    'ro': 642,
+    'sk': 703,
+    'si': 705,
+    'es': 724,
+    'se': 752,
+}
+
+
+def normalize_country(value):
+    """
+    Valida o código do país recebido como argumento do spider ou nas definições.
+
+    :param value: código ISO 3166-1 alfa-2 (maiúsculas ou minúsculas)
+    :return: código em minúsculas
+    """
+    country = str(value).strip().lower()
+    if country not in CTIS_MSC_CODES:
+        raise ValueError(f"País desconhecido: {value!r} (esperado um de {', '.join(sorted(CTIS_MSC_CODES))})")
+    return country
+
+
+def partition_dir(output_folder, country, source):
+    """Diretório da partição Hive (`country=…/source=…`) onde um spider grava os seus ficheiros."""
+    return os.path.join(output_folder, f'country={country}', f'source={source}')
+
+
+class CountryMixin:
+    """
+    País do crawl (`-a country=pt` ou a definição CRAWL_COUNTRY): define a pesquisa do spider e a partição onde
+    o ParquetPipeline grava a saída.
+    """
+    country = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.country = normalize_country(spider.country or crawler.settings.get('CRAWL_COUNTRY', 'pt'))
+
+        # Estado de retoma separado por país: um crawl interrompido só é retomado para o mesmo país
+        # (as definições ainda podem ser alteradas aqui; são fixadas depois de o spider ser criado)
+        jobdir = crawler.settings.get('JOBDIR')
+        if jobdir:
+            crawler.settings.set('JOBDIR', os.path.join(jobdir, spider.country), priority='spider')
+        return spider
@@ -1,19 +1,211 @@
+import json
 import logging
 import datetime
+import os
+import shutil
+import sys
+import time
+import numpy as np
 from scrapy import signals
+from twisted.internet import task
+
+from .countries import partition_dir
+from .pipelines import ParquetPipeline
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sinal enviado pelo CallbackLatencySpiderMiddleware com o tempo de cada callback (argumentos: callback, latency)
+callback_parsed = object()
+
+
+def _write_json(path, data):
+    # Escrita atómica: quem lê o ficheiro nunca vê um JSON incompleto
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_file, path)
+
+
+def _summary(values):
+    if not values:
+        return {'count': 0}
+    values = np.asarray(values, dtype=float)
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 4),
+        'p50': round(float(p50), 4),
+        'p90': round(float(p90), 4),
+        'p95': round(float(p95), 4),
+        'p99': round(float(p99), 4),
+        'max': round(float(values.max()), 4),
+    }
+
+
+def _histogram(values, edges):
+    counts, _ = np.histogram(values, bins=edges)
+    return {f'<{upper:g}': int(n) for upper, n in zip(edges[1:], counts)}
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return round(max_rss / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
 
 class CustomStatsExtension:
-    def __init__(self):
+    # Estatísticas publicadas no ficheiro de progresso
+    PROGRESS_STATS = (
+        'item_scraped_count', 'item_dropped_count', 'downloader/request_count', 'response_received_count',
+        'log_count/ERROR', 'httpcache/hit', 'httpcache/miss',
+        'delta/new', 'delta/changed', 'delta/unchanged',
+    )
+    # Limites (ms) dos intervalos do histograma de latência de parsing
+    PARSE_HISTOGRAM_MS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf'))
+
+    def __init__(self, stats=None, progress_file=None, progress_interval=2.0,
+                 telemetry_folder=None, telemetry_interval=10.0, country='pt'):
         # Regista o horário de início do scraping
         self.start_time = datetime.datetime.now()
+        self.stats = stats
+        # Ficheiro JSON onde o progresso é publicado para a aplicação (definido pelo job runner da página Settings)
+        self.progress_file = progress_file
+        self.progress_interval = progress_interval
+        self.progress_task = None
+        self.spider = None
+        self.reason = None
+
+        # Telemetria da execução, escrita em JSON quando o engine pára na pasta `telemetry` da partição do spider
+        # (<telemetry_folder>/country=…/source=…/telemetry/, junto do Parquet e do manifesto); None desativa
+        self.telemetry_folder = telemetry_folder
+        # País da partição quando o spider não define o seu (como no ParquetPipeline)
+        self.country = country
+        self.telemetry_interval = telemetry_interval
+        self.telemetry_task = None
+        self.parse_latency = {}
+        self.download_latency = []
+        self.response_sizes = []
+        self.timeline = []
 
     @classmethod
     def from_crawler(cls, crawler):
-        ext = cls()
+        settings = crawler.settings
+        telemetry_folder = None
+        if settings.getbool('TELEMETRY_ENABLED'):
+            telemetry_folder = settings.get('PARQUET_OUTPUT_FOLDER', 'data')
+        ext = cls(
+            stats=crawler.stats,
+            progress_file=os.environ.get('CRAWL_PROGRESS_FILE') or settings.get('CRAWL_PROGRESS_FILE'),
+            progress_interval=settings.getfloat('CRAWL_PROGRESS_INTERVAL', 2.0),
+            telemetry_folder=telemetry_folder,
+            telemetry_interval=settings.getfloat('TELEMETRY_INTERVAL', 10.0),
+            country=settings.get('CRAWL_COUNTRY', 'pt'),
+        )
         # Conecta o spider_closed ao sinal de fecho do spider
         crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        # O estado final e a telemetria só são escritos quando o engine pára, depois dos pipelines escreverem o Parquet
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        if telemetry_folder:
+            crawler.signals.connect(ext.response_received, signal=signals.response_received)
+            crawler.signals.connect(ext.callback_parsed, signal=callback_parsed)
         return ext
 
+    def spider_opened(self, spider):
+        self.spider = spider
+        if self.progress_file:
+            self.progress_task = task.LoopingCall(self.write_progress, spider, 'running')
+            self.progress_task.start(self.progress_interval, now=True)
+        if self.telemetry_folder:
+            self.telemetry_task = task.LoopingCall(self.sample_throughput)
+            self.telemetry_task.start(self.telemetry_interval, now=True)
+
+    def write_progress(self, spider, state, reason=None):
+        """Escreve (de forma atómica) o estado atual do crawl no ficheiro de progresso."""
+        stats = self.stats.get_stats()
+        progress = {
+            'spider': spider.name,
+            'state': state,
+            'reason': reason,
+            'pid': os.getpid(),
+            'started_at': self.start_time.timestamp(),
+            'updated_at': time.time(),
+            'stats': {key: stats.get(key, 0) for key in self.PROGRESS_STATS},
+        }
+        _write_json(self.progress_file, progress)
+
+    def response_received(self, response, request, spider):
+        if 'download_latency' in request.meta:
+            self.download_latency.append(request.meta['download_latency'])
+        self.response_sizes.append(len(response.body))
+
+    def callback_parsed(self, callback, latency, spider):
+        self.parse_latency.setdefault(callback, []).append(latency)
+
+    def sample_throughput(self):
+        """Amostra da série temporal de itens e respostas (itens/s desde a amostra anterior)."""
+        elapsed = (datetime.datetime.now() - self.start_time).total_seconds()
+        items = self.stats.get_value('item_scraped_count', 0)
+        responses = self.stats.get_value('response_received_count', 0)
+        previous = self.timeline[-1] if self.timeline else {'t': 0.0, 'items': 0, 'responses': 0}
+        dt = elapsed - previous['t']
+        self.timeline.append({
+            't': round(elapsed, 2),
+            'items': items,
+            'responses': responses,
+            'items_per_s': round((items - previous['items']) / dt, 3) if dt > 0 else 0.0,
+        })
+
+    def telemetry(self, spider):
+        """Resumo da execução em formato serializável (JSON)."""
+        stats = self.stats.get_stats()
+        duration = (datetime.datetime.now() - self.start_time).total_seconds()
+        items = stats.get('item_scraped_count', 0)
+        status_prefix = 'downloader/response_status_count/'
+
+        return {
+            'spider': spider.name,
+            'country': getattr(spider, 'country', None) or self.country,
+            'start_time': self.start_time.isoformat(timespec='seconds'),
+            'duration_s': round(duration, 3),
+            'finish_reason': self.reason,
+            'items': items,
+            'items_per_s': round(items / duration, 3) if duration else 0.0,
+            'requests': stats.get('downloader/request_count', 0),
+            'errors': stats.get('log_count/ERROR', 0),
+            'status_counts': {
+                key[len(status_prefix):]: value for key, value in sorted(stats.items()) if key.startswith(status_prefix)
+            },
+            'download_latency_s': _summary(self.download_latency),
+            'response_size_bytes': _summary(self.response_sizes),
+            'parse_latency_ms': {
+                callback: {
+                    **_summary([v * 1000 for v in values]),
+                    'histogram': _histogram([v * 1000 for v in values], self.PARSE_HISTOGRAM_MS),
+                }
+                for callback, values in self.parse_latency.items()
+            },
+            'throughput': self.timeline,
+            'max_rss_mb': _max_rss_mb(),
+            'httpcache_hit_rate': stats.get('httpcache/hit_rate'),
+            'delta': {key: stats.get(f'delta/{key}', 0) for key in ('new', 'changed', 'unchanged')},
+        }
+
+    def write_telemetry(self, spider):
+        output_file = ParquetPipeline.output_files.get(spider.name, f'{spider.name}.parquet')
+        source = os.path.splitext(output_file)[0]
+        folder = os.path.join(
+            partition_dir(self.telemetry_folder, getattr(spider, 'country', None) or self.country, source), 'telemetry')
+        name = f"{source}-{self.start_time.strftime('%Y%m%d-%H%M%S')}.json"
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, name)
+        _write_json(path, self.telemetry(spider))
+        logging.info(f"Telemetria do crawl escrita em {path}")
+
     def spider_closed(self, spider, reason):
         end_time = datetime.datetime.now()
         duration = end_time - self.start_time
@@ -25,14 +217,71 @@ class CustomStatsExtension:
         errors = stats.get('log_count/ERROR', 0)
         items_scraped = stats.get('item_scraped_count', 0)
 
+        # Eficácia da cache HTTP e do delta refresh
+        # (respostas revalidadas com 304 também contam como acertos)
+        cache_hits = stats.get('httpcache/hit', 0) + stats.get('httpcache/revalidate', 0)
+        cache_lookups = cache_hits + stats.get('httpcache/miss', 0) + stats.get('httpcache/invalidate', 0)
+        cache_hit_rate = cache_hits / cache_lookups if cache_lookups else 0.0
+        spider.crawler.stats.set_value('httpcache/hit_rate', round(cache_hit_rate, 4))
+
         # Formata a mensagem de log com as informações desejadas
         log_message = (
             f"Data do Scrape: {self.start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
             f"Duração: {duration}\n"
             f"Nº de Erros: {errors}\n"
             f"Itens Obtidos com Sucesso: {items_scraped}\n"
+            f"Taxa de Acerto da Cache: {cache_hit_rate:.1%} ({cache_hits}/{cache_lookups})\n"
+            f"Delta: {stats.get('delta/new', 0)} novos, {stats.get('delta/changed', 0)} alterados, "
+            f"{stats.get('delta/unchanged', 0)} sem alterações\n"
             f"Motivo do Fecho: {reason}"
         )
 
         # Regista a mensagem de log
         logging.info(log_message)
+
+        self.reason = reason
+        for looping_task in (self.progress_task, self.telemetry_task):
+            if looping_task is not None and looping_task.running:
+                looping_task.stop()
+        if self.progress_file:
+            self.write_progress(spider, 'closing', reason)
+
+    def engine_stopped(self):
+        if self.spider is None:
+            return
+        if self.telemetry_folder:
+            self.sample_throughput()
+            self.write_telemetry(self.spider)
+        if self.progress_file:
+            self.write_progress(self.spider, 'finished' if self.reason == 'finished' else 'interrupted', self.reason)
+
+
+class ResumableCrawlExtension:
+    """
+    Limpa o JOBDIR (fila do scheduler, requests vistos, estado do spider e partes de itens)
+    quando o crawl termina normalmente, para que a execução seguinte comece do início.
+    Em qualquer outro motivo de fecho o JOBDIR é mantido e o crawl é retomado na próxima execução.
+    """
+
+    def __init__(self, jobdir):
+        self.jobdir = jobdir
+        self.reason = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.settings.get('JOBDIR'))
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        # O engine só pára depois do scheduler e dos pipelines fecharem
+        crawler.signals.connect(ext.engine_stopped, signal=signals.engine_stopped)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        self.reason = reason
+
+    def engine_stopped(self):
+        if not self.jobdir or not os.path.isdir(self.jobdir):
+            return
+        if self.reason == 'finished':
+            shutil.rmtree(self.jobdir, ignore_errors=True)
+        else:
+            logging.info(f"Crawl interrompido ({self.reason}); estado mantido em {self.jobdir} para retoma.")
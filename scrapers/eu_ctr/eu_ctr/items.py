@@ -53,6 +53,7 @@ class TrialItem(scrapy.Item):
     # Armazena a URL da página de detalhe do ensaio clínico
     url = scrapy.Field()
     status = scrapy.Field()
+    decision_date = scrapy.Field()
     # Define um campo para armazenar outros detalhes extraídos (como um dicionário)
     details = scrapy.Field()
 
@@ -3,7 +3,18 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import logging
+import time
+from time import perf_counter
+from email.utils import parsedate_to_datetime
+
 from scrapy import signals
+from scrapy.downloadermiddlewares.retry import get_retry_request
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.response import response_status_message
+
+from .extensions import callback_parsed
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +112,210 @@ class EuCtrDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class DeltaRefreshMiddleware:
+    """
+    Deteção de alterações nas páginas de detalhe dos ensaios.
+
+    Compara o hash do conteúdo de cada resposta marcada com `meta['delta_refresh']` com o hash guardado
+    na execução anterior (carregado pelo ParquetPipeline em `spider.delta_state`). As páginas sem
+    alterações não voltam a ser processadas: o item anterior é reaproveitado pelo pipeline.
+
+    Deve ficar depois do HttpCacheMiddleware (prioridade < 900), para ver a resposta já revalidada
+    (ETag/Last-Modified) pela cache.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DELTA_REFRESH_ENABLED'):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        state = getattr(spider, 'delta_state', None)
+        if state is None or not request.meta.get('delta_refresh') or response.status != 200:
+            return response
+
+        if 'cached' in response.flags:
+            self.stats.inc_value('delta/cache_served', spider=spider)
+
+        url = request.url
+        digest = hashlib.sha1(response.body).hexdigest()
+        state['current'][url] = digest
+
+        previous = state['previous'].get(url)
+        if previous is None:
+            self.stats.inc_value('delta/new', spider=spider)
+        elif previous == digest:
+            self.stats.inc_value('delta/unchanged', spider=spider)
+            state['unchanged'].add(url)
+            raise IgnoreRequest(f"Sem alterações desde a última execução: {url}")
+        else:
+            self.stats.inc_value('delta/changed', spider=spider)
+
+        return response
+
+
+class BackoffRetryMiddleware:
+    """
+    Retentativas com recuo (backoff) para respostas de limitação de pedidos (por omissão 429 e 503).
+
+    Em vez de repetir o pedido de imediato, aumenta o atraso do slot de download do domínio: usa o
+    cabeçalho Retry-After quando o servidor o envia e, caso contrário, um recuo exponencial
+    (BACKOFF_BASE_DELAY * 2^tentativa, até BACKOFF_MAX_DELAY). O atraso volta a descer à medida que chegam
+    respostas bem-sucedidas: pelo AutoThrottle, se estiver ativo, ou aqui, para metade em cada resposta até
+    ao atraso original do slot.
+
+    Complementa o RetryMiddleware do Scrapy, que continua a tratar os restantes códigos e exceções; por isso
+    os códigos em BACKOFF_HTTP_CODES não devem constar de RETRY_HTTP_CODES.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RETRY_ENABLED'):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.http_codes = {int(code) for code in settings.getlist('BACKOFF_HTTP_CODES')}
+        self.max_retry_times = settings.getint('BACKOFF_RETRY_TIMES', settings.getint('RETRY_TIMES'))
+        self.base_delay = settings.getfloat('BACKOFF_BASE_DELAY', 1.0)
+        self.max_delay = settings.getfloat('BACKOFF_MAX_DELAY', 120.0)
+        self.autothrottle = settings.getbool('AUTOTHROTTLE_ENABLED')
+        # Atraso original dos slots em recuo (slot -> atraso antes do primeiro 429/503)
+        self.base_delays = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def retry_after(self, response):
+        """Segundos indicados no cabeçalho Retry-After (em segundos ou como data HTTP), ou None."""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        value = value.decode('latin-1').strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def _slot(self, request):
+        downloader = self.crawler.engine.downloader
+        if hasattr(downloader, 'get_slot_key'):
+            key = downloader.get_slot_key(request)
+        else:  # Scrapy < 2.11
+            key = downloader._get_slot_key(request, self.crawler.spider)
+        return key, downloader.slots.get(key)
+
+    def process_response(self, request, response, spider):
+        if response.status not in self.http_codes:
+            if self.base_delays and not self.autothrottle and response.status < 400:
+                self._recover(request)
+            return response
+        if request.meta.get('dont_retry'):
+            return response
+
+        retry_times = request.meta.get('retry_times', 0)
+        delay = self.retry_after(response)
+        if delay is None:
+            delay = self.base_delay * 2 ** retry_times
+        delay = min(delay, self.max_delay)
+
+        key, slot = self._slot(request)
+        if slot is not None and slot.delay < delay:
+            self.base_delays.setdefault(key, slot.delay)
+            slot.delay = delay
+            logging.info(f"Backoff de {delay:.1f}s em {request.url} (HTTP {response.status})")
+        self.stats.inc_value(f'backoff/{response.status}', spider=spider)
+        self.stats.max_value('backoff/max_delay', delay, spider=spider)
+
+        retry_request = get_retry_request(
+            request,
+            spider=spider,
+            reason=response_status_message(response.status),
+            max_retry_times=request.meta.get('max_retry_times', self.max_retry_times),
+        )
+        return retry_request or response
+
+    def _recover(self, request):
+        key, slot = self._slot(request)
+        if key not in self.base_delays:
+            return
+        base_delay = self.base_delays[key]
+        if slot is None or slot.delay / 2 <= base_delay:
+            if slot is not None:
+                slot.delay = base_delay
+            del self.base_delays[key]
+        else:
+            slot.delay /= 2
+
+
+class CallbackLatencySpiderMiddleware:
+    """
+    Mede o tempo de parsing de cada callback (apenas o tempo passado dentro do callback, sem contar o
+    processamento feito pelos middlewares e pipelines a jusante) e publica-o no sinal `callback_parsed`,
+    recolhido pelo CustomStatsExtension.
+
+    Deve ser o spider middleware mais próximo do spider (número de ordem mais alto).
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('TELEMETRY_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _callback_name(self, response, spider):
+        callback = response.request.callback if response.request is not None else None
+        return getattr(callback or spider.parse, '__name__', str(callback))
+
+    def _send(self, response, spider, elapsed):
+        self.crawler.signals.send_catch_log(
+            signal=callback_parsed,
+            callback=self._callback_name(response, spider),
+            latency=elapsed,
+            spider=spider,
+        )
+
+    def process_spider_output(self, response, result, spider=None):
+        spider = spider or self.crawler.spider
+        elapsed = 0.0
+        iterator = iter(result)
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    output = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += perf_counter() - start
+                yield output
+        finally:
+            self._send(response, spider, elapsed)
+
+    async def process_spider_output_async(self, response, result, spider=None):
+        spider = spider or self.crawler.spider
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    output = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += perf_counter() - start
+                yield output
+        finally:
+            self._send(response, spider, elapsed)
@@ -2,40 +2,215 @@
 #
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
+import datetime
+import glob
+import hashlib
+import json
 import os
 
 import pandas as pd
+import pyarrow as pa
+from scrapy import signals
+
+from .countries import partition_dir
 
 
 class ParquetPipeline:
-    def __init__(self, output_folder):
+    # Ficheiro de saída de cada spider, gravado na partição `country=…/source=<nome do ficheiro>`
+    output_files = {
+        'trials': 'trials.parquet',
+        'ctis_eu': 'ctis.parquet',
+        'pap_infarmed': 'pap.parquet',
+    }
+
+    def __init__(self, output_folder, delta_refresh=False, stats=None, jobdir=None, flush_every=200,
+                 country='pt'):
         self.items = []
         self.output_folder = output_folder
+        self.country = country
         self.output_file = None
+        self.delta_refresh = delta_refresh
+        self.stats = stats
+        # Com JOBDIR, os itens são escritos em partes à medida que chegam, para sobreviverem a uma interrupção
+        self.parts_dir = os.path.join(jobdir, 'items') if jobdir else None
+        self.flush_every = flush_every
+        self.n_parts = 0
 
     @classmethod
     def from_crawler(cls, crawler):
         # Read the output folder from settings; provide a default if not set.
         output_folder = crawler.settings.get('PARQUET_OUTPUT_FOLDER', '/path/to/your/output/folder')
-        return cls(output_folder)
+        pipeline = cls(
+            output_folder,
+            delta_refresh=crawler.settings.getbool('DELTA_REFRESH_ENABLED'),
+            stats=crawler.stats,
+            jobdir=crawler.settings.get('JOBDIR'),
+            flush_every=crawler.settings.getint('PARQUET_FLUSH_EVERY', 200),
+            country=crawler.settings.get('CRAWL_COUNTRY', 'pt'),
+        )
+        # Com JOBDIR, o ficheiro final só é escrito quando se conhece o motivo do fecho
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    @property
+    def fingerprints_file(self):
+        return os.path.splitext(self.output_file)[0] + '.fingerprints.json'
+
+    @property
+    def manifest_file(self):
+        return os.path.splitext(self.output_file)[0] + '.manifest.json'
+
+    def open_spider(self, spider):
+        if spider.name in self.output_files:
+            file_name = self.output_files[spider.name]
+            folder = partition_dir(self.output_folder, getattr(spider, 'country', None) or self.country,
+                                   os.path.splitext(file_name)[0])
+            os.makedirs(folder, exist_ok=True)
+            self.output_file = os.path.join(folder, file_name)
+
+        # Estado partilhado com o DeltaRefreshMiddleware: hashes da execução anterior e desta execução
+        if self.delta_refresh and self.output_file is not None:
+            previous = {}
+            if os.path.exists(self.fingerprints_file) and os.path.exists(self.output_file):
+                with open(self.fingerprints_file) as f:
+                    previous = json.load(f)
+            spider.delta_state = {'previous': previous, 'current': {}, 'unchanged': set()}
+
+        # Retoma de um crawl interrompido: partes já escritas e estado do delta refresh
+        if self.parts_dir is not None:
+            os.makedirs(self.parts_dir, exist_ok=True)
+            self.n_parts = len(self.part_files)
+            if self.n_parts:
+                spider.logger.info("A retomar crawl com %d partes de itens já guardadas.", self.n_parts)
+            if hasattr(spider, 'delta_state') and os.path.exists(self.delta_checkpoint):
+                with open(self.delta_checkpoint) as f:
+                    saved = json.load(f)
+                spider.delta_state['current'].update(saved['current'])
+                spider.delta_state['unchanged'].update(saved['unchanged'])
+
+    @property
+    def part_files(self):
+        return sorted(glob.glob(os.path.join(self.parts_dir, 'part-*.parquet')))
+
+    @property
+    def delta_checkpoint(self):
+        return os.path.join(self.parts_dir, 'delta_state.json')
+
+    def flush(self, spider):
+        if self.items:
+            path = os.path.join(self.parts_dir, f'part-{self.n_parts:05d}.parquet')
+            pd.DataFrame(self.items).convert_dtypes().to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+            self.n_parts += 1
+            self.items = []
+
+        state = getattr(spider, 'delta_state', None)
+        if state is not None:
+            with open(self.delta_checkpoint + '.tmp', 'w') as f:
+                json.dump({'current': state['current'], 'unchanged': sorted(state['unchanged'])}, f)
+            os.replace(self.delta_checkpoint + '.tmp', self.delta_checkpoint)
 
     def process_item(self, item, spider):
         # Append each item (converted to a dict) to the list
         self.items.append(dict(item))
 
+        if self.parts_dir is not None and len(self.items) >= self.flush_every:
+            self.flush(spider)
+
         return item
 
     def close_spider(self, spider):
+        if self.parts_dir is not None:
+            self.flush(spider)
+        else:
+            self.write_output(spider)
+
+    def spider_closed(self, spider, reason):
+        if self.parts_dir is None:
+            return
+        if reason == 'finished':
+            self.write_output(spider)
+        else:
+            # Crawl interrompido: as partes ficam no JOBDIR e são juntadas na retoma
+            spider.logger.info("Crawl interrompido (%s): %d partes de itens guardadas para retoma.",
+                               reason, self.n_parts)
+
+    def write_output(self, spider):
+        if self.output_file is None:
+            return
+
         df = pd.DataFrame(self.items).convert_dtypes()
+        if self.parts_dir is not None and self.part_files:
+            df = pd.concat([pd.read_parquet(p) for p in self.part_files] + [df], ignore_index=True)
+
+        state = getattr(spider, 'delta_state', None)
+        if state is not None:
+            # Os ensaios sem alterações mantêm o item da execução anterior
+            if state['unchanged']:
+                previous = pd.read_parquet(self.output_file)
+                carried = previous[previous['url'].isin(state['unchanged'])]
+                df = pd.concat([carried, df], ignore_index=True) if len(df) else carried
+                self.stats.set_value('delta/carried_over', len(carried), spider=spider)
+
+        # Crawl incremental: os novos itens substituem os existentes com a mesma chave
+        merge_key = getattr(spider, 'incremental_merge_key', None)
+        if merge_key is not None and os.path.exists(self.output_file):
+            previous = pd.read_parquet(self.output_file)
+            n_new = len(df)
+            df = (
+                pd.concat([previous, df], ignore_index=True)
+                .drop_duplicates(subset=merge_key, keep='last')
+                .reset_index(drop=True)
+            )
+            self.stats.set_value('incremental/merged_total', len(df), spider=spider)
+            self.stats.set_value('incremental/new_or_updated', n_new, spider=spider)
+
+        if state is not None and 'url' in df.columns:
+            # Os itens mantidos sem novo download conservam o hash anterior
+            fingerprints = {
+                url: state['current'].get(url, state['previous'].get(url))
+                for url in df['url'].dropna()
+                if url in state['current'] or url in state['previous']
+            }
+            with open(self.fingerprints_file, 'w') as f:
+                json.dump(fingerprints, f)
 
-        if spider.name == 'trials':
-            self.output_file = os.path.join(self.output_folder, 'trials.parquet')
+        df.to_parquet(self.output_file, index=False)
+        self.write_manifest(spider, df)
 
-        if spider.name == 'ctis_eu':
-            self.output_file = os.path.join(self.output_folder, 'ctis.parquet')
+        # Depois de escrito o ficheiro final, as partes intermédias já não são necessárias
+        if self.parts_dir is not None:
+            for path in self.part_files + [self.delta_checkpoint]:
+                if os.path.exists(path):
+                    os.remove(path)
 
-        if spider.name == 'pap_infarmed':
-            self.output_file = os.path.join(self.output_folder, 'pap.parquet')
+    def write_manifest(self, spider, df):
+        """
+        Escreve os metadados do ficheiro final (nº de linhas, hash do esquema, duração do crawl, marca da fonte),
+        para que a aplicação não tenha de ler o Parquet para os mostrar.
+        """
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        schema_hash = hashlib.sha1(schema.remove_metadata().to_string().encode()).hexdigest()
 
-        df.to_parquet(self.output_file, index=False) if self.output_file is not None else None
+        start_time = self.stats.get_value('start_time') if self.stats is not None else None
+        duration = None
+        if start_time is not None:
+            duration = round((datetime.datetime.now(start_time.tzinfo) - start_time).total_seconds(), 3)
 
+        manifest = {
+            'source': spider.name,
+            'country': getattr(spider, 'country', None) or self.country,
+            'file': os.path.basename(self.output_file),
+            'row_count': len(df),
+            'columns': len(df.columns),
+            'schema_hash': schema_hash,
+            'written_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'crawl_duration_s': duration,
+            'source_watermark': getattr(spider, 'source_watermark', None),
+            # Permitem verificar se o manifesto corresponde ao ficheiro atual
+            'file_size': os.path.getsize(self.output_file),
+            'file_mtime': os.path.getmtime(self.output_file),
+        }
+        with open(self.manifest_file + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_file + '.tmp', self.manifest_file)
@@ -19,9 +19,24 @@ LOG_LEVEL = 'INFO'
 
 EXTENSIONS = {
    'eu_ctr.extensions.CustomStatsExtension': 500,
+   'eu_ctr.extensions.ResumableCrawlExtension': 510,
 }
 
-DOWNLOAD_HANDLERS = {
+# Progresso publicado pelo CustomStatsExtension (o ficheiro é indicado pelo job runner em CRAWL_PROGRESS_FILE)
+CRAWL_PROGRESS_INTERVAL = 2.0
+
+# Telemetria de cada execução (latências, tamanhos, itens/s, memória, códigos HTTP), escrita em JSON em
+# <PARQUET_OUTPUT_FOLDER>/country=…/source=…/telemetry/; TELEMETRY_INTERVAL é o intervalo (s) da série de itens/s
+TELEMETRY_ENABLED = True
+TELEMETRY_INTERVAL = 10.0
+
+# Crawls retomáveis: cada spider define o seu JOBDIR em custom_settings (fila do scheduler e
+# requests vistos em disco); o ParquetPipeline guarda os itens em partes a cada PARQUET_FLUSH_EVERY itens
+PARQUET_FLUSH_EVERY = 200
+
+# O scrapy-playwright só é ativado pelo PapInfarmedSpider, quando pode precisar do browser (PLAYWRIGHT_HANDLERS);
+# os restantes spiders usam os download handlers do Scrapy
+PLAYWRIGHT_HANDLERS = {
     "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
     "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
 }
@@ -63,12 +78,43 @@ ROBOTSTXT_OBEY = True
 #SPIDER_MIDDLEWARES = {
 #    "eu_ctr.middlewares.EuCtrSpiderMiddleware": 543,
 #}
+SPIDER_MIDDLEWARES = {
+    # O mais próximo possível do spider, para medir só o tempo dos callbacks
+    "eu_ctr.middlewares.CallbackLatencySpiderMiddleware": 990,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #DOWNLOADER_MIDDLEWARES = {
 #    "eu_ctr.middlewares.EuCtrDownloaderMiddleware": 543,
 #}
+DOWNLOADER_MIDDLEWARES = {
+    # Depois do HttpCacheMiddleware (900), para ver as respostas já revalidadas pela cache
+    "eu_ctr.middlewares.DeltaRefreshMiddleware": 850,
+    # Logo antes do RetryMiddleware (550): 429/503 são repetidos com recuo no atraso do domínio
+    "eu_ctr.middlewares.BackoffRetryMiddleware": 560,
+}
+
+# Retentativas: 429 e 503 ficam a cargo do BackoffRetryMiddleware, os restantes códigos do RetryMiddleware
+RETRY_TIMES = 3
+RETRY_HTTP_CODES = [500, 502, 504, 522, 524, 408]
+BACKOFF_HTTP_CODES = [429, 503]
+BACKOFF_RETRY_TIMES = 6
+BACKOFF_BASE_DELAY = 2.0
+BACKOFF_MAX_DELAY = 120.0
+
+# Delta refresh: as páginas de detalhe sem alterações desde a última execução não são
+# reprocessadas e o item anterior é reaproveitado pelo ParquetPipeline
+DELTA_REFRESH_ENABLED = True
+
+# Crawl incremental do CTIS (também ativável com `-a incremental=1`): a paginação por decisionDate
+# pára abaixo da marca guardada na última execução, menos uma janela de sobreposição em dias
+CTIS_INCREMENTAL = False
+CTIS_OVERLAP_DAYS = 7
+
+# Extração dos PAP do Infarmed (também com `-a extraction=...`): 'auto' lê a tabela do HTML do servidor ou da
+# fonte de dados do DataTables e só abre o Playwright se falharem; 'html' nunca abre o browser; 'browser' sempre
+PAP_EXTRACTION = 'auto'
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -80,6 +126,9 @@ ROBOTSTXT_OBEY = True
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 PARQUET_OUTPUT_FOLDER = 'data'
+# País pesquisado pelo CTIS e pelo EU-CTR (código ISO 3166-1 alfa-2; também com `-a country=es`). As saídas ficam
+# num dataset Parquet particionado: PARQUET_OUTPUT_FOLDER/country=<país>/source=<fonte>/<fonte>.parquet
+CRAWL_COUNTRY = 'pt'
 
 PAP_FILE_NAME = 'pap.parquet'
 TRIALS_FILE_NAME = 'trials.parquet'
@@ -90,6 +139,8 @@ ITEM_PIPELINES = {
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
+# Os perfis de concorrência e AutoThrottle de cada registo estão no custom_settings de cada spider
+# (ver também benchmarks/crawl_throughput.py para comparar perfis contra um servidor local)
 #AUTOTHROTTLE_ENABLED = True
 # The initial download delay
 #AUTOTHROTTLE_START_DELAY = 5
@@ -103,11 +154,14 @@ ITEM_PIPELINES = {
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# A política RFC2616 revalida as respostas em cache com If-None-Match/If-Modified-Since
+# quando o servidor envia ETag/Last-Modified
+HTTPCACHE_ENABLED = True
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
@@ -1,9 +1,13 @@
 import json
+import os
+from datetime import date, datetime, timedelta
+
 import scrapy
 
+from ..countries import CTIS_MSC_CODES, CountryMixin, partition_dir
 from ..items import TrialItem  # ou o item que desejar, se necessário
 
-class CtisEuSpider(scrapy.Spider):
+class CtisEuSpider(CountryMixin, scrapy.Spider):
     name = "ctis_eu"
     allowed_domains = ["euclinicaltrials.eu"]
     start_urls = []
@@ -30,10 +34,109 @@ class CtisEuSpider(scrapy.Spider):
         'accepted_cookie': 'true'
     }
 
+    custom_settings = {
+        'JOBDIR': 'crawls/ctis_eu',
+        # API JSON do CTIS: respostas rápidas e pequenas, aguenta vários pedidos em paralelo
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
+        'DOWNLOAD_DELAY': 0,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 0.25,
+        'AUTOTHROTTLE_MAX_DELAY': 30,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 4.0,
+    }
+
     record_nr = 1
     report_on = 20
 
+    def __init__(self, *args, incremental=None, overlap_days=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Modo incremental: pára a paginação quando as decisões ficam abaixo da marca da última execução
+        self.incremental = incremental
+        self.overlap_days = overlap_days
+        self.cutoff = None
+        self.newest_decision = None
+
+    @staticmethod
+    def as_bool(value):
+        return str(value).strip().lower() in ('1', 'true', 'yes', 'sim')
+
+    @staticmethod
+    def parse_decision_date(value):
+        """Converte a decisionDate do CTIS (ISO ou dd/mm/aaaa) numa data."""
+        if not value:
+            return None
+        value = str(value)
+        for parse in (lambda v: date.fromisoformat(v[:10]), lambda v: datetime.strptime(v[:10], '%d/%m/%Y').date()):
+            try:
+                return parse(value)
+            except ValueError:
+                continue
+        return None
+
+    @property
+    def watermark_file(self):
+        # Uma marca por país, junto do ctis.parquet da partição
+        folder = partition_dir(self.settings.get('PARQUET_OUTPUT_FOLDER', 'data'), self.country, 'ctis')
+        return os.path.join(folder, 'ctis.watermark.json')
+
+    @property
+    def source_watermark(self):
+        # decisionDate mais recente conhecida (desta execução ou da anterior), registada no manifesto do Parquet
+        known = [d for d in (self.newest_decision, self.load_watermark()) if d is not None]
+        return max(known).isoformat() if known else None
+
+    def load_watermark(self):
+        if not os.path.exists(self.watermark_file):
+            return None
+        with open(self.watermark_file) as f:
+            return self.parse_decision_date(json.load(f).get('decisionDate'))
+
+    @property
+    def checkpoint_file(self):
+        jobdir = self.settings.get('JOBDIR')
+        return os.path.join(jobdir, 'dict_dados.json') if jobdir else None
+
+    def load_checkpoint(self):
+        """Recupera os registos da pesquisa guardados antes de uma interrupção."""
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return {}
+        with open(self.checkpoint_file) as f:
+            checkpoint = json.load(f)
+        self.newest_decision = self.parse_decision_date(checkpoint.get('newest_decision'))
+        return checkpoint.get('dict_dados', {})
+
+    def save_checkpoint(self):
+        if self.checkpoint_file is None:
+            return
+        os.makedirs(os.path.dirname(self.checkpoint_file), exist_ok=True)
+        with open(self.checkpoint_file + '.tmp', 'w') as f:
+            json.dump({
+                'dict_dados': self.dict_dados,
+                'newest_decision': self.newest_decision.isoformat() if self.newest_decision else None,
+            }, f)
+        os.replace(self.checkpoint_file + '.tmp', self.checkpoint_file)
+
     def start_requests(self):
+        self.dict_dados = self.load_checkpoint()
+        if self.dict_dados:
+            self.logger.info("A retomar crawl com %d ctNumbers recuperados do checkpoint.", len(self.dict_dados))
+
+        incremental = self.incremental if self.incremental is not None else self.settings.getbool('CTIS_INCREMENTAL')
+        self.incremental = self.as_bool(incremental)
+
+        if self.incremental:
+            watermark = self.load_watermark()
+            if watermark is not None:
+                overlap = int(self.overlap_days if self.overlap_days is not None
+                              else self.settings.getint('CTIS_OVERLAP_DAYS', 7))
+                self.cutoff = watermark - timedelta(days=overlap)
+                # Os novos itens são juntados ao ctis.parquet existente pelo ctNumber
+                self.incremental_merge_key = 'eudract_nr'
+                self.logger.info("Modo incremental: decisões a partir de %s (marca %s, sobreposição de %d dias).",
+                                 self.cutoff, watermark, overlap)
+            else:
+                self.logger.info("Modo incremental sem marca anterior: a percorrer todas as páginas.")
+
         # Inicia a requisição para a primeira página (page=1)
         payload = self.build_payload(page=1)
         yield scrapy.Request(
@@ -71,7 +174,7 @@ class CtisEuSpider(scrapy.Spider):
                 "productRole": None,
                 "populationType": None,
                 "orphanDesignation": None,
-                "msc": [620],
+                "msc": [CTIS_MSC_CODES[self.country]],
                 "ageGroupCode": None,
                 "therapeuticAreaCode": None,
                 "trialPhaseCode": None,
@@ -103,13 +206,19 @@ class CtisEuSpider(scrapy.Spider):
         self.logger.info("Página renderizada e interações realizadas com sucesso.")
         json_response = response.json()
 
-        # Inicializa a lista de ctNumbers na primeira requisição
-        if not hasattr(self, 'dict_dados'):
-            self.dict_dados = {}
-
         dados = json_response.get('data', [])
+        reached_watermark = False
         # Adiciona os ctNumber de cada registro ao dicionário
         for registo in dados:
+            decision = self.parse_decision_date(registo.get('decisionDate'))
+            if decision is not None and (self.newest_decision is None or decision > self.newest_decision):
+                self.newest_decision = decision
+
+            # Resultados ordenados por decisionDate DESC: abaixo do limite, o resto já é conhecido
+            if self.cutoff is not None and decision is not None and decision < self.cutoff:
+                reached_watermark = True
+                continue
+
             if 'ctNumber' in registo:
                 self.dict_dados[registo['ctNumber']] = registo
 
@@ -120,7 +229,13 @@ class CtisEuSpider(scrapy.Spider):
 
         self.logger.info("Página %d de %d processada.", current_page, total_pages)
 
-        if current_page < total_pages:
+        # Checkpoint da paginação, para a retoma após uma interrupção
+        self.save_checkpoint()
+
+        if reached_watermark:
+            self.logger.info("Marca incremental atingida na página %d; paginação terminada.", current_page)
+
+        if current_page < total_pages and not reached_watermark:
             next_page = current_page + 1
             payload = self.build_payload(page=next_page)
             yield scrapy.Request(
@@ -143,6 +258,7 @@ class CtisEuSpider(scrapy.Spider):
                     method="GET",
                     headers=self.custom_headers,
                     cookies=self.custom_cookies,
+                    meta={"delta_refresh": True},
                     callback=self.parse_retrieve
                 )
 
@@ -233,6 +349,18 @@ class CtisEuSpider(scrapy.Spider):
         item['nr_enrolled'] = _dict.get('totalNumberEnrolled', '')
         item['url'] = response.url
         item['status'] = _dict.get('ctStatus', '')
+        item['decision_date'] = _dict.get('decisionDate')
 
         self.record_nr += 1
         yield item
+
+    def closed(self, reason):
+        # A marca só avança quando a execução termina normalmente
+        if reason != 'finished' or self.newest_decision is None:
+            return
+
+        previous = self.load_watermark()
+        newest = max(self.newest_decision, previous) if previous is not None else self.newest_decision
+        os.makedirs(os.path.dirname(self.watermark_file), exist_ok=True)
+        with open(self.watermark_file, 'w') as f:
+            json.dump({'decisionDate': newest.isoformat(), 'updated_at': datetime.now().isoformat()}, f)
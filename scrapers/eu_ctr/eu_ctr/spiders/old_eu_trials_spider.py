@@ -1,14 +1,36 @@
 import json
+import re
 from urllib.parse import urljoin
 
 import scrapy
+from ..countries import CountryMixin
 from ..items import TrialItem
 
 
-class TrialsSpider(scrapy.Spider):
+class TrialsSpider(CountryMixin, scrapy.Spider):
     name = "trials"
     allowed_domains = ["clinicaltrialsregister.eu"]
-    start_urls = ["https://www.clinicaltrialsregister.eu/ctr-search/search?query=&country=pt"]
+    search_url = "https://www.clinicaltrialsregister.eu/ctr-search/search"
+
+    custom_settings = {
+        'JOBDIR': 'crawls/trials',
+        # Registo HTML do EU-CTR: páginas pesadas, servidor mais lento; concorrência moderada
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 4,
+        'DOWNLOAD_DELAY': 0.25,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 1.0,
+        'AUTOTHROTTLE_MAX_DELAY': 60,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 2.0,
+    }
+
+    @property
+    def search_query(self):
+        return f"search?query=&country={self.country}"
+
+    @property
+    def start_urls(self):
+        # Pesquisa dos ensaios com protocolo no país do crawl
+        return [urljoin(self.search_url, self.search_query)]
 
     def parse(self, response, **kwargs):
         """
@@ -21,78 +43,154 @@ class TrialsSpider(scrapy.Spider):
         rows = response.xpath('//table[contains(@class, "result")]//tr')
 
         for row in rows:
-            relative_link = row.xpath(".//a[contains(text(), 'PT')]/@href").get()
+            # Ligação para o protocolo do país (o texto da ligação é o código do país, ex.: "PT")
+            relative_link = row.xpath(".//a[contains(text(), $code)]/@href", code=self.country.upper()).get()
             if relative_link:
                 trial_url = response.urljoin(relative_link)
-                yield scrapy.Request(trial_url, callback=self.parse_trial)
+                yield scrapy.Request(trial_url, callback=self.parse_trial, meta={'delta_refresh': True})
 
         # Tratamento da paginação: busca por um link para a próxima página (exemplo)
         next_page = response.xpath('//a[contains(., "Next»")]/@href').get()
         if next_page:
-            next_page_url = urljoin(response.url, ''.join(['search?query=&country=pt', next_page]))  # response.urljoin(next_page)
+            next_page_url = urljoin(response.url, ''.join([self.search_query, next_page]))  # response.urljoin(next_page)
             print(next_page_url)
             yield scrapy.Request(next_page_url, callback=self.parse)
 
-    @staticmethod
-    def parse_trial(response):
+    def parse_trial(self, response):
+        # Um único percurso pelas linhas da página, em vez de uma pesquisa XPath ao documento por campo
+        sections = SectionMap(response)
+
         item = TrialItem()
 
-        item['title'] = "\n".join(response.xpath('//tr[td[1][normalize-space()="A.3"]]/td[3]/table//td/text()').getall()).strip()
-        item['eudract_nr'] = response.xpath('//tr[td[1][normalize-space()="A.2"]]/td[3]//text()').get().strip()
-        item['nct_nr'] = response.xpath('//tr[td[1][contains(., "NCT")]]/td[3]//text()').get()
-        item['trial_design'] = json.dumps({
-            k: v for k, v in zip(
-                [i.strip() for i in response.xpath('//tr[td[1][contains(., "E.8.")]]/td[2]/text()').getall()],
-                [i.strip().replace('Yes', '1').replace('No', '0') for i in response.xpath(
-                    '//tr[td[1][contains(., "E.8.")]]/td[3]/text()').getall()]
-            )
-        })
-        item['trial_scope'] = json.dumps({
-            k: v for k, v in zip(
-                [i.strip() for i in response.xpath('//tr[td[1][contains(., "E.6.")]]/td[2]/text()').getall()],
-                [i.strip().replace('Yes', '1').replace('No', '0') for i in response.xpath(
-                    '//tr[td[1][contains(., "E.6.")]]/td[3]/text()').getall()]
-            )
-        })
-        item['trial_phase'] = json.dumps({
-            k: v for k, v in zip(
-                [i.strip() for i in response.xpath('//tr[td[1][contains(., "E.7.")]]/td[2]/text()').getall()],
-                [i.strip().replace('Yes', '1').replace('No', '0') for i in response.xpath(
-                    '//tr[td[1][contains(., "E.7.")]]/td[3]/text()').getall()]
-            )
-        })
-        item['start_date'] = response.xpath('//tr[td[2][normalize-space()="Date of Competent Authority Decision"]]/td[3]//text()').get().strip()
-        item['end_date'] = response.xpath('//tr[td[2][normalize-space()="Date of the global end of the trial"]]/td[3]//text()').get()
-        item['Protocol'] = response.xpath('//tr[td[1][normalize-space()="A.4.1"]]/td[3]//text()').get()
-        item['Sponsor'] = response.xpath('//tr[td[1][normalize-space()="B.1.1"]]/td[3]//text()').get().strip()
-        item['therapeutic_area'] = response.xpath('//tr[td[1][normalize-space()="E.1.1.2"]]/td[3]//text()').get()
-        item['condition'] = json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.1.1"]]/td[3]/table//td/text()').getall()])
-        # item['Disease'] = json.dumps({
-        #     k: v for k, v in zip(
-        #         [i.strip() for i in response.xpath('//tr[td[1][contains(., "E.1.2")]]/td[2]/text()').getall()],
-        #         [i.strip() for i in response.xpath('//tr[td[1][contains(., "E.1.2")]]/td[3]/text()').getall()],
-        #     )
-        # })
+        item['title'] = "\n".join(sections.table_texts(code="A.3")).strip()
+        item['eudract_nr'] = sections.first_text(code="A.2").strip()
+        item['nct_nr'] = sections.first_text(code_contains="NCT")
+        item['trial_design'] = json.dumps(sections.flags("E.8."))
+        item['trial_scope'] = json.dumps(sections.flags("E.6."))
+        item['trial_phase'] = json.dumps(sections.flags("E.7."))
+        item['start_date'] = sections.first_text(label="Date of Competent Authority Decision").strip()
+        item['end_date'] = sections.first_text(label="Date of the global end of the trial")
+        item['Protocol'] = sections.first_text(code="A.4.1")
+        item['Sponsor'] = sections.first_text(code="B.1.1").strip()
+        item['therapeutic_area'] = sections.first_text(code="E.1.1.2")
+        item['condition'] = json.dumps([i.strip() for i in sections.table_texts(code="E.1.1")])
 
         age_dict = {
             k: v for k, v in zip(
-                [i.strip() for i in response.xpath('//tr[td[1][contains(., "F.1.")]]/td[2]/text()').getall()],
-                [i.strip() for i in response.xpath('//tr[td[1][contains(., "F.1.")]]/td[3]/text()').getall()]
+                [i.strip() for i in sections.label_texts("F.1.")],
+                [i.strip() for i in sections.value_texts(code_contains="F.1.")]
             )
         }
         for k, v in age_dict.items():
             item[f'Age_{k.replace(" ", "_")}'] = v.replace('Yes', '1').replace('No', '0')
 
         gender_dict = {
-            'F': response.xpath('//tr[td[1][normalize-space()="F.2.1"]]/td[3]/text()').get().strip(),
-            'M': response.xpath('//tr[td[1][normalize-space()="F.2.2"]]/td[3]/text()').get().strip(),
+            'F': sections.value_texts(code="F.2.1")[0].strip(),
+            'M': sections.value_texts(code="F.2.2")[0].strip(),
         }
         for k, v in gender_dict.items():
             item[f'Gender_{k}'] = v.replace('Yes', '1').replace('No', '0')
 
-        item['inclusion_crt'] = json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.3"]]/td[3]/table//td/text()').getall()])
-        item['exclusion_crt'] = json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.4"]]/td[3]/table//td/text()').getall()])
-        item['status'] = response.xpath('//tr[td[2][normalize-space()="End of Trial Status"]]/td[3]/text()').get()
+        item['inclusion_crt'] = json.dumps([i.strip() for i in sections.table_texts(code="E.3")])
+        item['exclusion_crt'] = json.dumps([i.strip() for i in sections.table_texts(code="E.4")])
+        status = sections.value_texts(label="End of Trial Status")
+        item['status'] = status[0] if status else None
         item['url'] = response.url
 
         yield item
+
+
+def _normalize_space(text):
+    # normalize-space() do XPath: só espaço, tab, CR e LF contam como espaço em branco
+    return re.sub(r'[ \t\r\n]+', ' ', text).strip(' \t\r\n')
+
+
+def _text_nodes(el, parent_tag=None):
+    """
+    Nós de texto descendentes de `el`, em ordem de documento (equivalente a `el//text()`).
+    Com `parent_tag`, devolve apenas os nós cujo elemento pai tem essa tag (ex.: `//td/text()`).
+    """
+    if isinstance(el.tag, str) and el.text and (parent_tag is None or el.tag == parent_tag):
+        yield el.text
+    for child in el:
+        yield from _text_nodes(child, parent_tag)
+        if child.tail and (parent_tag is None or el.tag == parent_tag):
+            yield child.tail
+
+
+def _direct_texts(el):
+    # Equivalente a `el/text()`
+    if el is None:
+        return []
+    texts = [el.text] + [child.tail for child in el]
+    return [t for t in texts if t]
+
+
+class SectionMap:
+    """
+    Índice das linhas da página de detalhe de um ensaio do EU-CTR, construído num único percurso do DOM.
+
+    Cada linha `<tr>` com pelo menos uma célula fica indexada pelo código da secção (1.ª coluna, ex.: "E.8.1")
+    e pela etiqueta (2.ª coluna); o valor é a 3.ª coluna. Os métodos reproduzem as consultas XPath usadas
+    anteriormente (`//tr[td[1][...]]/td[3]...`), mantendo a ordem de documento.
+    """
+
+    def __init__(self, response):
+        self.rows = []
+        self.by_code = {}
+        self.by_label = {}
+
+        for tr in response.selector.root.iter('tr'):
+            tds = [child for child in tr if child.tag == 'td']
+            if not tds:
+                continue
+            raw_code = ''.join(_text_nodes(tds[0]))
+            code = _normalize_space(raw_code)
+            label = _normalize_space(''.join(_text_nodes(tds[1]))) if len(tds) > 1 else None
+            row = (raw_code, tds[1] if len(tds) > 1 else None, tds[2] if len(tds) > 2 else None)
+
+            self.rows.append(row)
+            self.by_code.setdefault(code, []).append(row)
+            if label is not None:
+                self.by_label.setdefault(label, []).append(row)
+
+    def select(self, code=None, code_contains=None, label=None):
+        if code is not None:
+            return self.by_code.get(code, [])
+        if label is not None:
+            return self.by_label.get(label, [])
+        return [row for row in self.rows if code_contains in row[0]]
+
+    def first_text(self, **criteria):
+        """Primeiro nó de texto da 3.ª coluna (`/td[3]//text()`).get())."""
+        for _, _, value in self.select(**criteria):
+            if value is not None:
+                for text in _text_nodes(value):
+                    return text
+        return None
+
+    def value_texts(self, **criteria):
+        """Nós de texto diretos da 3.ª coluna (`/td[3]/text()`).getall())."""
+        return [text for _, _, value in self.select(**criteria) for text in _direct_texts(value)]
+
+    def label_texts(self, code_contains):
+        """Nós de texto diretos da 2.ª coluna (`/td[2]/text()`).getall())."""
+        return [text for _, label, _ in self.select(code_contains=code_contains) for text in _direct_texts(label)]
+
+    def table_texts(self, **criteria):
+        """Textos das células das tabelas aninhadas na 3.ª coluna (`/td[3]/table//td/text()`).getall())."""
+        return [
+            text
+            for _, _, value in self.select(**criteria) if value is not None
+            for table in value if table.tag == 'table'
+            for text in _text_nodes(table, parent_tag='td')
+        ]
+
+    def flags(self, code_prefix):
+        """Dicionário etiqueta → valor (Yes/No como 1/0) das linhas cujo código contém `code_prefix`."""
+        return {
+            k: v for k, v in zip(
+                [i.strip() for i in self.label_texts(code_prefix)],
+                [i.strip().replace('Yes', '1').replace('No', '0') for i in self.value_texts(code_contains=code_prefix)]
+            )
+        }
@@ -1,22 +1,113 @@
+import importlib.util
+import re
+
 import pandas as pd
 import scrapy
-from scrapy_playwright.page import PageMethod
 
 from ..items import PAPItem
 
+# Colunas da tabela do Infarmed, pela ordem em que aparecem
+FIELDS = ['Nome', 'DCI', 'decisao', 'data_decisao', 'detalhes', 'n_doentes', 'cond_observ']
+
+# Fonte de dados do DataTables indicada nos scripts da página (ajax: "url", ajax: {url: "..."} ou sAjaxSource)
+DATATABLES_SOURCE = re.compile(
+    r"""(?:ajax|sAjaxSource)["']?\s*:\s*(?:\{[^}]*?url["']?\s*:\s*)?["']([^"']+)["']"""
+)
+
+
+# O fallback com browser só é possível com o scrapy-playwright instalado
+PLAYWRIGHT_AVAILABLE = importlib.util.find_spec('scrapy_playwright') is not None
+
+
+def cell_text(selector):
+    """Texto de uma célula com os espaços colapsados; nós separados (ex.: por <br>) ficam separados por um espaço."""
+    return " ".join(" ".join(selector.xpath(".//text()").getall()).split())
+
 
 class PapInfarmedSpider(scrapy.Spider):
     name = "pap_infarmed"
     allowed_domains = ["infarmed.pt"]
+    # Programas de acesso precoce do Infarmed: só existem para Portugal
+    country = 'pt'
     start_urls = [
         "https://www.infarmed.pt/web/infarmed/avaliacao-terapeutica-e-economica/programa-de-acesso-precoce-a-medicamentos"
     ]
 
+    custom_settings = {
+        'JOBDIR': 'crawls/pap_infarmed',
+        # Uma única página (e, no máximo, a fonte de dados da tabela): sem paralelismo nem AutoThrottle
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 1,
+        'AUTOTHROTTLE_ENABLED': False,
+    }
+
+    def __init__(self, *args, extraction=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 'auto': tabela do HTML do servidor ou da fonte de dados do DataTables, com o Playwright só se falharem;
+        # 'html': nunca abre o browser; 'browser': renderiza sempre a página com o Playwright
+        self.extraction = extraction
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # Handlers do scrapy-playwright só quando o browser pode ser preciso; mesmo assim, só os pedidos com
+        # meta['playwright'] abrem o browser (os outros seguem pelo handler HTTP do Scrapy)
+        if spider.extraction_mode != 'html' and PLAYWRIGHT_AVAILABLE:
+            handlers = crawler.settings.getdict('PLAYWRIGHT_HANDLERS')
+            crawler.settings.set('DOWNLOAD_HANDLERS', handlers, priority='spider')
+        return spider
+
+    @property
+    def extraction_mode(self):
+        mode = self.extraction or self.settings.get('PAP_EXTRACTION', 'auto')
+        if mode not in ('auto', 'html', 'browser'):
+            raise ValueError(f"Modo de extração desconhecido: {mode}")
+        return mode
+
     def parse(self, response, **kwargs):
-        yield scrapy.Request(
-            response.url,
+        if self.extraction_mode == 'browser':
+            yield self.browser_request(response.url)
+            return
+
+        # O DataTables pagina no browser as linhas que o servidor já enviou: normalmente estão todas no HTML
+        rows = self.table_rows(response)
+        if rows:
+            self.logger.info("Tabela lida do HTML do servidor (%d linhas).", len(rows))
+            self.crawler.stats.set_value('pap/extraction', 'html')
+            yield from self.build_items(rows)
+            return
+
+        # Tabela carregada pelo DataTables a partir de um URL de dados (JSON)
+        source = self.datatables_source(response)
+        if source:
+            yield response.follow(
+                source, callback=self.parse_datatables_json, cb_kwargs={'page_url': response.url},
+                errback=lambda failure: self.fallback(failure.request.cb_kwargs['page_url'], failure.value),
+                dont_filter=True,
+            )
+            return
+
+        yield from self.fallback(response.url, "tabela vazia no HTML e sem fonte de dados do DataTables")
+
+    def fallback(self, page_url, reason):
+        if self.extraction_mode == 'html':
+            self.logger.error("Extração sem browser falhou (%s); o modo 'html' não usa o Playwright.", reason)
+            return
+        if not PLAYWRIGHT_AVAILABLE:
+            self.logger.error("Extração sem browser falhou (%s) e o scrapy-playwright não está instalado.", reason)
+            return
+        self.logger.info("Extração sem browser falhou (%s); a renderizar a página com o Playwright.", reason)
+        yield self.browser_request(page_url)
+
+    def browser_request(self, url):
+        # Importado só quando é preciso: o scrapy-playwright arranca o Chromium no primeiro pedido que o usa
+        from scrapy_playwright.page import PageMethod
+
+        return scrapy.Request(
+            url,
             meta={
                 "playwright": True,
+                # A tabela só existe depois de renderizada; não guardar em cache
+                "dont_cache": True,
                 "playwright_page_methods": [
                     # Aguarda que o <select> esteja disponível.
                     PageMethod("wait_for_selector", "tbody"),
@@ -31,39 +122,67 @@ class PapInfarmedSpider(scrapy.Spider):
                     PageMethod("wait_for_selector", "table.dataTable.no-footer")
                 ],
             },
+            # O mesmo URL da página inicial: não deve ser descartado como duplicado
+            dont_filter=True,
             callback=self.parse_page
         )
 
-    def parse_page(self, response):
-        self.logger.info("Página renderizada e interações realizadas com sucesso.")
+    @staticmethod
+    def table_rows(response):
+        """Células de cada linha da primeira tabela com cabeçalho, uma por <td> (vazias incluídas, para manter as colunas)."""
+        table = response.xpath("//table[.//th]")[:1] or response.xpath("//table")[:1]
+        rows = []
+        for row in table.xpath("./tbody/tr | ./tr"):
+            cells = [cell_text(td) for td in row.xpath("./td")]
+            # Linhas de dados têm pelo menos nome, DCI, decisão e data (exclui o "sem dados" do DataTables)
+            if len(cells) >= 4 and any(cells):
+                rows.append(cells)
+        return rows
+
+    @staticmethod
+    def datatables_source(response):
+        for script in response.xpath("//script[not(@src)]/text()").getall():
+            if 'DataTable' in script or 'dataTable' in script:
+                match = DATATABLES_SOURCE.search(script)
+                if match:
+                    return match.group(1)
+        return None
 
-        # Tenta extrair os cabeçalhos da tabela
-        headers = response.xpath("//table/thead/tr/th/text()").getall()
-        if not headers:
-            headers = response.xpath("//table/tr[1]/th/text()").getall()
-        if not headers:
-            headers = response.xpath("//table/tr[1]/td/text()").getall()
-        headers = [h.strip() for h in headers if h.strip()]
-        fields = ['Nome', 'DCI', 'decisao', 'data_decisao', 'detalhes', 'n_doentes', 'cond_observ']
+    def parse_datatables_json(self, response, page_url):
+        try:
+            payload = response.json()
+        except ValueError as e:
+            yield from self.fallback(page_url, f"resposta da fonte de dados não é JSON: {e}")
+            return
 
-        # Mapeamento dos textos dos cabeçalhos para os campos do PAPItem
-        header_to_field = {k: v for k, v in zip(headers, fields)}
+        data = payload.get('data', payload.get('aaData', [])) if isinstance(payload, dict) else payload
+        rows = []
+        for record in data or []:
+            # Linhas como listas (pela ordem das colunas) ou objetos; as células podem trazer HTML
+            values = list(record.values()) if isinstance(record, dict) else list(record)
+            cells = [cell_text(scrapy.Selector(text=f"<div>{v}</div>")) if v is not None else '' for v in values]
+            if len(cells) >= 4 and any(cells):
+                rows.append(cells)
 
-        # Extrai as linhas da tabela (preferencialmente dentro do <tbody>)
-        rows = response.xpath("//table/tbody/tr")
         if not rows:
-            rows = response.xpath("//table/tr")
+            yield from self.fallback(page_url, "fonte de dados do DataTables sem linhas")
+            return
+        self.logger.info("Tabela lida da fonte de dados do DataTables (%d linhas).", len(rows))
+        self.crawler.stats.set_value('pap/extraction', 'datatables_json')
+        yield from self.build_items(rows)
+
+    def parse_page(self, response):
+        self.logger.info("Página renderizada e interações realizadas com sucesso.")
+        self.crawler.stats.set_value('pap/extraction', 'browser')
+        yield from self.build_items(self.table_rows(response))
 
-        for row in rows:
-            # Extrai os valores das células e limpa os espaços
-            cells = row.xpath(".//td/text()").getall()
-            cells = [cell.strip() for cell in cells if cell.strip()]
+    def build_items(self, rows):
+        for cells in rows:
             if cells:
                 item = PAPItem()
-                # Percorre os pares (cabeçalho, célula) e mapeia para os campos do item
-                for header, cell in zip(headers, cells):
-                    field = header_to_field.get(header)
-                    if field:
+                # Células mapeadas para os campos do PAPItem pela posição da coluna
+                for field, cell in zip(FIELDS, cells):
+                    if cell:
                         item[field] = cell
 
                 # Processar 'cond_observ'
@@ -88,13 +207,16 @@ class PapInfarmedSpider(scrapy.Spider):
                 else:
                     item['deferimento'] = pd.NA
 
-                # Processar 'n_doentes'
+                # Processar 'n_doentes' (células vazias não são atribuídas ao item: sem valor, fica NA)
+                n_doentes = item.get('n_doentes')
                 try:
-                    if '/' in item['n_doentes']:
-                        item['recurr_n_dtes'] = item['n_doentes'].split('/')[-1]
-                        item['n_doentes'] = int(item['n_doentes'].split('/')[0])
+                    if n_doentes is None:
+                        item['n_doentes'] = pd.NA
+                    elif '/' in n_doentes:
+                        item['recurr_n_dtes'] = n_doentes.split('/')[-1]
+                        item['n_doentes'] = int(n_doentes.split('/')[0])
                     else:
-                        item['n_doentes'] = int(item['n_doentes'])
+                        item['n_doentes'] = int(n_doentes)
                 except (ValueError, TypeError):
                     self.logger.warning(f"Erro ao processar 'n_doentes': {item.get('n_doentes', '')}")
                     item['n_doentes'] = pd.NA
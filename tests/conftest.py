@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Os módulos do ETL, dos benchmarks e do projeto Scrapy são importados como na execução normal
+# (a partir dos respetivos diretórios), não como pacotes
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ('etl', 'benchmarks', os.path.join('scrapers', 'eu_ctr'), ''):
+    sys.path.insert(0, os.path.join(ROOT_DIR, path))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
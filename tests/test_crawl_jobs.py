@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import crawl_jobs
+
+
+@pytest.fixture
+def progress_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl_jobs, 'PROGRESS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_live_pid_keeps_running(progress_dir):
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        crawl_jobs._write_status('ctis_eu', {'spider': 'ctis_eu', 'state': 'running', 'pid': process.pid})
+        assert crawl_jobs.is_running('ctis_eu')
+    finally:
+        process.kill()
+        process.wait()
+    # Morto sem escrever o estado final (ex.: OOM killer)
+    assert crawl_jobs.read_status('ctis_eu')['state'] == 'failed'
+    assert not crawl_jobs.is_running('ctis_eu')
+
+
+@pytest.mark.parametrize('state', ['starting', 'running', 'closing'])
+def test_stale_status_after_restart_is_failed(progress_dir, state):
+    # Processo que já não existe e não foi lançado por este servidor
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    crawl_jobs._write_status('trials', {'spider': 'trials', 'state': state, 'pid': process.pid})
+
+    assert not crawl_jobs.is_running('trials')
+    assert crawl_jobs.read_status('trials')['state'] == 'failed'
+    assert os.path.exists(crawl_jobs.progress_file('trials'))
+
+
+def test_finished_status_is_kept(progress_dir):
+    crawl_jobs._write_status('trials', {'spider': 'trials', 'state': 'finished', 'pid': 999999})
+    assert crawl_jobs.read_status('trials')['state'] == 'finished'
+
+
+def test_telemetry_runs_by_country(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl_jobs, 'DATA_DIR', str(tmp_path))
+    for country, started in [('pt', '20260101-100000'), ('es', '20260102-100000'), ('pt', '20260103-100000')]:
+        folder = tmp_path / f'country={country}' / 'source=ctis' / 'telemetry'
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f'ctis-{started}.json').write_text(json.dumps({'country': country, 'start_time': started}))
+
+    assert [run['start_time'] for run in crawl_jobs.telemetry_runs('ctis.parquet', country='pt')] == [
+        '20260103-100000', '20260101-100000']
+    assert crawl_jobs.telemetry_runs('ctis.parquet', country='es', limit=1)[0]['country'] == 'es'
+    assert [run['country'] for run in crawl_jobs.telemetry_runs('ctis.parquet')] == ['pt', 'es', 'pt']
+    assert crawl_jobs.telemetry_runs('ctis.parquet', country='fr') == []
@@ -0,0 +1,75 @@
+import logging
+
+import pandas as pd
+
+from crosswalk import build_id_crosswalk, conflicting_components, extract_registry_ids, merge_on_crosswalk
+
+
+def test_chained_ids_share_one_trial_key():
+    # EudraCT → ctNumber (transitado) e ctNumber → NCT, sem nenhuma linha com os três ids
+    eu = pd.DataFrame({'eudract_nr': ['2019-001234-56', '2019-001234-56-00'], 'nct_nr': [None, 'NCT01234567']})
+    crosswalk = build_id_crosswalk(extract_registry_ids(eu))
+
+    assert crosswalk['trial_key'].nunique() == 1
+    assert set(crosswalk['id_value']) == {'2019-001234-56', '2019-001234-56-00', 'NCT01234567'}
+    assert crosswalk['trial_key'].iloc[0] == '2019-001234-56'
+    assert conflicting_components(crosswalk).empty
+
+
+def test_duplicates_are_coalesced_ctis_first():
+    trials_eu = pd.DataFrame({
+        'eudract_nr': ['2019-001234-56', '2019-001234-56-00'],
+        'nct_nr': [None, 'NCT01234567'],
+        'title': ['EU-CTR title', 'CTIS title'],
+        'eu_ctr_only': ['from EU-CTR', None],
+    })
+    aact = pd.DataFrame({'nct_id': ['NCT01234567'], 'eudract_nr': [None], 'official_title': ['AACT title']})
+
+    merged, _ = merge_on_crosswalk(trials_eu, aact)
+
+    assert len(merged) == 1
+    row = merged.iloc[0]
+    assert row['title'] == 'CTIS title'
+    assert row['eu_ctr_only'] == 'from EU-CTR'
+    assert row['official_title'] == 'AACT title'
+    assert row['eudract_nr'] == '2019-001234-56-00'
+
+
+def test_conflicting_ids_keep_trials_apart(caplog):
+    # Um NCT citado por dois ensaios EudraCT distintos não os junta no mesmo componente
+    trials_eu = pd.DataFrame({
+        'eudract_nr': ['2019-001234-56', '2020-006543-21'],
+        'nct_nr': ['NCT01234567', 'NCT01234567'],
+        'title': ['first', 'second'],
+    })
+    aact = pd.DataFrame({'nct_id': ['NCT01234567', 'NCT07654321'], 'eudract_nr': [None, None]})
+
+    with caplog.at_level(logging.WARNING, logger='crosswalk'):
+        crosswalk = build_id_crosswalk(extract_registry_ids(trials_eu))
+    assert '1 ids ambíguos' in caplog.text
+    assert conflicting_components(crosswalk).empty
+    assert crosswalk['trial_key'].nunique() == 3
+
+    merged, _ = merge_on_crosswalk(trials_eu, aact)
+    assert sorted(merged['title'].dropna()) == ['first', 'second']
+    assert len(merged) == 4  # os dois ensaios EU e os dois da AACT, sem correspondência
+    assert merged['nct_id'].notna().sum() == 2
+
+
+def test_conflicting_crosswalk_is_rebuilt():
+    trials_eu = pd.DataFrame({
+        'eudract_nr': ['2019-001234-56', '2020-006543-21'],
+        'nct_nr': ['NCT01234567', 'NCT01234567'],
+        'title': ['first', 'second'],
+    })
+    aact = pd.DataFrame({'nct_id': ['NCT07654321'], 'eudract_nr': [None]})
+    fused = pd.DataFrame({
+        'id_value': ['2019-001234-56', '2020-006543-21', 'NCT01234567'],
+        'id_type': ['eudract_nr', 'eudract_nr', 'nct_id'],
+        'trial_key': '2019-001234-56',
+    })
+    assert list(conflicting_components(fused).index) == ['2019-001234-56']
+
+    merged, crosswalk = merge_on_crosswalk(trials_eu, aact, crosswalk=fused)
+    assert conflicting_components(crosswalk).empty
+    assert sorted(merged['title'].dropna()) == ['first', 'second']
@@ -0,0 +1,47 @@
+"""
+Benchmarks das etapas do ETL (pytest-benchmark), com os dados sintéticos de benchmarks/synthetic_data.py.
+
+Cada etapa é medida isolada, a partir das saídas das etapas anteriores (ver benchmarks/etl_stages.py).
+A escala é dada por PTOOLCTEX_BENCH_SCALE (por omissão, 1: o volume português). Em CI, `--benchmark-disable`
+corre cada etapa uma só vez, como teste; para comparar com uma execução anterior:
+    python -m pytest tests/test_etl_stages.py --benchmark-autosave --benchmark-compare
+"""
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from etl_stages import etl_stages  # noqa: E402
+from synthetic_data import make_dataset  # noqa: E402
+
+SCALE = float(os.environ.get('PTOOLCTEX_BENCH_SCALE', 1))
+STAGES = [name for name, _ in etl_stages({}, '')]
+
+
+@pytest.fixture(scope='module')
+def pipeline(tmp_path_factory):
+    """Etapas e resultados intermédios de uma execução completa, para servirem de entrada a cada etapa."""
+    data = make_dataset(SCALE, seed=0)
+    stages = dict(etl_stages(data, str(tmp_path_factory.mktemp('etl'))))
+    results = {}
+    for stage in stages.values():
+        stage(results)
+    return stages, results
+
+
+@pytest.mark.parametrize('name', STAGES)
+def test_stage(benchmark, pipeline, name):
+    stages, results = pipeline
+    produced = {}
+
+    def run(inputs):
+        stages[name](inputs)
+        produced.update(inputs)
+
+    # Cada ronda recebe uma cópia dos resultados intermédios, para não ver as saídas das rondas anteriores
+    benchmark.pedantic(run, setup=lambda: ((dict(results),), {}), rounds=3, iterations=1)
+
+    outputs = [k for k in produced if produced[k] is not results.get(k)]
+    assert outputs, f"{name} não produziu resultados"
+    assert all(len(produced[k]) for k in outputs)
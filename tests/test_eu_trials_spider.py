@@ -0,0 +1,75 @@
+import json
+import os
+
+from conftest import FIXTURES_DIR
+from scrapy.http import HtmlResponse
+
+from eu_ctr.spiders.old_eu_trials_spider import TrialsSpider
+
+TRIAL_URL = 'https://www.clinicaltrialsregister.eu/ctr-search/trial/2015-001234-56/PT'
+
+
+def trial_response():
+    with open(os.path.join(FIXTURES_DIR, 'eu_ctr_trial.html'), 'rb') as f:
+        return HtmlResponse(TRIAL_URL, body=f.read(), encoding='utf-8')
+
+
+def _flags(response, prefix):
+    return json.dumps({
+        k: v for k, v in zip(
+            [i.strip() for i in response.xpath(f'//tr[td[1][contains(., "{prefix}")]]/td[2]/text()').getall()],
+            [i.strip().replace('Yes', '1').replace('No', '0') for i in response.xpath(
+                f'//tr[td[1][contains(., "{prefix}")]]/td[3]/text()').getall()]
+        )
+    })
+
+
+def xpath_item(response):
+    """Campos extraídos com as consultas XPath da versão anterior de `TrialsSpider.parse_trial`."""
+    item = {
+        'title': "\n".join(response.xpath('//tr[td[1][normalize-space()="A.3"]]/td[3]/table//td/text()').getall()).strip(),
+        'eudract_nr': response.xpath('//tr[td[1][normalize-space()="A.2"]]/td[3]//text()').get().strip(),
+        'nct_nr': response.xpath('//tr[td[1][contains(., "NCT")]]/td[3]//text()').get(),
+        'trial_design': _flags(response, 'E.8.'),
+        'trial_scope': _flags(response, 'E.6.'),
+        'trial_phase': _flags(response, 'E.7.'),
+        'start_date': response.xpath('//tr[td[2][normalize-space()="Date of Competent Authority Decision"]]/td[3]//text()').get().strip(),
+        'end_date': response.xpath('//tr[td[2][normalize-space()="Date of the global end of the trial"]]/td[3]//text()').get(),
+        'Protocol': response.xpath('//tr[td[1][normalize-space()="A.4.1"]]/td[3]//text()').get(),
+        'Sponsor': response.xpath('//tr[td[1][normalize-space()="B.1.1"]]/td[3]//text()').get().strip(),
+        'therapeutic_area': response.xpath('//tr[td[1][normalize-space()="E.1.1.2"]]/td[3]//text()').get(),
+        'condition': json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.1.1"]]/td[3]/table//td/text()').getall()]),
+    }
+    ages = zip(
+        [i.strip() for i in response.xpath('//tr[td[1][contains(., "F.1.")]]/td[2]/text()').getall()],
+        [i.strip() for i in response.xpath('//tr[td[1][contains(., "F.1.")]]/td[3]/text()').getall()]
+    )
+    for k, v in dict(ages).items():
+        item[f'Age_{k.replace(" ", "_")}'] = v.replace('Yes', '1').replace('No', '0')
+    for k, code in (('F', 'F.2.1'), ('M', 'F.2.2')):
+        value = response.xpath(f'//tr[td[1][normalize-space()="{code}"]]/td[3]/text()').get().strip()
+        item[f'Gender_{k}'] = value.replace('Yes', '1').replace('No', '0')
+    item['inclusion_crt'] = json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.3"]]/td[3]/table//td/text()').getall()])
+    item['exclusion_crt'] = json.dumps([i.strip() for i in response.xpath('//tr[td[1][normalize-space()="E.4"]]/td[3]/table//td/text()').getall()])
+    item['status'] = response.xpath('//tr[td[2][normalize-space()="End of Trial Status"]]/td[3]/text()').get()
+    item['url'] = response.url
+    return item
+
+
+def test_parse_trial_matches_xpath_version():
+    response = trial_response()
+    [item] = TrialsSpider().parse_trial(response)
+
+    assert dict(item) == xpath_item(response)
+
+
+def test_parse_trial_fields():
+    [item] = TrialsSpider().parse_trial(trial_response())
+
+    assert item['eudract_nr'] == '2015-001234-56'
+    assert item['Sponsor'] == 'Example Pharma\xa0Europe B.V.'
+    assert item['start_date'] == '2015-07-15'
+    assert json.loads(item['trial_phase'])['Therapeutic confirmatory (Phase III)'] == '1'
+    assert json.loads(item['exclusion_crt']) == ['1. Prior exposure to examplimab.', 'Active infection.']
+    assert item['Age_Adults_(18-64_years)'] == '1'
+    assert item['Gender_F'] == '1'
@@ -0,0 +1,23 @@
+import os
+import time
+
+from utils.export import prune_exports
+
+
+def _touch(path, age):
+    path.write_text('x')
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_exports_by_count_and_age(tmp_path):
+    for i in range(5):
+        _touch(tmp_path / f'filtered_studies-{i}.csv', age=i * 60)
+    _touch(tmp_path / 'old.parquet', age=3 * 24 * 3600)
+    _touch(tmp_path / 'writing.csv.tmp', age=600)
+
+    prune_exports(str(tmp_path), keep=3, max_age=24 * 3600)
+
+    assert sorted(os.listdir(tmp_path)) == [
+        'filtered_studies-0.csv', 'filtered_studies-1.csv', 'filtered_studies-2.csv', 'writing.csv.tmp',
+    ]
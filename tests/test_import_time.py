@@ -0,0 +1,11 @@
+import pytest
+
+from import_time import MODULES, check_module
+
+
+@pytest.mark.parametrize('module', list(MODULES))
+def test_import_within_budget(module):
+    total_ms, loaded, _, status = check_module(module, repeat=3)
+
+    assert not loaded, f"{module} importa {', '.join(loaded)}"
+    assert status == 'ok', f"{module}: {total_ms:.1f} ms, {status}"
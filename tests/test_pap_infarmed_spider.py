@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+import pytest
+import scrapy
+from conftest import FIXTURES_DIR
+from scrapy.crawler import Crawler
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.test import get_crawler
+
+from eu_ctr.items import PAPItem
+from eu_ctr.spiders.old_eu_trials_spider import TrialsSpider
+from eu_ctr.spiders.pap_infarmed_spider import PapInfarmedSpider
+
+PAGE_URL = PapInfarmedSpider.start_urls[0]
+JSON_URL = 'https://www.infarmed.pt/documents/15786/pap/pap-decisoes.json'
+
+
+def fixture_response(name, url=PAGE_URL, cls=HtmlResponse):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return cls(url, body=f.read(), encoding='utf-8')
+
+
+@pytest.fixture(autouse=True)
+def jobdir(tmp_path, monkeypatch):
+    # Os spiders definem um JOBDIR relativo (crawls/…), que o Scrapy cria no diretório atual ao aplicar as definições
+    for spider_cls in (PapInfarmedSpider, TrialsSpider):
+        custom_settings = dict(spider_cls.custom_settings, JOBDIR=str(tmp_path / spider_cls.name))
+        monkeypatch.setattr(spider_cls, 'custom_settings', custom_settings)
+
+
+def make_spider(extraction='html'):
+    crawler = get_crawler(PapInfarmedSpider)
+    return crawler._create_spider(extraction=extraction)
+
+
+def test_server_rendered_table():
+    spider = make_spider()
+    items = list(spider.parse(fixture_response('pap_infarmed_table.html')))
+
+    assert all(isinstance(item, PAPItem) for item in items)
+    assert [item['Nome'] for item in items] == ['Examplimab', 'Testinib 150 mg', 'Sampletide', 'Demoxib']
+    first, second, blank, third = items
+    assert first['detalhes'] == 'Doentes adultos com psoríase em placas moderada a grave'
+    assert first['n_doentes'] == 40
+    assert first['PAP_act'] is True and first['c_custos'] is True and first['deferimento'] is True
+    # Célula vazia (detalhes) não desloca as colunas seguintes
+    assert 'detalhes' not in second
+    assert second['n_doentes'] == 12 and second['recurr_n_dtes'] == 'ano'
+    assert second['c_custos'] is False and second['deferimento'] is False
+    assert third['n_doentes'] is pd.NA and 'cond_observ' not in third
+    # Nº de doentes em branco: NA, sem interromper as linhas seguintes
+    assert blank['n_doentes'] is pd.NA and blank['PAP_act'] is True
+    assert spider.crawler.stats.get_value('pap/extraction') == 'html'
+
+
+def test_datatables_json():
+    spider = make_spider()
+    [request] = spider.parse(fixture_response('pap_infarmed_datatables.html'))
+
+    assert isinstance(request, scrapy.Request)
+    assert request.url == JSON_URL
+    assert request.callback == spider.parse_datatables_json
+
+    response = fixture_response('pap_infarmed_datatables.json', url=JSON_URL, cls=TextResponse)
+    items = list(request.callback(response, **request.cb_kwargs))
+    assert [item['Nome'] for item in items] == ['Examplimab', 'Testinib']
+    assert items[0]['detalhes'] == 'Doentes adultos com psoríase em placas moderada a grave'
+    assert 'detalhes' not in items[1]
+    assert items[1]['cond_observ'] == 'sem custos para o SNS'
+    assert spider.crawler.stats.get_value('pap/extraction') == 'datatables_json'
+
+
+def test_empty_table_without_browser(caplog):
+    spider = make_spider()
+    assert list(spider.parse(fixture_response('pap_infarmed_empty.html'))) == []
+    assert "o modo 'html' não usa o Playwright" in caplog.text
+
+
+def test_empty_datatables_json_falls_back():
+    spider = make_spider()
+    response = TextResponse(JSON_URL, body=b'{"data": []}', encoding='utf-8')
+    assert list(spider.parse_datatables_json(response, page_url=PAGE_URL)) == []
+
+
+@pytest.mark.parametrize('spider_cls, kwargs', [
+    (PapInfarmedSpider, {'extraction': 'html'}),
+    (TrialsSpider, {}),
+])
+def test_playwright_handlers_are_scoped(monkeypatch, spider_cls, kwargs):
+    # Só o PapInfarmedSpider, quando pode precisar do browser, ativa os download handlers do scrapy-playwright
+    monkeypatch.setenv('SCRAPY_SETTINGS_MODULE', 'eu_ctr.settings')
+    crawler = Crawler(spider_cls, get_project_settings())
+    crawler._create_spider(**kwargs)
+    assert not crawler.settings.getdict('DOWNLOAD_HANDLERS')
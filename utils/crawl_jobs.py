@@ -0,0 +1,234 @@
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Projeto Scrapy e diretório onde cada crawl publica o seu progresso (um JSON por spider)
+SCRAPY_PROJECT_DIR = os.path.abspath(os.path.join("scrapers", "eu_ctr"))
+SPIDERS_DIR = os.path.join(SCRAPY_PROJECT_DIR, "eu_ctr", "spiders")
+PROGRESS_DIR = os.path.join(SCRAPY_PROJECT_DIR, "eu_ctr", "logs", "jobs")
+# Saídas dos spiders, particionadas por país e fonte (data/country=…/source=…/<fonte>.parquet)
+DATA_DIR = os.path.join(SCRAPY_PROJECT_DIR, "data")
+
+# Estados publicados enquanto o crawl ainda não terminou
+ACTIVE_STATES = ('starting', 'running', 'closing')
+
+# Processos lançados por este servidor Streamlit (para recolher o código de saída)
+_processes = {}
+
+
+def list_spider_files():
+    return sorted(f for f in os.listdir(SPIDERS_DIR) if f.endswith('_spider.py'))
+
+
+def spider_name_from_file(spider_file):
+    """
+    Lê o atributo `name` do spider diretamente do ficheiro, sem importar o Scrapy no processo da aplicação.
+
+    :param spider_file: nome do ficheiro do spider (ex.: 'ctis_eu_spider.py')
+    :return: nome do spider (ex.: 'ctis_eu')
+    """
+    with open(os.path.join(SPIDERS_DIR, spider_file), encoding='utf-8') as f:
+        match = re.search(r'^\s*name\s*=\s*["\']([^"\']+)["\']', f.read(), re.MULTILINE)
+    return match.group(1) if match else spider_file.replace('_spider.py', '')
+
+
+def progress_file(spider_name):
+    return os.path.join(PROGRESS_DIR, f"{spider_name}.json")
+
+
+def _write_status(spider_name, status):
+    path = progress_file(spider_name)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(status, f)
+    os.replace(path + '.tmp', path)
+
+
+def start_crawl(spider_name, spider_kwargs=None):
+    """
+    Lança um spider num subprocesso próprio (`scrapy crawl`), sem bloquear a aplicação.
+
+    O progresso é publicado pelo CustomStatsExtension no ficheiro indicado em CRAWL_PROGRESS_FILE.
+
+    :param spider_name: nome do spider
+    :param spider_kwargs: argumentos do spider (passados com `-a chave=valor`)
+    :return: PID do subprocesso
+    """
+    os.makedirs(PROGRESS_DIR, exist_ok=True)
+    os.makedirs(os.path.join(SCRAPY_PROJECT_DIR, "eu_ctr", "logs"), exist_ok=True)
+
+    cmd = [sys.executable, "-m", "scrapy", "crawl", spider_name]
+    for key, value in (spider_kwargs or {}).items():
+        cmd += ["-a", f"{key}={value}"]
+
+    env = dict(os.environ, CRAWL_PROGRESS_FILE=progress_file(spider_name))
+    with open(os.path.join(PROGRESS_DIR, f"{spider_name}.out"), 'w') as out:
+        process = subprocess.Popen(
+            cmd, cwd=SCRAPY_PROJECT_DIR, env=env,
+            stdout=out, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+    _processes[spider_name] = process
+
+    _write_status(spider_name, {
+        'spider': spider_name,
+        'state': 'starting',
+        'pid': process.pid,
+        'started_at': time.time(),
+        'updated_at': time.time(),
+    })
+    return process.pid
+
+
+def _pid_alive(pid):
+    # Sinal 0: só verifica se o processo existe (PermissionError: existe, mas é de outro utilizador)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_status(spider_name):
+    """
+    Lê o último estado publicado pelo crawl. Se o subprocesso já terminou sem publicar o estado final,
+    o estado é marcado como 'failed'.
+
+    Os processos lançados por este servidor são verificados pelo próprio objeto do subprocesso; os restantes
+    (lançados antes de a aplicação reiniciar, ou mortos sem escrever o estado final, ex.: pelo OOM killer)
+    pelo `pid` guardado no ficheiro de progresso.
+
+    :param spider_name: nome do spider
+    :return: dicionário com o estado, ou None se o spider nunca foi lançado
+    """
+    path = progress_file(spider_name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    process = _processes.get(spider_name)
+    if process is not None:
+        if process.poll() is not None:
+            _processes.pop(spider_name, None)
+            if status.get('state') in ACTIVE_STATES:
+                status.update(state='failed', returncode=process.returncode, updated_at=time.time())
+                _write_status(spider_name, status)
+    elif status.get('state') in ACTIVE_STATES and not (status.get('pid') and _pid_alive(status['pid'])):
+        status.update(state='failed', returncode=None, updated_at=time.time())
+        _write_status(spider_name, status)
+    return status
+
+
+def is_running(spider_name):
+    status = read_status(spider_name)
+    return status is not None and status.get('state') in ACTIVE_STATES
+
+
+def stop_crawl(spider_name):
+    """Pede ao crawl para terminar (SIGTERM: o Scrapy fecha de forma ordenada e pode ser retomado)."""
+    process = _processes.get(spider_name)
+    if process is not None and process.poll() is None:
+        process.terminate()
+
+
+def output_files(output_file):
+    """
+    Ficheiros de saída de um spider, um por país.
+
+    :param output_file: ficheiro Parquet do spider (ex.: 'ctis.parquet')
+    :return: lista de (código do país, caminho), ordenada por país
+    """
+    source = os.path.splitext(output_file)[0]
+    paths = glob.glob(os.path.join(DATA_DIR, "country=*", f"source={source}", output_file))
+    return sorted(
+        (os.path.basename(os.path.dirname(os.path.dirname(path))).split('=', 1)[1], path) for path in paths
+    )
+
+
+def crawl_countries():
+    """
+    Países que os spiders sabem pesquisar, lidos de eu_ctr/countries.py sem importar o Scrapy no processo da aplicação.
+
+    :return: lista de códigos ISO 3166-1 alfa-2, ordenada
+    """
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(
+        "eu_ctr_countries", os.path.join(SCRAPY_PROJECT_DIR, "eu_ctr", "countries.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return sorted(module.CTIS_MSC_CODES)
+
+
+def scraped_countries():
+    """Países com dados extraídos pelos spiders (diretórios `country=…`)."""
+    return sorted(
+        os.path.basename(path).split('=', 1)[1] for path in glob.glob(os.path.join(DATA_DIR, "country=*"))
+    )
+
+
+def telemetry_runs(output_file, country=None, limit=None):
+    """
+    Telemetria das execuções de um spider, da mais recente para a mais antiga.
+
+    A telemetria é escrita pelo CustomStatsExtension na partição do spider
+    (data/country=…/source=…/telemetry/<fonte>-<início>.json).
+
+    :param output_file: ficheiro Parquet do spider (ex.: 'ctis.parquet')
+    :param country: código do país (por omissão, execuções de todos os países)
+    :param limit: número máximo de execuções a devolver
+    :return: lista de dicionários (um por execução)
+    """
+    stem = os.path.splitext(output_file)[0]
+    paths = glob.glob(
+        os.path.join(DATA_DIR, f"country={country or '*'}", f"source={stem}", "telemetry", f"{stem}-*.json")
+    )
+    # Ordem pelo início da execução (nome do ficheiro), entre países
+    paths.sort(key=os.path.basename, reverse=True)
+    runs = []
+    for path in paths[:limit]:
+        try:
+            with open(path) as f:
+                runs.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return runs
+
+
+def output_metadata(file_path):
+    """
+    Metadados de um ficheiro Parquet de saída dos scrapers, sem ler os dados.
+
+    Usa o manifesto escrito pelo ParquetPipeline (`<nome>.manifest.json`) quando corresponde ao ficheiro atual;
+    caso contrário, lê apenas o rodapé do Parquet para obter o número de linhas.
+
+    :param file_path: caminho do ficheiro Parquet
+    :return: dicionário com pelo menos `row_count` e `file_mtime`
+    """
+    manifest_path = os.path.splitext(file_path)[0] + '.manifest.json'
+    stat = os.stat(file_path)
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('file_size') == stat.st_size and manifest.get('file_mtime') == stat.st_mtime:
+                return manifest
+        except (OSError, ValueError):
+            pass
+
+    import pyarrow.parquet as pq
+
+    return {
+        'file': os.path.basename(file_path),
+        'row_count': pq.ParquetFile(file_path).metadata.num_rows,
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime,
+    }
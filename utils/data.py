@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import re
+
+import pandas as pd
+import streamlit as st
+
+# Funções de dados usadas por todas as páginas; não importa o SDK do LLM (ver utils/llm.py)
+
+# Diretório dos dados servidos (full_df, facetas, índice de pesquisa, PAP); pode ser trocado, por exemplo para
+# correr os benchmarks das páginas com dados sintéticos
+SOURCES_DIR = os.environ.get('PTOOLCTEX_SOURCES', 'sources')
+
+# Dataset dos ensaios gravado pelo ETL, particionado à Hive por país e fonte (full_df/country=…/source=…)
+FULL_DF_PATH = os.path.join(SOURCES_DIR, 'full_df')
+
+# Países carregados por omissão em cada sessão (códigos ISO 3166-1 alfa-2 separados por vírgulas)
+DEFAULT_COUNTRIES = os.environ.get('PTOOLCTEX_COUNTRIES', 'pt').split(',')
+
+# Chave da sessão com os países escolhidos (partilhada entre as páginas)
+COUNTRIES_KEY = 'countries'
+
+
+# function to load extra options and overrides
+@st.cache_data
+def load_extras():
+    import tomllib
+
+    with open(".streamlit/config.toml", "rb") as f:
+        _config = tomllib.load(f)
+    with open(".streamlit/options.toml", "rb") as f:
+        _options = tomllib.load(f)
+
+    return _config, _options
+
+def parse_list_str(val):
+    """
+    Transforma strings tipo '__list__["abc", "def"]' em listas reais.
+    """
+    if isinstance(val, str) and val.startswith("__list__"):
+        try:
+            return json.loads(val.replace("__list__", ""))
+        except Exception:
+            return [val]
+    return val
+
+# Normalizar therapeutic_area para gerar opções únicas e consistentes
+def normalize_list_column(column):
+    all_items = []
+    for items in column.dropna():
+        if isinstance(items, list):
+            # Se for lista, aplicar a limpeza a cada item
+            all_items.extend([re.sub(r'\s+', ' ', str(i)).strip().lower() for i in items])
+        elif isinstance(items, str) and items.startswith('__list__'):
+            # Converter string de lista tipo __list__ para lista real
+            try:
+                parsed = json.loads(items[len('__list__'):])
+                if isinstance(parsed, list):
+                    all_items.extend([re.sub(r'\s+', ' ', str(i)).strip().lower() for i in parsed])
+            except ValueError:
+                all_items.append(items.strip().lower())
+        else:
+            all_items.append(re.sub(r'\s+', ' ', str(items)).strip().lower())
+
+    # Remover duplicados e ordenar
+    return sorted(set(all_items))
+
+def dataset_countries(path):
+    """
+    Países presentes no dataset (diretórios `country=…`).
+
+    :param path: diretório do dataset
+    :return: lista de códigos, ordenada (vazia se `path` for um ficheiro Parquet simples)
+    """
+    if not os.path.isdir(path):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('country='))
+
+
+def dataset_mtime(path):
+    """
+    Data de modificação mais recente dos ficheiros do dataset (invalida as caches quando o ETL volta a correr).
+
+    :param path: diretório do dataset ou ficheiro Parquet
+    :return: timestamp, ou None se não houver dados
+    """
+    files = glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True) if os.path.isdir(path) else [path]
+    files = [f for f in files if os.path.exists(f)]
+    return max(os.path.getmtime(f) for f in files) if files else None
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([('country', pa.string()), ('source', pa.string())]), flavor='hive')
+
+
+def dataset_row_count(path):
+    """Número de linhas do dataset completo (todos os países), lido dos metadados dos ficheiros."""
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(path):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    return ds.dataset(path, format='parquet', partitioning=_partitioning()).count_rows()
+
+
+def _read_dataset(path, countries=None):
+    if not os.path.isdir(path):
+        return pd.read_parquet(path)
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format='parquet', partitioning=_partitioning())
+    expression = ds.field('country').isin(list(countries)) if countries else None
+    df = dataset.to_table(filter=expression).to_pandas()
+    # O nível `source` repete a coluna source_dataset gravada nos ficheiros
+    df = df.drop(columns=['source']).assign(country=lambda x: x['country'].astype('category'))
+    return df.sort_values('row_id', ignore_index=True) if 'row_id' in df.columns else df
+
+
+@st.cache_data
+def read_dataset(path, countries=None, mtime=None):
+    """
+    Lê o dataset dos ensaios, só com as partições dos países indicados: as dos restantes países nem são abertas.
+
+    :param path: diretório do dataset (ou um ficheiro Parquet simples, lido por inteiro)
+    :param countries: códigos dos países a ler (por omissão, todos)
+    :param mtime: data de modificação dos dados (ver `dataset_mtime`; invalida a cache quando o ETL volta a correr)
+    :return: DataFrame pela ordem de `row_id`, com a coluna `country`; listas ainda no formato `__list__`
+    """
+    return _read_dataset(path, countries)
+
+
+def select_countries(path=FULL_DF_PATH):
+    """
+    Seletor dos países a carregar, na barra lateral (só quando o dataset tem mais do que um país). A escolha fica na
+    sessão e é partilhada entre as páginas; por omissão, os países de PTOOLCTEX_COUNTRIES (ou o primeiro disponível).
+
+    :param path: diretório do dataset
+    :return: tuplo com os códigos escolhidos (vazio se o dataset não for particionado)
+    """
+    available = dataset_countries(path)
+    if not available:
+        return ()
+    default = [c for c in DEFAULT_COUNTRIES if c in available] or available[:1]
+    selected = [c for c in st.session_state.get(COUNTRIES_KEY, default) if c in available]
+
+    if len(available) > 1:
+        # Guardada fora da chave do widget, para sobreviver à navegação para páginas sem o seletor
+        st.sidebar.multiselect(
+            "Countries", available, default=selected, key=f"{COUNTRIES_KEY}_select", format_func=str.upper,
+            on_change=lambda: st.session_state.update({COUNTRIES_KEY: st.session_state[f"{COUNTRIES_KEY}_select"]}),
+        )
+        if not selected:
+            st.sidebar.warning("Select at least one country.")
+            st.stop()
+    return tuple(selected or default)
+
+
+@st.cache_data
+def load_df_parquet(path, countries=None, mtime=None):
+    """
+    Lê o dataset dos ensaios com as listas já convertidas (ver `read_dataset`).
+
+    :param path: diretório do dataset (ou ficheiro Parquet)
+    :param countries: códigos dos países a ler (por omissão, todos)
+    :param mtime: data de modificação dos dados (invalida a cache quando o ETL volta a correr, por exemplo
+        a partir da linha de comandos, para que os dados e o índice de filtros sejam da mesma versão)
+    """
+    df = _read_dataset(path, countries)
+
+    def revert_value(x):
+        if isinstance(x, str) and x.startswith("__list__"):
+            try:
+                return json.loads(x[len("__list__"):])
+            except Exception:
+                return x
+        if pd.isna(x):
+            return pd.NA
+        return x
+
+    for col in df.select_dtypes(include='object').columns:
+        df[col] = df[col].map(revert_value)
+    return df
+
+
+@st.cache_resource
+def load_filter_index(path, mtime, countries=None, _df=None):
+    """
+    Índice de filtros (FilterIndex) dos dados em `path`, partilhado entre as sessões com os mesmos países.
+
+    :param path: diretório do dataset (ou ficheiro Parquet)
+    :param mtime: data de modificação dos dados (invalida o índice quando os dados mudam)
+    :param countries: códigos dos países carregados (por omissão, todos)
+    :param _df: os dados já carregados pela página para estes `path`, `mtime` e `countries` (fora da chave da
+        cache); o índice é construído a partir deles em vez de voltar a ler o dataset, que ficaria em cache duas vezes
+    """
+    from utils.filters import FilterIndex
+    from utils.search import open_search_index
+
+    # O índice de pesquisa é gravado pelo ETL junto dos dados, com todos os países; as linhas carregadas são
+    # identificadas pelo seu row_id
+    df = _df if _df is not None else _read_dataset(path, countries)
+    row_ids = df['row_id'].to_numpy() if 'row_id' in df.columns else None
+    search = open_search_index(os.path.join(os.path.dirname(path), 'search.sqlite'),
+                               n_rows=dataset_row_count(path), row_ids=row_ids)
+    return FilterIndex(df, search=search)
+
+
+@st.cache_data
+def load_facets(path, mtime, countries=None):
+    """
+    Tabela de facetas gravada pelo ETL (facet, value, label, count), com as contagens dos países indicados.
+
+    :param path: caminho do ficheiro Parquet
+    :param mtime: data de modificação do ficheiro (invalida a cache quando o ETL volta a correr)
+    :param countries: códigos dos países carregados (por omissão, todos)
+    :return: DataFrame, ou None se o ficheiro não existir
+    """
+    if mtime is None:
+        return None
+    facets = pd.read_parquet(path)
+    if 'country' not in facets.columns:
+        return facets
+    if countries:
+        facets = facets[facets['country'].isin(countries)]
+    # Contagens somadas entre os países; o rótulo é o do primeiro país
+    return (
+        facets.groupby(['facet', 'value'], sort=True)
+        .agg(label=('label', 'first'), count=('count', 'sum'))
+        .reset_index()
+    )
+
+
+@st.cache_data
+def load_pap(path, mtime):
+    """
+    Programas de acesso precoce gravados pelo ETL, com as colunas derivadas, e os respetivos agregados
+    (`pap_summary.parquet`, no mesmo diretório).
+
+    :param path: caminho de pap_clean.parquet
+    :param mtime: data de modificação do ficheiro (invalida a cache quando o ETL volta a correr)
+    :return: (DataFrame dos programas, DataFrame dos agregados por ano, decisão e flags)
+    """
+    summary_path = os.path.join(os.path.dirname(path), 'pap_summary.parquet')
+    return pd.read_parquet(path), pd.read_parquet(summary_path)
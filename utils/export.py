@@ -0,0 +1,200 @@
+import hashlib
+import glob
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+# Nº de linhas escritas de cada vez: só uma fatia do DataFrame é convertida (para Arrow ou texto) em simultâneo
+EXPORT_CHUNK_ROWS = 50_000
+
+# Ficheiros exportados, nomeados pelo hash do estado dos filtros (o mesmo estado reaproveita o ficheiro)
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'ptoolctex_exports')
+# Limites do diretório de exportações: nº de ficheiros e idade máxima (s) desde a última utilização
+EXPORT_KEEP = 50
+EXPORT_MAX_AGE = 24 * 3600
+
+EXPORT_FORMATS = {
+    'csv': {'suffix': '.csv', 'mime': 'text/csv'},
+    'parquet': {'suffix': '.parquet', 'mime': 'application/octet-stream'},
+}
+
+
+def _is_list(value):
+    return isinstance(value, (list, tuple, np.ndarray))
+
+
+def list_columns(df):
+    """Colunas object que contêm listas (ex.: therapeutic_area, keywords, interventions)."""
+    return [col for col in df.select_dtypes(include='object').columns if df[col].map(_is_list).any()]
+
+
+def _prepare_chunk(chunk, lists, as_text, text_columns=()):
+    chunk = chunk.copy()
+    for col in lists:
+        if as_text:
+            # CSV: listas como texto separado por vírgulas
+            chunk[col] = chunk[col].map(lambda v: ', '.join(map(str, v)) if _is_list(v) else v)
+        else:
+            # Parquet: listas de texto nativas; valores soltos passam a listas de um elemento
+            chunk[col] = chunk[col].map(
+                lambda v: [str(i) for i in v] if _is_list(v) else (None if pd.isna(v) else [str(v)])
+            )
+    for col in text_columns:
+        chunk[col] = chunk[col].map(lambda v: None if pd.isna(v) else str(v))
+    return chunk
+
+
+def _arrow_schema(df, lists):
+    # Esquema único para o ficheiro todo; colunas com tipos mistos são exportadas como texto
+    fields, text_columns = [], []
+    for col in df.columns:
+        if col in lists:
+            fields.append(pa.field(col, pa.list_(pa.string())))
+            continue
+        try:
+            fields.append(pa.Schema.from_pandas(df[[col]], preserve_index=False).field(col))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields.append(pa.field(col, pa.string()))
+            text_columns.append(col)
+    return pa.schema(fields), text_columns
+
+
+def write_parquet_chunked(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Escreve o DataFrame em Parquet por fatias, com um único esquema Arrow para todo o ficheiro.
+
+    :param df: DataFrame a exportar
+    :param path: caminho do ficheiro
+    :param chunk_rows: nº de linhas por row group
+    """
+    lists = list_columns(df)
+    schema, text_columns = _arrow_schema(df, lists)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = _prepare_chunk(df.iloc[start:start + chunk_rows], lists, False, text_columns)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_csv_chunked(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Escreve o DataFrame em CSV por fatias, sem construir o texto do ficheiro completo em memória.
+
+    :param df: DataFrame a exportar
+    :param path: caminho do ficheiro
+    :param chunk_rows: nº de linhas por fatia
+    """
+    lists = list_columns(df)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for start in range(0, max(len(df), 1), chunk_rows):
+            chunk = _prepare_chunk(df.iloc[start:start + chunk_rows], lists, True)
+            chunk.to_csv(f, header=start == 0, index=False)
+
+
+def export_to_file(df, path, fmt='csv', chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Exporta o DataFrame para `path` no formato pedido (escrita atómica).
+
+    :param df: DataFrame a exportar
+    :param path: caminho do ficheiro
+    :param fmt: 'csv' ou 'parquet'
+    :param chunk_rows: nº de linhas escritas de cada vez
+    :return: caminho do ficheiro
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        write_parquet_chunked(df, tmp_path, chunk_rows)
+    else:
+        write_csv_chunked(df, tmp_path, chunk_rows)
+    os.replace(tmp_path, path)
+    return path
+
+
+def state_hash(df, state):
+    """
+    Hash do estado que determina o conteúdo exportado (filtros, versão dos dados, colunas e nº de linhas).
+
+    :param df: DataFrame a exportar
+    :param state: dicionário com o estado dos filtros (serializável em JSON, com `default=str`)
+    :return: hash hexadecimal
+    """
+    payload = json.dumps(
+        {'state': state, 'columns': [str(c) for c in df.columns], 'rows': len(df)},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def prune_exports(directory=EXPORT_DIR, keep=EXPORT_KEEP, max_age=EXPORT_MAX_AGE):
+    """
+    Apaga as exportações usadas há mais de `max_age` segundos e, das restantes, todas menos as `keep` mais recentes.
+
+    :param directory: diretório das exportações
+    :param keep: nº de ficheiros a manter
+    :param max_age: idade máxima (s), contada a partir da data de modificação (atualizada a cada reutilização)
+    """
+    files = []
+    for path in glob.glob(os.path.join(directory, '*')):
+        try:
+            files.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    files.sort(reverse=True)
+    now = time.time()
+    for i, (mtime, path) in enumerate(files):
+        # Ficheiros .tmp são exportações ainda em escrita: só a idade os apaga
+        if (i >= keep and not path.endswith('.tmp')) or now - mtime > max_age:
+            try:
+                os.remove(path)
+            except OSError:
+                # Já apagado por outra sessão (ou aberto, no Windows)
+                pass
+
+
+def export_widget(df, file_stem, key, state):
+    """
+    Exportação a pedido: o ficheiro só é gerado quando o utilizador carrega em "Prepare export" e é reaproveitado
+    enquanto o estado dos filtros (`state`) não mudar.
+
+    :param df: DataFrame a exportar (já filtrado)
+    :param file_stem: nome do ficheiro descarregado, sem extensão
+    :param key: chave única do widget na página
+    :param state: dicionário com o estado dos filtros e a versão dos dados
+    """
+    cols = st.columns([1, 1, 2])
+    fmt = cols[0].radio("Format", list(EXPORT_FORMATS), horizontal=True, key=f"{key}_format",
+                        format_func=str.upper, label_visibility="collapsed")
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = os.path.join(EXPORT_DIR, f"{file_stem}-{state_hash(df, state)}{EXPORT_FORMATS[fmt]['suffix']}")
+
+    if os.path.exists(path):
+        # Reutilizado: conta como usado agora, para não ser o próximo a ser apagado
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    else:
+        if not cols[1].button(f"Prepare {fmt.upper()} export", key=f"{key}_prepare"):
+            return
+        with st.spinner(f"Writing {len(df):,} rows..."):
+            export_to_file(df, path, fmt)
+        prune_exports()
+
+    with open(path, 'rb') as f:
+        cols[2].download_button(
+            f"📥 Download {fmt.upper()}",
+            data=f,
+            file_name=f"{file_stem}{EXPORT_FORMATS[fmt]['suffix']}",
+            mime=EXPORT_FORMATS[fmt]['mime'],
+            key=f"{key}_download",
+        )
@@ -0,0 +1,226 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Colunas de listas pesquisadas item a item (ex.: "breast" encontra o item "Breast cancer")
+LIST_COLUMNS = ('therapeutic_area', 'interventions')
+# Colunas pesquisadas como texto corrido
+TEXT_COLUMNS = ('title', 'keywords', 'outcome_measures', 'study_type', 'status')
+# Colunas da pesquisa livre ("Other search term") quando não há índice de texto
+FREE_TEXT_COLUMNS = ('title', 'therapeutic_area', 'keywords', 'interventions')
+# Colunas com filtros de escolha múltipla (mesmas facetas que o ETL grava em sources/facets.parquet)
+FACET_COLUMNS = ('study_type', 'therapeutic_area', 'interventions')
+# Flags de população (idade e sexo)
+FLAG_COLUMNS = ('Age_0_17_years', 'Age_18_64_years', 'Age_65p_years', 'Gender_F', 'Gender_M')
+
+AGE_FLAGS = {
+    "0-17 years": 'Age_0_17_years',
+    "18-64 years": 'Age_18_64_years',
+    "65+ years": 'Age_65p_years',
+}
+SEX_FLAGS = {
+    "Female": 'Gender_F',
+    "Male": 'Gender_M',
+}
+
+
+def _as_items(value):
+    """Itens de uma célula de lista: listas nativas, strings '__list__[...]' ou valores soltos."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(i) for i in value if i is not None]
+    if isinstance(value, str):
+        if value.startswith('__list__'):
+            try:
+                parsed = json.loads(value[len('__list__'):])
+                return [str(i) for i in parsed] if isinstance(parsed, list) else [str(parsed)]
+            except ValueError:
+                return [value]
+        return [value]
+    if value is None or pd.isna(value):
+        return []
+    return [str(value)]
+
+
+def normalize_facet_value(value):
+    """Valor normalizado de uma opção (a mesma normalização usada pelo ETL em etl/facets.py)."""
+    return re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+
+class FilterIndex:
+    """
+    Arrays pré-calculados para filtrar o DataFrame de ensaios sem percorrer as células em Python.
+
+    - colunas de texto: um array Arrow de strings em minúsculas (uma por linha);
+    - colunas de listas: os itens de todas as linhas num único array Arrow em minúsculas, com a posição
+      da linha a que cada item pertence;
+    - flags: arrays numpy booleanos (nulos contam como False);
+    - facetas: o vocabulário normalizado de cada coluna filtrável e, por par (linha, valor), o código do valor.
+
+    O índice é construído uma vez por versão dos dados; cada filtro é uma pesquisa vetorizada sobre estes arrays.
+    Com um índice de texto (`search`, ver utils/search.py), as colunas nele indexadas são pesquisadas por palavras
+    (prefixos, sem acentos) em vez de por substring.
+    """
+
+    def __init__(self, df, list_columns=LIST_COLUMNS, text_columns=TEXT_COLUMNS, flag_columns=FLAG_COLUMNS,
+                 facet_columns=FACET_COLUMNS, search=None):
+        self.n_rows = len(df)
+        self.search = search
+        self.text = {}
+        self.items = {}
+        self.flags = {}
+        self.facets = {}
+
+        for col in list_columns:
+            if col not in df.columns:
+                continue
+            items = df[col].map(_as_items).to_list()
+            lengths = np.fromiter((len(i) for i in items), dtype=np.int64, count=len(items))
+            flat = [i.lower() for row in items for i in row]
+            self.items[col] = (pa.array(flat, type=pa.string()), np.repeat(np.arange(self.n_rows), lengths))
+
+        for col in text_columns:
+            if col not in df.columns:
+                continue
+            text = df[col].map(lambda v: '\n'.join(_as_items(v)).lower())
+            self.text[col] = pa.array(text.to_list(), type=pa.string())
+
+        for col in flag_columns:
+            if col in df.columns:
+                self.flags[col] = df[col].astype('boolean').fillna(False).to_numpy(dtype=bool)
+
+        for col in facet_columns:
+            if col not in df.columns:
+                continue
+            items = [[normalize_facet_value(i) for i in _as_items(v)] for v in df[col].astype(object)]
+            lengths = np.fromiter((len(i) for i in items), dtype=np.int64, count=len(items))
+            flat = np.array([i for row in items for i in row], dtype=object)
+            owners = np.repeat(np.arange(self.n_rows), lengths)
+            keep = flat != ''
+            values, codes = np.unique(flat[keep], return_inverse=True)
+            # Um par (linha, valor) por ensaio, mesmo que a lista repita o valor
+            width = max(len(values), 1)
+            pairs = np.unique(owners[keep] * width + codes)
+            self.facets[col] = (values, pairs // width, pairs % width)
+
+    def all(self):
+        return np.ones(self.n_rows, dtype=bool)
+
+    def none(self):
+        return np.zeros(self.n_rows, dtype=bool)
+
+    def contains(self, column, term):
+        """
+        Linhas cujo texto (ou algum item da lista) contém `term`, sem distinguir maiúsculas.
+
+        Se a coluna estiver no índice de texto, a pesquisa é feita nele: cada palavra tem de ser o início de uma
+        palavra do texto (não uma substring qualquer) e os acentos são ignorados.
+        """
+        if self.search is not None and column in self.search.columns:
+            return self.search.mask(term, [column])
+        term = term.strip().lower()
+        if column in self.items:
+            flat, owners = self.items[column]
+            hits = pc.match_substring(flat, term).to_numpy(zero_copy_only=False)
+            mask = self.none()
+            mask[owners[hits]] = True
+            return mask
+        if column in self.text:
+            return pc.match_substring(self.text[column], term).to_numpy(zero_copy_only=False)
+        return self.none()
+
+    def matches(self, text):
+        """Pesquisa livre: no índice de texto (todas as colunas indexadas) ou, sem índice, por substring."""
+        if self.search is not None:
+            return self.search.mask(text)
+        mask = self.none()
+        for column in FREE_TEXT_COLUMNS:
+            mask |= self.contains(column, text)
+        return mask
+
+    def relevance(self, text):
+        """Pontuação BM25 de cada linha para a pesquisa livre (menor é mais relevante; inf sem correspondência)."""
+        if self.search is None:
+            return None
+        positions, scores = self.search.search(text)
+        relevance = np.full(self.n_rows, np.inf)
+        relevance[positions] = scores
+        return relevance
+
+    def equals(self, column, value):
+        """Linhas cujo texto é igual a `value`, sem distinguir maiúsculas."""
+        if column not in self.text:
+            return self.none()
+        return pc.equal(self.text[column], value.strip().lower()).to_numpy(zero_copy_only=False)
+
+    def flag(self, column):
+        return self.flags.get(column, self.none())
+
+    def facet_values(self, column):
+        """Vocabulário normalizado da faceta, por ordem alfabética."""
+        return list(self.facets[column][0]) if column in self.facets else []
+
+    def isin(self, column, selected):
+        """Linhas com pelo menos um dos valores selecionados (valores normalizados) na faceta."""
+        if column not in self.facets:
+            return self.none()
+        values, owners, codes = self.facets[column]
+        selected = [normalize_facet_value(v) for v in selected]
+        positions = np.searchsorted(values, selected)
+        known = positions < len(values)
+        known[known] = values[positions[known]] == np.array(selected, dtype=object)[known]
+        mask = self.none()
+        mask[owners[np.isin(codes, positions[known])]] = True
+        return mask
+
+    def facet_counts(self, column, mask=None):
+        """Número de ensaios por valor da faceta, entre as linhas de `mask` (todas, por omissão)."""
+        if column not in self.facets:
+            return pd.Series(dtype='int64')
+        values, owners, codes = self.facets[column]
+        if mask is not None:
+            codes = codes[mask[owners]]
+        return pd.Series(np.bincount(codes, minlength=len(values)), index=values)
+
+
+def picotss_mask(index, age="All", sex="All", condition="", intervention="", other_term="", outcome="",
+                 study_type="All", status="All"):
+    """
+    Compila os critérios PICOTSS numa única máscara booleana.
+
+    Critérios vazios ou "All" não restringem; um critério sobre uma coluna inexistente não deixa passar nenhuma
+    linha, exceto a medida de resultado (`outcome_measures` nem sempre existe no dataset).
+
+    :param index: FilterIndex dos dados
+    :param age: "All" ou uma chave de AGE_FLAGS
+    :param sex: "All" ou uma chave de SEX_FLAGS
+    :param condition: texto a procurar nas áreas terapêuticas
+    :param intervention: texto a procurar nas intervenções
+    :param other_term: texto a procurar no título, palavras-chave, intervenções e critérios (pesquisa livre)
+    :param outcome: texto a procurar nas medidas de resultado
+    :param study_type: "All" ou o tipo de estudo
+    :param status: "All" ou texto a procurar no estado do estudo
+    :return: array numpy booleano com uma posição por linha
+    """
+    mask = index.all()
+
+    if age in AGE_FLAGS:
+        mask &= index.flag(AGE_FLAGS[age])
+    if sex in SEX_FLAGS:
+        mask &= index.flag(SEX_FLAGS[sex])
+    if condition.strip():
+        mask &= index.contains('therapeutic_area', condition)
+    if intervention.strip():
+        mask &= index.contains('interventions', intervention)
+    if other_term.strip():
+        mask &= index.matches(other_term)
+    if outcome.strip() and 'outcome_measures' in index.text:
+        mask &= index.contains('outcome_measures', outcome)
+    if study_type != "All":
+        mask &= index.equals('study_type', study_type)
+    if status != "All":
+        mask &= index.contains('status', status)
+    return mask
@@ -0,0 +1,181 @@
+import contextlib
+import glob
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+
+# Perfis das execuções das páginas: JSON com os tempos por secção e, se houver profiler, o flamegraph
+PROFILE_DIR = os.environ.get('PTOOLCTEX_PROFILE_DIR', 'profiles')
+
+# Nº de execuções guardadas; as mais antigas são apagadas
+PROFILE_KEEP = 200
+
+# Chave da sessão com a opção ligada na página Settings
+SESSION_KEY = 'profiling'
+
+# Execução em curso na thread do script (cada sessão do Streamlit corre o script na sua thread)
+_active = threading.local()
+
+
+def profiling_enabled():
+    """Ligado para todas as sessões com PTOOLCTEX_PROFILE=1 ou, só para a sessão, na página Settings."""
+    if os.environ.get('PTOOLCTEX_PROFILE', '').lower() in ('1', 'true', 'yes'):
+        return True
+    try:
+        return bool(st.session_state.get(SESSION_KEY, False))
+    except Exception:
+        # Fora de uma execução do Streamlit (ex.: scripts) não há sessão
+        return False
+
+
+def _start_profiler():
+    # Profiler por amostragem (pyinstrument) se instalado; senão o cProfile da biblioteca padrão
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python >= 3.12: só um cProfile ativo de cada vez no processo (outra sessão já está a ser medida)
+            return None, None
+        return 'cProfile', profiler
+
+    profiler = Profiler(async_mode='disabled')
+    profiler.start()
+    return 'pyinstrument', profiler
+
+
+def _stop_profiler(kind, profiler, base_path):
+    """Pára o profiler e grava o resultado; devolve o nome do ficheiro."""
+    if kind == 'pyinstrument':
+        profiler.stop()
+        path = base_path + '.html'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+        return os.path.basename(path)
+    if kind == 'cProfile':
+        profiler.disable()
+        path = base_path + '.prof'
+        profiler.dump_stats(path)
+        return os.path.basename(path)
+    return None
+
+
+def mark(name):
+    """
+    Início de uma secção com nome (ex.: 'load', 'filter', 'chart: trend'): o tempo até à marca seguinte, ou ao fim
+    da execução, é atribuído a `name`. Sem perfil ativo não faz nada.
+
+    :param name: nome da secção
+    """
+    run = getattr(_active, 'run', None)
+    if run is None:
+        return
+    now = time.perf_counter()
+    _close_section(run, now)
+    run['open'] = (name, now)
+
+
+def _close_section(run, now):
+    if run['open'] is not None:
+        name, start = run['open']
+        run['sections'].append({'name': name, 'seconds': now - start})
+        run['open'] = None
+
+
+@contextlib.contextmanager
+def section(name):
+    """Secção delimitada por um bloco `with`; fecha a secção aberta por `mark`, se existir."""
+    mark(name)
+    try:
+        yield
+    finally:
+        run = getattr(_active, 'run', None)
+        if run is not None:
+            _close_section(run, time.perf_counter())
+
+
+def _prune(directory, keep):
+    runs = sorted(glob.glob(os.path.join(directory, '*.json')))
+    for json_path in runs[:max(len(runs) - keep, 0)]:
+        stem = os.path.splitext(json_path)[0]
+        for path in glob.glob(stem + '.*'):
+            os.remove(path)
+
+
+@contextlib.contextmanager
+def profile_run(page, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+    """
+    Mede a execução de uma página (à volta do `pg.run()`), se o perfil estiver ligado: o tempo total, o das secções
+    marcadas na página (`mark`/`section`) e um perfil do profiler, gravados em `directory`.
+
+    :param page: nome da página
+    :param directory: diretório dos perfis
+    :param keep: nº de execuções a manter
+    """
+    if not profiling_enabled():
+        yield
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    started_at = datetime.now()
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', page).strip('_') or 'page'
+    base_path = os.path.join(directory, f"{started_at:%Y%m%d-%H%M%S-%f}_{slug}")
+
+    run = {'sections': [], 'open': None}
+    _active.run = run
+    kind, profiler = _start_profiler()
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException as e:
+        # st.stop() e st.rerun() interrompem o script com exceções próprias do Streamlit
+        status = type(e).__name__
+        raise
+    finally:
+        now = time.perf_counter()
+        _close_section(run, now)
+        _active.run = None
+        try:
+            profile_file = _stop_profiler(kind, profiler, base_path)
+            with open(base_path + '.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'page': page,
+                    'started_at': started_at.isoformat(),
+                    'seconds': now - start,
+                    'status': status,
+                    'sections': run['sections'],
+                    'profiler': kind,
+                    'profile_file': profile_file,
+                }, f, indent=2)
+            _prune(directory, keep)
+        except OSError as e:
+            # O perfil nunca deve partir a página
+            print(e)
+
+
+def load_profiles(directory=PROFILE_DIR, limit=PROFILE_KEEP):
+    """
+    Lê os perfis gravados, do mais recente para o mais antigo.
+
+    :param directory: diretório dos perfis
+    :param limit: nº máximo de execuções a ler
+    :return: lista de dicionários (ver `profile_run`)
+    """
+    runs = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json')), reverse=True)[:limit]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                runs.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return runs
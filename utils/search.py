@@ -0,0 +1,119 @@
+import json
+import os
+from contextlib import closing
+import re
+import sqlite3
+
+import numpy as np
+
+# Índice de pesquisa de texto construído pelo ETL (etl/search_index.py)
+SEARCH_INDEX_PATH = os.path.join("sources", "search.sqlite")
+
+
+def match_query(text, columns=None):
+    """
+    Converte o texto do utilizador numa expressão MATCH do FTS5.
+
+    Cada palavra é pesquisada como prefixo ("pembro" encontra "pembrolizumab") e todas têm de ocorrer.
+    Acentos e maiúsculas são ignorados pelo tokenizador do índice.
+
+    :param text: texto livre
+    :param columns: colunas onde pesquisar (por omissão, todas as indexadas)
+    :return: expressão MATCH, ou None se o texto não tiver palavras
+    """
+    tokens = re.findall(r'\w+', text)
+    if not tokens:
+        return None
+    query = ' AND '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        query = f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+
+class SearchIndex:
+    """
+    Acesso só de leitura ao índice FTS5 dos ensaios.
+
+    Os `rowid` do índice são os `row_id` das linhas do dataset `sources/full_df` (todos os países). Quando só
+    alguns países são carregados, `row_ids` dá o `row_id` de cada linha carregada e os resultados são convertidos
+    em posições dessas linhas, pelo que podem ser usados diretamente como máscaras booleanas sobre os dados.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH, row_ids=None):
+        self.path = path
+        with closing(self._connect()) as con:
+            meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+        self.row_count = int(meta['row_count'])
+        self.columns = json.loads(meta['columns'])
+        self.weights = json.loads(meta['weights'])
+
+        # rowid do índice → posição nos dados carregados (-1 para as linhas de países não carregados)
+        self.positions = None
+        self.n_rows = self.row_count
+        if row_ids is not None:
+            row_ids = np.asarray(row_ids, dtype=np.int64)
+            self.positions = np.full(self.row_count, -1, dtype=np.int64)
+            self.positions[row_ids] = np.arange(len(row_ids))
+            self.n_rows = len(row_ids)
+
+    def _connect(self):
+        # Uma ligação por pesquisa, fechada no fim (closing): o Streamlit serve cada sessão numa thread diferente
+        return sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+
+    def search(self, text, columns=None, limit=None):
+        """
+        Pesquisa o texto no índice, ordenando os resultados por relevância (BM25).
+
+        :param text: texto livre
+        :param columns: colunas onde pesquisar (por omissão, todas as indexadas)
+        :param limit: número máximo de resultados
+        :return: tuplo (posições das linhas, pontuações); pontuações mais baixas são mais relevantes
+        """
+        columns = [col for col in columns if col in self.columns] if columns else None
+        query = match_query(text, columns)
+        if query is None:
+            return np.array([], dtype=np.int64), np.array([], dtype=float)
+
+        weights = ', '.join(str(w) for w in [0.0] + self.weights)
+        sql = f"SELECT rowid, bm25(trials_fts, {weights}) AS score FROM trials_fts WHERE trials_fts MATCH ? ORDER BY score"
+        params = [query]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with closing(self._connect()) as con:
+            rows = con.execute(sql, params).fetchall()
+        positions = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        scores = np.fromiter((r[1] for r in rows), dtype=float, count=len(rows))
+        if self.positions is not None:
+            positions = self.positions[positions]
+            loaded = positions >= 0
+            positions, scores = positions[loaded], scores[loaded]
+        return positions, scores
+
+    def mask(self, text, columns=None):
+        """Máscara booleana (uma posição por linha dos dados) dos ensaios que correspondem ao texto."""
+        positions, _ = self.search(text, columns)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[positions] = True
+        return mask
+
+
+def open_search_index(path=SEARCH_INDEX_PATH, n_rows=None, row_ids=None):
+    """
+    Abre o índice de pesquisa, se existir e corresponder aos dados carregados.
+
+    :param path: caminho do ficheiro SQLite
+    :param n_rows: número de linhas do dataset completo; um índice com outro número de linhas está desatualizado
+    :param row_ids: `row_id` das linhas carregadas, quando são só parte do dataset (ex.: alguns países)
+    :return: SearchIndex, ou None (a aplicação recorre então à pesquisa por substring)
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        index = SearchIndex(path, row_ids=row_ids)
+    except (sqlite3.Error, KeyError, ValueError, IndexError):
+        return None
+    if n_rows is not None and index.row_count != n_rows:
+        return None
+    return index